@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Spotify_Wrapped.settings')
+# Async views run their queries on per-request threads whose persistent connections are
+# never reused or closed, so only WSGI keeps connections open across requests
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
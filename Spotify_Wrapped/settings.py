@@ -85,9 +85,54 @@ DATABASES = {
 	'default': {
 		'ENGINE': 'django.db.backends.sqlite3',
 		'NAME': BASE_DIR / 'db.sqlite3',
+		# Seconds a connection is kept open across requests; 0 closes it after each one.
+		# Only safe under WSGI, so asgi.py defaults it to 0
+		'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+		'CONN_HEALTH_CHECKS': True,
+		'OPTIONS': {
+			# Take the write lock when the transaction starts, so it waits out busy_timeout
+			# instead of failing at once when a read lock can't be upgraded
+			'transaction_mode': 'IMMEDIATE',
+		},
 	}
 }
 
+# Run on every new SQLite connection by main.database, in this order
+SQLITE_PRAGMAS = {
+	'busy_timeout': 5000,  # Milliseconds a writer waits for the lock before "database is locked"
+	'journal_mode': 'WAL',  # Readers no longer block on the writer, nor the writer on them
+	'synchronous': 'NORMAL',  # Safe with WAL; only a power loss can drop the last commits
+	'cache_size': -20000,  # Page cache per connection; negative is in KiB
+	'mmap_size': 128 * 1024 * 1024,  # Bytes of the file read through a memory map
+	'temp_store': 'MEMORY',
+}
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# The description and token-refresh leases and the streamed description text live in the
+# default cache, so every worker process must share it: with more than one, set REDIS_URL
+# (needs the redis package). The locmem fallback only works for a single process.
+REDIS_URL = os.getenv('REDIS_URL')
+
+CACHES = {
+	'default': {
+		'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+		'LOCATION': REDIS_URL,
+	} if REDIS_URL else {
+		'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+	},
+	'spotify': {
+		'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+		'LOCATION': 'spotify-top-items',
+		'OPTIONS': {
+			# The top-items memory cap: one entry per (user, item type, time range), each up to a
+			# 50-item window of a few hundred KB; locmem evicts the least recently used first
+			'MAX_ENTRIES': 100,
+		},
+	},
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -130,3 +175,79 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = 'user_login'
 
 AUTH_USER_MODEL = 'main.User'
+
+# Spotify API client
+# Connections to Spotify are pooled and reused by main.spotify.get_client()
+
+# Base URLs can point at a local stand-in such as benchmarks/fake_upstream.py
+SPOTIFY_API_BASE_URL = os.getenv('SPOTIFY_API_BASE_URL', 'https://api.spotify.com/v1')
+
+SPOTIFY_ACCOUNTS_BASE_URL = os.getenv('SPOTIFY_ACCOUNTS_BASE_URL', 'https://accounts.spotify.com')
+
+SPOTIFY_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+
+SPOTIFY_POOL_MAXSIZE = 20
+
+# Spotify top-items cache (main.spotify_cache)
+
+SPOTIFY_CACHE_ALIAS = 'spotify'  # Any entry of CACHES: locmem, file-based or database
+
+SPOTIFY_CACHE_TTL = 600  # Seconds a cached top-items payload stays valid; the cache's MAX_ENTRIES caps its size
+
+# Spotify rate limiting (main.ratelimit)
+# Calls sharing a client ID draw from one token bucket; 429 replies pause it for their Retry-After
+
+SPOTIFY_RATE_LIMIT_PER_SECOND = 10.0
+
+SPOTIFY_RATE_LIMIT_BURST = 20
+
+SPOTIFY_RATE_LIMIT_MAX_QUEUE = 100  # Callers allowed to wait for a slot before new calls are refused
+
+SPOTIFY_RATE_LIMIT_MAX_RETRIES = 2
+
+SPOTIFY_RATE_LIMIT_MAX_RETRY_AFTER = 30.0  # Longer Retry-After periods fail fast instead of being waited out
+
+# Spotify access tokens (main.tokens)
+
+SPOTIFY_TOKEN_REFRESH_MARGIN = 60  # Seconds before expiry at which access tokens are refreshed
+
+SPOTIFY_PROFILE_TTL = 24 * 60 * 60  # Seconds before a cached Spotify profile is refreshed in the background
+
+# Upstream dependencies
+# Spotify's timeouts are SPOTIFY_TIMEOUT above
+
+# main.llm: 'openai' for any OpenAI-compatible endpoint, 'stub' for local canned descriptions, or a dotted path
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'openai')
+
+LLM_BASE_URL = os.getenv('LLM_BASE_URL', 'https://integrate.api.nvidia.com/v1')  # Any OpenAI-compatible endpoint
+
+LLM_MODEL = os.getenv('LLM_MODEL', 'meta/llama-3.1-405b-instruct')
+
+LLM_TIMEOUT = (5, 30)  # (connect, read) seconds for the AI description completion
+
+LLM_MAX_CONCURRENCY = 4  # Completions in flight at once per process; further description jobs wait
+
+LLM_STUB_TOKEN_LATENCY = 0.0  # Seconds between words streamed by the stub provider
+
+LLM_MAX_INPUT_TOKENS = 400  # Estimated prompt budget; the least played tracks, genres and artists are dropped past it
+
+LLM_MAX_OUTPUT_TOKENS = 80  # The prompt asks for under 50 tokens; the rest is head room to finish the sentence
+
+# AI description cache (main.description_cache)
+
+DESCRIPTION_CACHE_MAX_ENTRIES = 5000  # Least recently used descriptions are evicted past this count
+
+DESCRIPTION_CACHE_SIMILARITY = 0.8  # Jaccard similarity of artists and genres for a near-duplicate hit; 1 = exact only
+
+DESCRIPTION_CACHE_SCAN_LIMIT = 500  # Most recently used entries compared when looking for a near-duplicate
+
+CIRCUIT_BREAKERS = {  # main.circuit: fail fast while an upstream is unhealthy, then probe to recover
+	'spotify': {
+		'FAILURE_THRESHOLD': 5,  # Consecutive failures that open the breaker
+		'RECOVERY_TIMEOUT': 30,  # Seconds before a half-open probe is let through
+	},
+	'llm': {
+		'FAILURE_THRESHOLD': 3,
+		'RECOVERY_TIMEOUT': 60,
+	},
+}
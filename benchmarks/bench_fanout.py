@@ -0,0 +1,82 @@
+"""
+Benchmarks sequential vs. concurrent Spotify requests for a single wrap.
+
+Starts the local fake Spotify Web API (``fake_upstream.py``) with a fixed delay per reply,
+then times the four requests ``make_wrapped`` needs (``/me``, top tracks, top artists
+and the genre artists window) on the async client, awaited one after another and
+gathered together as ``TopItemsPlan.aexecute`` does.
+
+Usage:
+	python benchmarks/bench_fanout.py [--latency 0.15] [--rounds 10]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Spotify_Wrapped.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from fake_upstream import FakeUpstreamServer  # noqa: E402
+from main import spotify  # noqa: E402
+
+
+def calls(client, token):
+	return {
+		'me': lambda: client.me(token),
+		'top_tracks': lambda: client.top_items(token, 'tracks', 5, 'medium_term'),
+		'top_artists': lambda: client.top_items(token, 'artists', 5, 'medium_term'),
+		'genre_req': lambda: client.top_items(token, 'artists', 20, 'medium_term'),
+	}
+
+
+async def sequential(client):
+	for call in calls(client, 'token').values():
+		await call()
+
+
+async def gathered(client):
+	await asyncio.gather(*(call() for call in calls(client, 'token').values()))
+
+
+def time_rounds(rounds, run):
+	async def rounds_of(client):
+		start = time.perf_counter()
+		for _ in range(rounds):
+			await run(client)
+		return (time.perf_counter() - start) / rounds
+
+	return asyncio.run(rounds_of(spotify.get_async_client()))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--latency', type=float, default=0.15, help='Simulated Spotify latency per call (seconds)')
+	parser.add_argument('--rounds', type=int, default=10, help='Wraps to simulate per mode')
+	args = parser.parse_args()
+
+	server = FakeUpstreamServer(('127.0.0.1', 0), latency=args.latency)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	settings.SPOTIFY_API_BASE_URL = f'http://127.0.0.1:{server.server_port}/v1'
+
+	serial = time_rounds(args.rounds, sequential)
+	concurrent = time_rounds(args.rounds, gathered)
+	server.shutdown()
+
+	print(f'latency per call : {args.latency * 1000:.0f} ms')
+	print(f'sequential       : {serial * 1000:.1f} ms/wrap')
+	print(f'gathered         : {concurrent * 1000:.1f} ms/wrap')
+	print(f'speed-up         : {serial / concurrent:.2f}x')
+
+
+if __name__ == '__main__':
+	main()
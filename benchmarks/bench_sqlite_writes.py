@@ -0,0 +1,156 @@
+"""
+Benchmarks concurrent wrap writes on SQLite with and without the tuned connection setup.
+
+Runs writer threads that each save wraps the way ``make_wrapped`` does (load the user,
+insert the wrap, bump the user's counters) alongside reader threads loading library
+pages, first with SQLite's defaults and then with ``SQLITE_PRAGMAS`` and ``IMMEDIATE``
+transactions. Each configuration gets a fresh scratch database; the project's own
+database is never touched. Writes that fail with "database is locked" are counted
+rather than retried.
+
+Usage:
+	python benchmarks/bench_sqlite_writes.py [--writers 8] [--readers 4] [--seconds 10] [--users 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Spotify_Wrapped.settings')
+
+from django.conf import settings  # noqa: E402
+
+SCRATCH_DIR = Path(tempfile.mkdtemp())
+settings.DATABASES['default']['NAME'] = SCRATCH_DIR / 'bench_sqlite_writes.sqlite3'
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import OperationalError, connection, transaction  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from main.models import User, Wraps  # noqa: E402
+
+TUNED = {
+	'pragmas': dict(settings.SQLITE_PRAGMAS),
+	'options': dict(settings.DATABASES['default'].get('OPTIONS', {})),
+}
+CONFIGURATIONS = {
+	'defaults': {'pragmas': {}, 'options': {}},
+	'tuned': TUNED,
+}
+
+
+def use(configuration, name):
+	"""
+	Points new connections at a fresh scratch database opened with the given setup.
+	"""
+	connection.close()
+	settings.SQLITE_PRAGMAS = configuration['pragmas']
+	settings.DATABASES['default']['OPTIONS'] = dict(configuration['options'])
+	settings.DATABASES['default']['NAME'] = SCRATCH_DIR / f'{name}.sqlite3'
+
+
+def write_wraps(user_ids, deadline, counts):
+	done = failed = 0
+	n = 0
+	while time.monotonic() < deadline:
+		user_id = user_ids[n % len(user_ids)]
+		n += 1
+		try:
+			with transaction.atomic():
+				user = User.objects.get(pk=user_id)
+				Wraps.objects.create(user=user, term='medium_term', document={}, creation_date=timezone.now())
+			done += 1
+		except OperationalError:
+			failed += 1
+	connection.close()
+	counts.append(('write', done, failed))
+
+
+def read_library(user_ids, deadline, counts):
+	done = failed = 0
+	n = 0
+	while time.monotonic() < deadline:
+		user_id = user_ids[n % len(user_ids)]
+		n += 1
+		try:
+			list(Wraps.objects.filter(user_id=user_id).order_by('-creation_date', '-pk')
+			     .only('slug', 'term', 'creation_date', 'spotify_display_name')[:24])
+			done += 1
+		except OperationalError:
+			failed += 1
+	connection.close()
+	counts.append(('read', done, failed))
+
+
+def run(configuration, name, args):
+	"""
+	Times one configuration.
+
+	Returns:
+		dict: Writes and reads per second, and the writes and reads that failed.
+	"""
+	use(configuration, name)
+	call_command('migrate', verbosity=0)
+	user_ids = [user.pk for user in User.objects.bulk_create(
+		[User(username=f'user{n}', password='!', date_joined=timezone.now()) for n in range(args.users)])]
+	connection.close()
+
+	counts = []
+	deadline = time.monotonic() + args.seconds
+	threads = [threading.Thread(target=write_wraps, args=(user_ids[n::args.writers], deadline, counts))
+	           for n in range(args.writers)]
+	threads += [threading.Thread(target=read_library, args=(user_ids, deadline, counts)) for _ in range(args.readers)]
+	start = time.perf_counter()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	elapsed = time.perf_counter() - start
+
+	totals = {'write': [0, 0], 'read': [0, 0]}
+	for kind, done, failed in counts:
+		totals[kind][0] += done
+		totals[kind][1] += failed
+	return {
+		'writes/s': totals['write'][0] / elapsed,
+		'failed writes': totals['write'][1],
+		'reads/s': totals['read'][0] / elapsed,
+		'failed reads': totals['read'][1],
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--writers', type=int, default=8, help='Threads saving wraps')
+	parser.add_argument('--readers', type=int, default=4, help='Threads loading library pages')
+	parser.add_argument('--seconds', type=float, default=10, help='Duration of each run')
+	parser.add_argument('--users', type=int, default=200, help='Users the wraps are spread over')
+	args = parser.parse_args()
+
+	results = {}
+	try:
+		for name, configuration in CONFIGURATIONS.items():
+			results[name] = run(configuration, name, args)
+	finally:
+		connection.close()
+		for path in SCRATCH_DIR.iterdir():
+			path.unlink()
+		SCRATCH_DIR.rmdir()
+
+	print(f'{args.writers} writers, {args.readers} readers, {args.seconds:g} s per run')
+	print(f'{"":<16}' + ''.join(f'{name:>12}' for name in results))
+	for metric in results['defaults']:
+		print(f'{metric:<16}' + ''.join(f'{result[metric]:>12.1f}' if metric.endswith('/s') else f'{result[metric]:>12}'
+		                                for result in results.values()))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,140 @@
+"""
+Benchmarks the per-user wrap queries with and without the (user, creation_date) index.
+
+Seeds a scratch SQLite database with wraps spread over many users, drops the index
+and times the wrap queries ``library``, ``get_wrapped`` and ``delete_wrapped`` run
+(deleting also looks up the user's latest remaining wrap). It then builds the index
+again and times them again. The project's own database is never touched.
+
+Usage:
+	python benchmarks/bench_wrap_queries.py [--wraps 1000000] [--users 20000] [--rounds 50]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Spotify_Wrapped.settings')
+
+from django.conf import settings  # noqa: E402
+
+SCRATCH_DB = Path(tempfile.mkdtemp()) / 'bench_wrap_queries.sqlite3'
+settings.DATABASES['default']['NAME'] = SCRATCH_DB
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from main.models import User, Wraps, new_wrap_slug  # noqa: E402
+from main.views import LIBRARY_PAGE_SIZE  # noqa: E402
+
+SEED_BATCH = 20000
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def seed(wraps, users):
+	"""
+	Inserts ``users`` users and ``wraps`` rows spread round-robin over them.
+
+	Returns:
+		list: (user id, slug) of every wrap, to pick lookups from.
+	"""
+	user_ids = [user.pk for user in User.objects.bulk_create(
+		[User(username=f'user{n}', password='!', date_joined=START) for n in range(users)], batch_size=SEED_BATCH)]
+	rows = []
+	keys = []
+	payload = Wraps(document={}).payload
+	sql = (f'INSERT INTO {Wraps._meta.db_table} (user_id, slug, term, spotify_display_name, creation_date, payload, '
+	       'description_status) VALUES (%s, %s, %s, %s, %s, %s, %s)')
+	with transaction.atomic(), connection.cursor() as cursor:
+		for n in range(wraps):
+			user_id = user_ids[n % users]
+			slug = new_wrap_slug()
+			creation_date = START + timedelta(seconds=n)
+			rows.append((user_id, slug, 'medium_term', '', connection.ops.adapt_datetimefield_value(creation_date), payload,
+			             'ready'))
+			keys.append((user_id, slug))
+			if len(rows) == SEED_BATCH:
+				cursor.executemany(sql, rows)
+				rows = []
+		if rows:
+			cursor.executemany(sql, rows)
+	return keys
+
+
+def queries():
+	"""
+	The wrap queries of each view, as functions of a (user id, slug) key.
+	"""
+	def library(key):
+		# The first page, as the view loads it
+		return list(Wraps.objects.filter(user_id=key[0]).order_by('-creation_date', '-pk')
+		            .only('slug', 'term', 'creation_date', 'spotify_display_name')[:LIBRARY_PAGE_SIZE])
+
+	def delete_wrapped(key):
+		# Rolled back, so every round deletes a row that exists
+		with transaction.atomic():
+			Wraps.objects.get(user_id=key[0], slug=key[1]).delete()
+			transaction.set_rollback(True)
+
+	return {
+		'library': library,
+		'get_wrapped': lambda key: (Wraps.objects.filter(user_id=key[0], slug=key[1])
+		                            .only('slug', 'creation_date', 'description_status', 'payload').first()),
+		'delete_wrapped': delete_wrapped,
+	}
+
+
+def time_queries(keys, rounds):
+	sample = random.Random(0).sample(keys, rounds)
+	results = {}
+	for name, run in queries().items():
+		start = time.perf_counter()
+		for key in sample:
+			run(key)
+		results[name] = (time.perf_counter() - start) / rounds
+	return results
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--wraps', type=int, default=1000000, help='Wraps to seed')
+	parser.add_argument('--users', type=int, default=20000, help='Users the wraps are spread over')
+	parser.add_argument('--rounds', type=int, default=50, help='Lookups timed per query')
+	args = parser.parse_args()
+
+	try:
+		call_command('migrate', verbosity=0)
+		start = time.perf_counter()
+		keys = seed(args.wraps, args.users)
+		print(f'seeded {args.wraps} wraps for {args.users} users in {time.perf_counter() - start:.1f} s')
+
+		index = Wraps._meta.indexes[0]
+		with connection.schema_editor() as editor:
+			editor.remove_index(Wraps, index)
+		before = time_queries(keys, args.rounds)
+		start = time.perf_counter()
+		with connection.schema_editor() as editor:
+			editor.add_index(Wraps, index)
+		print(f'built the index in {time.perf_counter() - start:.1f} s')
+		after = time_queries(keys, args.rounds)
+	finally:
+		connection.close()
+		SCRATCH_DB.unlink(missing_ok=True)
+		SCRATCH_DB.parent.rmdir()
+
+	print(f'{"query":<20} {"no index":>12} {"index":>12} {"speed-up":>10}')
+	for name in before:
+		print(f'{name:<20} {before[name] * 1000:>9.2f} ms {after[name] * 1000:>9.2f} ms {before[name] / after[name]:>9.1f}x')
+
+
+if __name__ == '__main__':
+	main()
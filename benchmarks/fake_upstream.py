@@ -0,0 +1,376 @@
+"""
+A local stand-in for Spotify and the LLM, for load and performance testing.
+
+Serves on one port everything the app calls upstream:
+
+- ``GET /authorize``, which redirects straight back to ``redirect_uri`` with a code
+- ``POST /api/token``, for the ``authorization_code`` and ``refresh_token`` grants
+- ``GET /v1/me`` and ``GET /v1/me/top/{tracks,artists}``
+- ``POST /v1/chat/completions`` (OpenAI-compatible, streamed or not)
+
+Responses are synthetic by default: payloads are generated deterministically from the
+access token, so every fake user has a stable listening history. Latency, server
+errors and 429 replies can be injected at configurable rates.
+
+With ``--record DIR`` every request is proxied to the real upstreams and the replies
+are saved to DIR; ``--replay DIR`` serves those replies again, cycling through the
+recordings of each endpoint. Recordings contain real access tokens, so keep them out
+of version control.
+
+Point the app at the server with:
+
+	SPOTIFY_ACCOUNTS_BASE_URL=http://127.0.0.1:8765
+	SPOTIFY_API_BASE_URL=http://127.0.0.1:8765/v1
+	LLM_BASE_URL=http://127.0.0.1:8765/v1
+
+Usage:
+	python benchmarks/fake_upstream.py [--port 8765] [--latency 0.1] [--jitter 0.05]
+		[--error-rate 0.01] [--rate-limit-rate 0.02] [--retry-after 1]
+		[--token-latency 0.02] [--record DIR | --replay DIR]
+"""
+import argparse
+import hashlib
+import json
+import random
+import secrets
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+SPOTIFY_API = 'https://api.spotify.com'
+SPOTIFY_ACCOUNTS = 'https://accounts.spotify.com'
+LLM_API = 'https://integrate.api.nvidia.com'
+
+GENRES = ['pop', 'indie rock', 'hip hop', 'jazz', 'lo-fi', 'k-pop', 'metal', 'house', 'folk', 'r&b', 'latin', 'soul']
+DESCRIPTION = (
+	"You probably own three identical black hoodies, plan your day around the perfect playlist "
+	"and think of a long bus ride as a private concert."
+)
+
+# Only these headers are kept when recording; the rest are hop-by-hop or irrelevant
+RECORDED_HEADERS = ('content-type', 'retry-after')
+
+
+def image(seed):
+	return [{'url': f'https://picsum.photos/seed/{seed}/640', 'height': 640, 'width': 640}]
+
+
+def fake_artist(rng, n):
+	artist_id = f'artist{n:04d}'
+	return {
+		'id': artist_id,
+		'name': f'Artist {n}',
+		'popularity': rng.randint(20, 100),
+		'genres': rng.sample(GENRES, rng.randint(1, 3)),
+		'images': image(artist_id),
+	}
+
+
+def fake_track(rng, n):
+	track_id = f'track{n:05d}'
+	artist = rng.randint(0, 499)
+	return {
+		'id': track_id,
+		'name': f'Track {n}',
+		'popularity': rng.randint(20, 100),
+		'preview_url': None,
+		'album': {'id': f'album{n // 10:04d}', 'name': f'Album {n // 10}', 'images': image(track_id)},
+		'artists': [{'id': f'artist{artist:04d}', 'name': f'Artist {artist}'}],
+	}
+
+
+def top_items(access_token, item_type, time_range, limit, offset=0):
+	"""
+	Builds a stable top-items page for a fake user.
+	"""
+	rng = random.Random(f'{access_token}:{item_type}:{time_range}')
+	pool = range(500) if item_type == 'artists' else range(5000)
+	picks = rng.sample(pool, offset + limit)[offset:]
+	make = fake_artist if item_type == 'artists' else fake_track
+	items = [make(random.Random(f'{item_type}:{n}'), n) for n in picks]
+	return {'items': items, 'total': 50, 'limit': limit, 'offset': offset, 'href': None, 'next': None, 'previous': None}
+
+
+class Recordings:
+	"""
+	Upstream replies saved per endpoint, one JSON file per (method, path, query).
+	"""
+
+	def __init__(self, directory):
+		self.directory = Path(directory)
+		self.directory.mkdir(parents=True, exist_ok=True)
+		self.cursors = {}
+		self.lock = threading.Lock()
+
+	def path(self, key):
+		return self.directory / f'{hashlib.sha1(key.encode()).hexdigest()[:16]}.json'
+
+	def save(self, key, status, headers, body):
+		with self.lock:
+			path = self.path(key)
+			entry = json.loads(path.read_text()) if path.exists() else {'key': key, 'responses': []}
+			entry['responses'].append({'status': status, 'headers': headers, 'body': body})
+			path.write_text(json.dumps(entry, indent=1))
+
+	def next(self, key):
+		with self.lock:
+			path = self.path(key)
+			if not path.exists():
+				return None
+			responses = json.loads(path.read_text())['responses']
+			cursor = self.cursors.get(key, 0)
+			self.cursors[key] = cursor + 1
+			return responses[cursor % len(responses)]
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+	"""
+	Routes a request to the recorder, the replayer or the synthetic responders.
+	"""
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		self.handle_request('GET')
+
+	def do_POST(self):
+		self.handle_request('POST')
+
+	def log_message(self, *args):
+		if self.server.verbose:
+			super().log_message(*args)
+
+	def handle_request(self, method):
+		url = urllib.parse.urlsplit(self.path)
+		self.route = url.path
+		self.query = dict(urllib.parse.parse_qsl(url.query))
+		length = int(self.headers.get('Content-Length') or 0)
+		self.body = self.rfile.read(length) if length else b''
+		key = f'{method} {url.path}?{urllib.parse.urlencode(sorted(self.query.items()))}'
+		self.server.count(url.path)
+
+		if self.server.record is not None:
+			return self.proxy(method, key)
+
+		delay = self.server.latency + random.uniform(0, self.server.jitter)
+		if delay:
+			time.sleep(delay)
+		if random.random() < self.server.rate_limit_rate:
+			return self.send_json(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}},
+			                      {'Retry-After': str(self.server.retry_after)})
+		if random.random() < self.server.error_rate:
+			return self.send_json(503, {'error': {'status': 503, 'message': 'Service unavailable'}})
+
+		if self.server.replay is not None:
+			recorded = self.server.replay.next(key)
+			if recorded is not None:
+				return self.send_body(recorded['status'], recorded['body'].encode(), recorded['headers'])
+
+		if method == 'GET' and url.path == '/authorize':
+			return self.authorize()
+		if method == 'POST' and url.path == '/api/token':
+			return self.token()
+		if method == 'GET' and url.path == '/v1/me':
+			return self.me()
+		if method == 'GET' and url.path.startswith('/v1/me/top/'):
+			return self.top(url.path.rsplit('/', 1)[1])
+		if method == 'POST' and url.path == '/v1/chat/completions':
+			return self.chat_completion()
+		if method == 'GET' and url.path == '/__stats':
+			return self.send_json(200, self.server.stats())
+		self.send_json(404, {'error': {'status': 404, 'message': 'Service not found'}})
+
+	def bearer(self):
+		authorization = self.headers.get('Authorization', '')
+		return authorization[len('Bearer '):] if authorization.startswith('Bearer ') else None
+
+	def authorize(self):
+		redirect = self.query.get('redirect_uri', 'http://localhost:8000/spotify/callback')
+		code = secrets.token_urlsafe(16)
+		params = urllib.parse.urlencode({'code': code, 'state': self.query.get('state', '')})
+		self.send_response(302)
+		self.send_header('Location', f'{redirect}?{params}')
+		self.send_header('Content-Length', '0')
+		self.end_headers()
+
+	def token(self):
+		form = dict(urllib.parse.parse_qsl(self.body.decode()))
+		if form.get('grant_type') not in ('authorization_code', 'refresh_token'):
+			return self.send_json(400, {'error': 'unsupported_grant_type'})
+		# Refreshing keeps the same fake user, so their history stays stable
+		user = form.get('refresh_token') or form.get('code') or secrets.token_urlsafe(8)
+		return self.send_json(200, {
+			'access_token': f'{user}.{secrets.token_urlsafe(8)}',
+			'token_type': 'Bearer',
+			'scope': 'user-read-private user-read-email user-top-read',
+			'expires_in': 3600,
+			'refresh_token': user,
+		})
+
+	def user_seed(self):
+		token = self.bearer()
+		return token.split('.', 1)[0] if token else None
+
+	def me(self):
+		user = self.user_seed()
+		if user is None:
+			return self.send_json(401, {'error': {'status': 401, 'message': 'No token provided'}})
+		return self.send_json(200, {
+			'id': f'user-{user}',
+			'display_name': f'Fake User {user[:6]}',
+			'country': 'US',
+			'product': 'premium',
+			'images': image(user),
+		})
+
+	def top(self, item_type):
+		user = self.user_seed()
+		if user is None:
+			return self.send_json(401, {'error': {'status': 401, 'message': 'No token provided'}})
+		if item_type not in ('tracks', 'artists'):
+			return self.send_json(404, {'error': {'status': 404, 'message': 'Service not found'}})
+		limit = min(int(self.query.get('limit', 20)), 50)
+		offset = int(self.query.get('offset', 0))
+		return self.send_json(200, top_items(user, item_type, self.query.get('time_range', 'medium_term'), limit, offset))
+
+	def chat_completion(self):
+		request = json.loads(self.body or b'{}')
+		model = request.get('model', 'fake-model')
+		completion_id = f'chatcmpl-{secrets.token_hex(8)}'
+		created = int(time.time())
+		prompt_tokens = sum(len(str(message.get('content', ''))) for message in request.get('messages', [])) // 4
+		completion_tokens = len(DESCRIPTION) // 4
+		usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+		         'total_tokens': prompt_tokens + completion_tokens}
+		if not request.get('stream'):
+			return self.send_json(200, {
+				'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+				'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': DESCRIPTION}, 'finish_reason': 'stop'}],
+				'usage': usage,
+			})
+
+		self.send_response(200)
+		self.send_header('Content-Type', 'text/event-stream')
+		self.send_header('Transfer-Encoding', 'chunked')
+		self.end_headers()
+		words = [word + ' ' for word in DESCRIPTION.split(' ')]
+		deltas = [{'role': 'assistant', 'content': ''}] + [{'content': word} for word in words] + [{}]
+		for n, delta in enumerate(deltas):
+			chunk = {
+				'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+				'choices': [{'index': 0, 'delta': delta, 'finish_reason': 'stop' if n == len(deltas) - 1 else None}],
+			}
+			self.write_chunk(f'data: {json.dumps(chunk)}\n\n'.encode())
+			if self.server.token_latency and 'content' in delta:
+				time.sleep(self.server.token_latency)
+		if (request.get('stream_options') or {}).get('include_usage'):
+			usage_chunk = {
+				'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+				'choices': [], 'usage': usage,
+			}
+			self.write_chunk(f'data: {json.dumps(usage_chunk)}\n\n'.encode())
+		self.write_chunk(b'data: [DONE]\n\n')
+		self.write_chunk(b'')
+
+	def write_chunk(self, data):
+		self.wfile.write(f'{len(data):X}\r\n'.encode() + data + b'\r\n')
+		self.wfile.flush()
+
+	def proxy(self, method, key):
+		if self.route in ('/authorize', '/api/token'):
+			base = SPOTIFY_ACCOUNTS
+		elif self.route == '/v1/chat/completions':
+			base = LLM_API
+		else:
+			base = SPOTIFY_API
+		headers = {name: value for name, value in self.headers.items()
+		           if name.lower() in ('authorization', 'content-type', 'accept')}
+		upstream = requests.request(method, base + self.path, headers=headers, data=self.body or None,
+		                            allow_redirects=False, timeout=60)
+		kept = {name: value for name, value in upstream.headers.items() if name.lower() in RECORDED_HEADERS}
+		if 'Location' in upstream.headers:
+			kept['Location'] = upstream.headers['Location']
+		self.server.record.save(key, upstream.status_code, kept, upstream.text)
+		self.send_body(upstream.status_code, upstream.content, kept)
+
+	def send_json(self, status, payload, headers=None):
+		self.send_body(status, json.dumps(payload).encode(), {'Content-Type': 'application/json', **(headers or {})})
+
+	def send_body(self, status, body, headers):
+		self.send_response(status)
+		for name, value in headers.items():
+			self.send_header(name, value)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+	"""
+	The threaded server holding the fault-injection settings and request counters.
+	"""
+	daemon_threads = True
+
+	def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, retry_after=1,
+	             token_latency=0.0, record=None, replay=None, verbose=False):
+		super().__init__(address, FakeUpstreamHandler)
+		self.latency = latency
+		self.jitter = jitter
+		self.error_rate = error_rate
+		self.rate_limit_rate = rate_limit_rate
+		self.retry_after = retry_after
+		self.token_latency = token_latency
+		self.record = Recordings(record) if record else None
+		self.replay = Recordings(replay) if replay else None
+		self.verbose = verbose
+		self.requests = {}
+		self.lock = threading.Lock()
+
+	def count(self, path):
+		with self.lock:
+			self.requests[path] = self.requests.get(path, 0) + 1
+
+	def stats(self):
+		with self.lock:
+			return {'requests': dict(self.requests)}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8765)
+	parser.add_argument('--latency', type=float, default=0.0, help='Base delay added to every reply (seconds)')
+	parser.add_argument('--jitter', type=float, default=0.0, help='Extra random delay of up to this many seconds')
+	parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 503')
+	parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of requests answered with a 429')
+	parser.add_argument('--retry-after', type=int, default=1, help='Retry-After of injected 429 replies (seconds)')
+	parser.add_argument('--token-latency', type=float, default=0.0, help='Delay between streamed completion chunks')
+	mode = parser.add_mutually_exclusive_group()
+	mode.add_argument('--record', metavar='DIR', help='Proxy to the real upstreams and save their replies')
+	mode.add_argument('--replay', metavar='DIR', help='Serve replies saved with --record')
+	parser.add_argument('--verbose', action='store_true', help='Log every request')
+	args = parser.parse_args()
+
+	server = FakeUpstreamServer(
+		(args.host, args.port), latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+		rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, token_latency=args.token_latency,
+		record=args.record, replay=args.replay, verbose=args.verbose,
+	)
+	base = f'http://{args.host}:{server.server_port}'
+	print(f'Fake upstreams listening on {base}')
+	print(f'  SPOTIFY_ACCOUNTS_BASE_URL={base}')
+	print(f'  SPOTIFY_API_BASE_URL={base}/v1')
+	print(f'  LLM_BASE_URL={base}/v1')
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+
+
+if __name__ == '__main__':
+	main()
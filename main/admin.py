@@ -1,7 +1,17 @@
 from django.contrib import admin
 
+from .models import Album
+from .models import Artist
+from .models import CachedDescription
+from .models import SpotifyProfile
+from .models import Track
 from .models import User
 from .models import Wraps
 
+admin.site.register(Album)
+admin.site.register(Artist)
+admin.site.register(CachedDescription)
+admin.site.register(Track)
 admin.site.register(User)
+admin.site.register(SpotifyProfile)
 admin.site.register(Wraps)
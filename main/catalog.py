@@ -0,0 +1,168 @@
+"""
+The catalog of tracks, albums and artists shared by every wrap.
+
+Popular tracks and artists turn up in thousands of wraps, so a wrap no longer stores
+their names, images and preview URLs itself. ``make_wrapped`` upserts them into the
+catalog tables with :func:`store_catalog` and saves the wrap with :func:`compact_wrap`,
+which keeps only the ordered Spotify IDs. Genres are bare names with nothing else to
+share, so they stay in the wrap as they are. :func:`hydrate_wrap` turns the stored form
+back into the full data with one batched query per catalog table, and
+:func:`response_body` wraps it in the body ``get_wrapped`` serves.
+
+Wraps saved before the catalog existed still hold their full track and artist
+entries; :func:`hydrate_wrap` passes those through unchanged.
+"""
+from django.db import transaction
+
+from .models import Album, Artist, Track
+
+
+def store_catalog(data):
+	"""
+	Upserts the tracks, albums and artists of a wrap into the catalog.
+
+	Entries already in the catalog are refreshed with the wrap's data, except that an
+	artist only known from a track credit never overwrites a fuller top-artist entry.
+
+	Args:
+		data (dict): The wrap's data, as built by ``make_wrapped``.
+	"""
+	tracks = {track['track_id']: track for track in data.get('top_tracks', [])}
+	artists = {artist['artist_id']: artist for artist in data.get('top_artists', [])}
+
+	albums = {
+		track['album_id']: Album(spotify_id=track['album_id'], name=track['album_name'], image_url=track['cover_image'])
+		for track in tracks.values()
+	}
+	credited = {
+		track['artist_id']: Artist(spotify_id=track['artist_id'], name=track['artist_name'])
+		for track in tracks.values() if track['artist_id'] not in artists
+	}
+
+	with transaction.atomic():
+		Album.objects.bulk_create(albums.values(), update_conflicts=True, unique_fields=['spotify_id'],
+		                          update_fields=['name', 'image_url'])
+		Artist.objects.bulk_create(
+			[Artist(spotify_id=artist_id, name=artist['artist_name'], image_url=artist['artist_image'],
+			        popularity=artist['popularity']) for artist_id, artist in artists.items()],
+			update_conflicts=True, unique_fields=['spotify_id'], update_fields=['name', 'image_url', 'popularity'],
+		)
+		Artist.objects.bulk_create(credited.values(), ignore_conflicts=True)
+		Track.objects.bulk_create(
+			[Track(spotify_id=track_id, name=track['track_name'], album_id=track['album_id'],
+			       artist_id=track['artist_id'], popularity=track['popularity'], preview_url=track['preview'])
+			 for track_id, track in tracks.items()],
+			update_conflicts=True, unique_fields=['spotify_id'],
+			update_fields=['name', 'album', 'artist', 'popularity', 'preview_url'],
+		)
+
+
+def compact_wrap(data):
+	"""
+	Returns the form of a wrap's data that is stored, with tracks and artists replaced by their IDs.
+
+	Args:
+		data (dict): The wrap's data, as built by ``make_wrapped``.
+
+	Returns:
+		dict: The data with ordered ID lists in ``top_tracks`` and ``top_artists``.
+	"""
+	compact = dict(data)
+	if 'top_tracks' in data:
+		compact['top_tracks'] = [track['track_id'] for track in data['top_tracks']]
+	if 'top_artists' in data:
+		compact['top_artists'] = [artist['artist_id'] for artist in data['top_artists']]
+	return compact
+
+
+def track_entry(track):
+	"""
+	Builds the entry of a catalog track as ``make_wrapped`` lists it.
+
+	Args:
+		track (Track): The track, with its album and artist loaded.
+
+	Returns:
+		dict: The track entry.
+	"""
+	return {
+		'track_name': track.name,
+		'track_id': track.spotify_id,
+		'album_name': track.album.name,
+		'album_id': track.album.spotify_id,
+		'artist_name': track.artist.name,
+		'artist_id': track.artist.spotify_id,
+		'popularity': track.popularity,
+		'cover_image': track.album.image_url,
+		'preview': track.preview_url,
+	}
+
+
+def artist_entry(artist):
+	"""
+	Builds the entry of a catalog artist as ``make_wrapped`` lists it.
+
+	Args:
+		artist (Artist): The artist.
+
+	Returns:
+		dict: The artist entry.
+	"""
+	return {
+		'artist_name': artist.name,
+		'artist_id': artist.spotify_id,
+		'popularity': artist.popularity,
+		'artist_image': artist.image_url,
+	}
+
+
+def hydrate_wrap(stored):
+	"""
+	Rebuilds a wrap's full data from its stored form.
+
+	IDs missing from the catalog are left out; full entries of older wraps are kept as they are.
+
+	Args:
+		stored (dict): The wrap's ``document``.
+
+	Returns:
+		dict: The data in the shape ``make_wrapped`` returned it.
+	"""
+	data = dict(stored)
+	track_ids = [entry for entry in data.get('top_tracks', []) if isinstance(entry, str)]
+	artist_ids = [entry for entry in data.get('top_artists', []) if isinstance(entry, str)]
+
+	if track_ids:
+		tracks = {track.spotify_id: track_entry(track)
+		          for track in Track.objects.select_related('album', 'artist').filter(spotify_id__in=track_ids)}
+		data['top_tracks'] = _resolve(data['top_tracks'], tracks)
+	if artist_ids:
+		artists = {artist.spotify_id: artist_entry(artist) for artist in Artist.objects.filter(spotify_id__in=artist_ids)}
+		data['top_artists'] = _resolve(data['top_artists'], artists)
+	return data
+
+
+def _resolve(entries, catalog):
+	return [catalog[entry] if isinstance(entry, str) else entry
+	        for entry in entries if not isinstance(entry, str) or entry in catalog]
+
+
+def response_body(wrap, data=None):
+	"""
+	Builds the get_wrapped response body of a wrap.
+
+	Args:
+		wrap (Wraps): The wrap, with its slug, creation date, description status and ``payload`` loaded.
+		data (dict, optional): The wrap's full data; hydrated from ``document`` when omitted.
+
+	Returns:
+		dict: The wrap's data with its slug, creation date and description status.
+	"""
+	if data is None:
+		data = hydrate_wrap(wrap.document)
+	return {
+		'data': data,
+		'slug': wrap.slug,
+		'dt': wrap.creation_date.isoformat(),
+		'description_status': wrap.description_status,
+	}
@@ -0,0 +1,156 @@
+"""
+Circuit breakers for the app's upstream dependencies (Spotify and the LLM).
+
+A breaker counts consecutive failures of calls to one dependency. Once they reach the
+threshold it *opens* and every call fails fast with :class:`CircuitOpen` instead of
+tying up a worker on an upstream that is down. After the recovery timeout it turns
+*half-open* and lets a limited number of probe calls through: a success closes it
+again, a failure re-opens it for another recovery period.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RECOVERY_TIMEOUT = 30.0
+DEFAULT_HALF_OPEN_MAX_CALLS = 1
+
+
+class CircuitOpen(Exception):
+	"""
+	Raised when a call is refused because its dependency's breaker is open.
+	"""
+
+
+class CircuitBreaker:
+	"""
+	A thread-safe closed / open / half-open circuit breaker.
+
+	Attributes:
+		name (str): Name of the protected dependency.
+		failure_threshold (int): Consecutive failures that open the breaker.
+		recovery_timeout (float): Seconds the breaker stays open before probing.
+		half_open_max_calls (int): Probe calls allowed at once while half-open.
+	"""
+
+	def __init__(self, name, failure_threshold=DEFAULT_FAILURE_THRESHOLD, recovery_timeout=DEFAULT_RECOVERY_TIMEOUT,
+	             half_open_max_calls=DEFAULT_HALF_OPEN_MAX_CALLS):
+		self.name = name
+		self.failure_threshold = failure_threshold
+		self.recovery_timeout = recovery_timeout
+		self.half_open_max_calls = half_open_max_calls
+		self.state = CLOSED
+		self.failures = 0
+		self.opened_at = None
+		self.probes = 0
+		self.total_failures = 0
+		self.rejected = 0
+		self._lock = threading.Lock()
+
+	def allow(self):
+		"""
+		Admits a call, moving an open breaker to half-open once its recovery timeout has passed.
+
+		Every admitted call must be followed by :meth:`record_success`, :meth:`record_failure`
+		or, if it ended without an answer from the dependency, :meth:`release`.
+
+		Raises:
+			CircuitOpen: If the breaker is open, or half-open with all probe slots taken.
+		"""
+		with self._lock:
+			if self.state == OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+				self.state = HALF_OPEN
+				self.probes = 0
+			if self.state == CLOSED:
+				return
+			if self.state == HALF_OPEN and self.probes < self.half_open_max_calls:
+				self.probes += 1
+				return
+			self.rejected += 1
+			raise CircuitOpen(f'The {self.name} circuit breaker is {self.state}')
+
+	def record_success(self):
+		"""
+		Records a healthy reply, closing a half-open breaker.
+
+		A call admitted before the breaker opened does not close it; only probes do.
+		"""
+		with self._lock:
+			if self.state == OPEN:
+				return
+			self.state = CLOSED
+			self.failures = 0
+			self.probes = 0
+
+	def record_failure(self):
+		"""
+		Records a failed call, opening the breaker at the threshold or when a probe fails.
+		"""
+		with self._lock:
+			self.failures += 1
+			self.total_failures += 1
+			if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+				self.state = OPEN
+				self.opened_at = time.monotonic()
+				self.probes = 0
+
+	def release(self):
+		"""
+		Frees an admitted call's probe slot without recording an outcome.
+
+		For calls that were cancelled or failed on our side, which say nothing about the
+		dependency's health.
+		"""
+		with self._lock:
+			if self.state == HALF_OPEN and self.probes:
+				self.probes -= 1
+
+	def stats(self):
+		"""
+		Reports the breaker's state.
+
+		Returns:
+			dict: Current state, consecutive and total failures, rejected calls and seconds until the next probe.
+		"""
+		with self._lock:
+			retry_in = None
+			if self.state == OPEN:
+				retry_in = round(max(self.recovery_timeout - (time.monotonic() - self.opened_at), 0.0), 3)
+			return {
+				'state': self.state,
+				'consecutive_failures': self.failures,
+				'total_failures': self.total_failures,
+				'rejected': self.rejected,
+				'retry_in': retry_in,
+			}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+	"""
+	Returns the process-wide breaker of a dependency, configured from ``CIRCUIT_BREAKERS``.
+
+	Args:
+		name (str): The dependency, e.g. ``'spotify'`` or ``'llm'``.
+
+	Returns:
+		CircuitBreaker: The shared breaker.
+	"""
+	with _breakers_lock:
+		if name not in _breakers:
+			options = getattr(settings, 'CIRCUIT_BREAKERS', {}).get(name, {})
+			_breakers[name] = CircuitBreaker(
+				name,
+				failure_threshold=options.get('FAILURE_THRESHOLD', DEFAULT_FAILURE_THRESHOLD),
+				recovery_timeout=options.get('RECOVERY_TIMEOUT', DEFAULT_RECOVERY_TIMEOUT),
+				half_open_max_calls=options.get('HALF_OPEN_MAX_CALLS', DEFAULT_HALF_OPEN_MAX_CALLS),
+			)
+		return _breakers[name]
@@ -0,0 +1,17 @@
+from .models import WRAP_SLUG_LENGTH
+
+
+class WrapSlugConverter:
+	"""
+	Matches wrap slugs, and nothing else, in URLs.
+
+	ISO timestamps contain dashes or colons, so the URLs wraps had before slugs fall
+	through to the legacy routes that redirect them.
+	"""
+	regex = f'[0-9A-Za-z]{{{WRAP_SLUG_LENGTH}}}'
+
+	def to_python(self, value):
+		return value
+
+	def to_url(self, value):
+		return value
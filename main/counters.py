@@ -0,0 +1,22 @@
+"""
+Counters kept in Django's cache, such as the hit/miss totals on the status endpoint.
+"""
+from django.core.cache import cache as default_cache
+
+
+def incr_counter(key, delta=1, cache=None):
+	"""
+	Adds to a counter that never expires, starting it from zero if it does not exist.
+
+	Args:
+		key (str): The counter's cache key.
+		delta (int): Amount to add.
+		cache (BaseCache, optional): Cache holding the counter; defaults to the default cache.
+	"""
+	if cache is None:
+		cache = default_cache
+	cache.add(key, 0, timeout=None)
+	try:
+		cache.incr(key, delta)
+	except ValueError:  # The counter was evicted between add() and incr()
+		cache.set(key, delta, timeout=None)
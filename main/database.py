@@ -0,0 +1,32 @@
+"""
+Tunes every new SQLite connection for concurrent requests.
+
+Out of the box SQLite journals with a rollback file, so a writer locks readers
+out and every commit waits for a full sync to disk. :func:`configure_sqlite` runs
+the ``SQLITE_PRAGMAS`` setting on each connection Django opens: write-ahead logging
+lets readers run alongside the one writer, ``synchronous=NORMAL`` drops the sync
+from most commits, ``busy_timeout`` sets how long a writer queues for the lock
+before raising "database is locked", and the cache and memory map sizes keep hot
+pages off disk. Transactions begin ``IMMEDIATE`` (``OPTIONS['transaction_mode']``),
+so they queue for the write lock up front rather than fail when a read lock can't
+be upgraded.
+
+Pragmas run in the order they are listed; ``busy_timeout`` goes first so switching
+the journal mode also waits for the lock. Other database vendors are left alone.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+	"""
+	Runs the ``SQLITE_PRAGMAS`` setting on a new SQLite connection.
+	"""
+	if connection.vendor != 'sqlite':
+		return
+	pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+	with connection.cursor() as cursor:
+		for name, value in pragmas.items():
+			cursor.execute(f'PRAGMA {name} = {value}')
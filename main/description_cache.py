@@ -0,0 +1,187 @@
+"""
+Content-addressed cache of AI descriptions, keyed by a taste fingerprint.
+
+Many users share much the same top artists and genres, and the description only
+depends on those. A wrap's fingerprint is its term plus its sorted top artist IDs and
+top genres; wraps with the same fingerprint reuse one stored description instead of
+paying for another LLM completion. With a similarity threshold below 1, a wrap whose
+features overlap a cached entry's by at least that Jaccard similarity reuses it too.
+Only entries written with the current ``PROMPT_VERSION`` are served; an older one is
+replaced when its fingerprint's description is generated again.
+
+Entries live in the database (:class:`~main.models.CachedDescription`), so they
+survive restarts; the least recently used ones are evicted past a configured count.
+Hit/miss counters and the LLM time saved are kept in the default cache.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .counters import incr_counter
+from .models import CachedDescription
+from .prompts import PROMPT_VERSION
+
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_SIMILARITY = 1.0
+DEFAULT_SCAN_LIMIT = 500
+TOP_GENRES = 5
+
+HITS_KEY = 'descriptions:hits'
+NEAR_HITS_KEY = 'descriptions:near-hits'
+MISSES_KEY = 'descriptions:misses'
+SAVED_MS_KEY = 'descriptions:saved-ms'
+
+
+def taste_features(data):
+	"""
+	Extracts the normalized features a description depends on.
+
+	Args:
+		data (dict): The wrap's Spotify data, as built by ``make_wrapped``.
+
+	Returns:
+		list: Sorted ``'artist:<id>'`` and ``'genre:<name>'`` entries.
+	"""
+	artists = {f"artist:{artist['artist_id']}" for artist in data.get('top_artists', [])}
+	# top_genres is sorted by ascending count, so the most common genres come last
+	genres = {f'genre:{genre.strip().lower()}' for genre in data.get('top_genres', [])[-TOP_GENRES:]}
+	return sorted(artists | genres)
+
+
+def taste_fingerprint(term, features):
+	"""
+	Hashes a term and its features into a stable cache key.
+
+	Args:
+		term (str): The wrap's time range.
+		features (list): Output of :func:`taste_features`.
+
+	Returns:
+		str: Hex SHA-256 digest.
+	"""
+	return hashlib.sha256(json.dumps([term, features]).encode()).hexdigest()
+
+
+def jaccard(a, b):
+	"""
+	Returns the Jaccard similarity of two feature collections.
+	"""
+	a, b = set(a), set(b)
+	return len(a & b) / len(a | b) if a | b else 1.0
+
+
+class DescriptionCache:
+	"""
+	Looks up and stores AI descriptions by taste fingerprint.
+
+	Attributes:
+		max_entries (int): Entries kept before the least recently used are evicted.
+		similarity (float): Minimum Jaccard similarity for a near-duplicate hit; 1 disables them.
+		scan_limit (int): Most recently used entries of a term compared for near-duplicates.
+	"""
+
+	def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, similarity=DEFAULT_SIMILARITY, scan_limit=DEFAULT_SCAN_LIMIT):
+		self.max_entries = max_entries
+		self.similarity = similarity
+		self.scan_limit = scan_limit
+
+	def _nearest(self, term, features):
+		"""
+		Returns the primary key of the most similar entry above the threshold, if any.
+		"""
+		candidates = (CachedDescription.objects.filter(term=term, prompt_version=PROMPT_VERSION).order_by('-last_used_at')
+		              .values_list('pk', 'features')[:self.scan_limit])
+		best, best_score = None, self.similarity
+		for pk, candidate in candidates:
+			score = jaccard(features, candidate)
+			if score >= best_score:
+				best, best_score = pk, score
+		return best
+
+	def get(self, data):
+		"""
+		Looks up a description for a wrap.
+
+		Args:
+			data (dict): The wrap's Spotify data.
+
+		Returns:
+			str or None: The cached description, or None on a miss.
+		"""
+		term = data.get('time_range', '')
+		features = taste_features(data)
+		entry = CachedDescription.objects.filter(fingerprint=taste_fingerprint(term, features),
+		                                         prompt_version=PROMPT_VERSION).first()
+		if entry is None and self.similarity < 1:
+			pk = self._nearest(term, features)
+			entry = CachedDescription.objects.filter(pk=pk).first() if pk is not None else None
+			if entry is not None:
+				incr_counter(NEAR_HITS_KEY)
+		if entry is None:
+			incr_counter(MISSES_KEY)
+			return None
+
+		CachedDescription.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+		incr_counter(HITS_KEY)
+		incr_counter(SAVED_MS_KEY, round(entry.generation_seconds * 1000))
+		return entry.description
+
+	def set(self, data, description, generation_seconds):
+		"""
+		Stores a freshly generated description, evicting the least recently used entries over the cap.
+
+		Args:
+			data (dict): The wrap's Spotify data.
+			description (str): The generated description.
+			generation_seconds (float): How long the LLM took to produce it.
+		"""
+		term = data.get('time_range', '')
+		features = taste_features(data)
+		CachedDescription.objects.update_or_create(fingerprint=taste_fingerprint(term, features), defaults={
+			'term': term,
+			'features': features,
+			'description': description,
+			'prompt_version': PROMPT_VERSION,
+			'generation_seconds': generation_seconds,
+			'last_used_at': timezone.now(),
+		})
+		stale = CachedDescription.objects.order_by('-last_used_at').values_list('pk', flat=True)[self.max_entries:]
+		stale = list(stale)
+		if stale:
+			CachedDescription.objects.filter(pk__in=stale).delete()
+
+	def stats(self):
+		"""
+		Reports the cache's counters.
+
+		Returns:
+			dict: Hits (of which near-duplicates), misses, hit rate, LLM seconds saved and stored entries.
+		"""
+		hits = cache.get(HITS_KEY, 0)
+		misses = cache.get(MISSES_KEY, 0)
+		return {
+			'hits': hits,
+			'near_hits': cache.get(NEAR_HITS_KEY, 0),
+			'misses': misses,
+			'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+			'llm_seconds_saved': cache.get(SAVED_MS_KEY, 0) / 1000,
+			'entries': CachedDescription.objects.count(),
+		}
+
+
+def get_description_cache():
+	"""
+	Returns a description cache configured from settings.
+
+	Returns:
+		DescriptionCache: The cache.
+	"""
+	return DescriptionCache(
+		max_entries=getattr(settings, 'DESCRIPTION_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+		similarity=getattr(settings, 'DESCRIPTION_CACHE_SIMILARITY', DEFAULT_SIMILARITY),
+		scan_limit=getattr(settings, 'DESCRIPTION_CACHE_SCAN_LIMIT', DEFAULT_SCAN_LIMIT),
+	)
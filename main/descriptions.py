@@ -0,0 +1,167 @@
+"""
+AI descriptions of wraps, generated in the background.
+
+``make_wrapped`` saves a wrap as soon as its Spotify data is in and marks its
+description *pending*; the streamed LLM completion is then drained on a dedicated
+event loop thread and written into the wrap when it is done. While it streams, the
+text so far is kept in the cache, where :func:`main.views.stream_description` tails it
+to ``AstroAI.html`` as server-sent events.
+
+A cache lease marks every description in flight. If the process running a job dies,
+the lease expires and the next poll for that wrap queues the job again.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import close_old_connections
+from openai import OpenAIError
+
+from .circuit import CircuitOpen, get_breaker
+from .description_cache import get_description_cache
+from .llm import get_provider
+from .models import Wraps
+from .prompts import PROMPT_VERSION, build_description_prompt, record_usage
+
+logger = logging.getLogger(__name__)
+
+# Longest a description job may run before a poll is allowed to queue it again
+LEASE_SECONDS = 120
+
+# Seconds between updates of the partial description streamed to AstroAI
+PARTIAL_FLUSH_INTERVAL = 0.05
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def lease_key(wrap_id):
+	return f'wrap:description:{wrap_id}'
+
+
+def partial_key(wrap_id):
+	return f'wrap:description:{wrap_id}:partial'
+
+
+async def llama_description(data, on_progress=None):
+	"""
+	Generates a witty description of a user's Spotify Wrapped data using AI.
+
+	Args:
+		data (dict): Data containing the user's Spotify Wrapped information.
+		on_progress (callable, optional): Coroutine function awaited with the text so far as chunks arrive.
+
+	Returns:
+		str: A concise and engaging description of the user's music preferences.
+	"""
+	breaker = get_breaker('llm')
+	try:
+		breaker.allow()
+	except CircuitOpen:
+		return ""  # The LLM is failing; skip the description rather than stall the wrap
+
+	prompt = build_description_prompt(data)
+	try:
+		response, usage = await get_provider().complete(prompt, on_progress=on_progress)
+	except OpenAIError:
+		logger.exception('Generating the AI description failed')
+		breaker.record_failure()
+		return ""
+	except BaseException:
+		# Cancelled or crashed on our side; not the LLM's fault, but free the call's slot,
+		# or a half-open breaker never admits another probe
+		breaker.release()
+		raise
+	breaker.record_success()
+	await sync_to_async(record_usage)(prompt, response, usage)
+
+	return response
+
+
+def _get_loop():
+	"""
+	Returns the event loop description jobs run on, starting its thread on first use.
+
+	Returns:
+		asyncio.AbstractEventLoop: The background loop.
+	"""
+	global _loop
+	with _loop_lock:
+		if _loop is None:
+			_loop = asyncio.new_event_loop()
+			threading.Thread(target=_loop.run_forever, name='wrap-descriptions', daemon=True).start()
+		return _loop
+
+
+def save_description(wrap_id, description):
+	"""
+	Writes a generated description into its wrap and marks it ready, or failed if empty.
+
+	Args:
+		wrap_id (int): Primary key of the wrap.
+		description (str): The generated description.
+	"""
+	close_old_connections()
+	try:
+		wrap = Wraps.objects.get(pk=wrap_id)
+		wrap.document = {**wrap.document, 'llama_description': description, 'llama_description_version': PROMPT_VERSION}
+		wrap.description_status = Wraps.DESCRIPTION_READY if description else Wraps.DESCRIPTION_FAILED
+		wrap.save(update_fields=['payload', 'description_status'])
+	except Wraps.DoesNotExist:
+		pass  # The wrap was deleted while its description was being written
+	finally:
+		cache.delete_many([lease_key(wrap_id), partial_key(wrap_id)])
+		close_old_connections()
+
+
+async def generate_description(wrap_id, data):
+	"""
+	Generates and stores the description of a wrap; run on the background loop.
+
+	Wraps with the same taste as an earlier one reuse its description instead of calling the LLM.
+
+	Args:
+		wrap_id (int): Primary key of the wrap.
+		data (dict): The wrap's Spotify data.
+	"""
+	description_cache = get_description_cache()
+	description = await sync_to_async(description_cache.get)(data)
+	if description is None:
+		started = time.monotonic()
+		last_flush = 0.0
+
+		async def publish(text):
+			# Readers of the SSE stream tail this key; a flush per chunk is more than they need
+			nonlocal last_flush
+			if time.monotonic() - last_flush >= PARTIAL_FLUSH_INTERVAL:
+				last_flush = time.monotonic()
+				await cache.aset(partial_key(wrap_id), text, timeout=LEASE_SECONDS)
+
+		try:
+			description = await llama_description(data, on_progress=publish)
+		except Exception:  # pylint: disable=broad-except
+			logger.exception('Generating the description of wrap %s failed', wrap_id)
+			description = ''
+		if description:
+			await sync_to_async(description_cache.set)(data, description, time.monotonic() - started)
+	await sync_to_async(save_description)(wrap_id, description)
+
+
+def schedule_description(wrap_id, data):
+	"""
+	Queues the description of a wrap unless a job for it is already running.
+
+	Args:
+		wrap_id (int): Primary key of the wrap.
+		data (dict): The wrap's Spotify data.
+
+	Returns:
+		bool: Whether a job was queued.
+	"""
+	if not cache.add(lease_key(wrap_id), 1, timeout=LEASE_SECONDS):
+		return False
+	asyncio.run_coroutine_threadsafe(generate_description(wrap_id, data), _get_loop())
+	return True
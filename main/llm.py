@@ -0,0 +1,287 @@
+"""
+Pluggable LLM providers for the AI description.
+
+:func:`get_provider` returns the process-wide provider named by ``LLM_PROVIDER``:
+
+- ``'openai'`` talks to any OpenAI-compatible endpoint (``LLM_BASE_URL``, ``LLM_MODEL``)
+  through one pooled ``AsyncOpenAI`` client per event loop, so connections are reused
+  across completions instead of a new client being built for every wrap.
+- ``'stub'`` generates a deterministic description locally, for load tests and
+  development without an API key.
+
+A dotted path to another :class:`LLMProvider` subclass works too. Every provider caps
+its concurrent completions at ``LLM_MAX_CONCURRENCY``; description jobs all run on
+one background event loop, so that is a per-process cap on upstream concurrency.
+"""
+import abc
+import asyncio
+import hashlib
+import os
+import threading
+import weakref
+
+import httpx
+from django.conf import settings
+from django.utils.module_loading import import_string
+from openai import AsyncOpenAI
+
+from .prompts import estimate_tokens
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_TIMEOUT = (5, 30)
+
+
+class Usage:
+	"""
+	Token usage of one completion.
+
+	Attributes:
+		prompt_tokens (int): Tokens in the prompt.
+		completion_tokens (int): Tokens in the reply.
+	"""
+
+	def __init__(self, prompt_tokens, completion_tokens):
+		self.prompt_tokens = prompt_tokens
+		self.completion_tokens = completion_tokens
+
+
+class LLMProvider(abc.ABC):
+	"""
+	Base class of the completion backends.
+
+	Subclasses implement :meth:`_complete`; callers use :meth:`complete`, which applies
+	the concurrency cap.
+
+	Attributes:
+		model (str): Model the completions are requested from.
+		max_concurrency (int): Most completions in flight at once per event loop.
+	"""
+
+	def __init__(self, model='', max_concurrency=DEFAULT_MAX_CONCURRENCY):
+		self.model = model
+		self.max_concurrency = max_concurrency
+		self.in_flight = 0
+		self.max_in_flight = 0
+		self.waiting = 0
+		self.completions = 0
+		self._semaphores = weakref.WeakKeyDictionary()
+		self._lock = threading.Lock()
+
+	def _semaphore(self):
+		loop = asyncio.get_running_loop()
+		with self._lock:
+			semaphore = self._semaphores.get(loop)
+			if semaphore is None:
+				semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+			return semaphore
+
+	async def complete(self, prompt, on_progress=None):
+		"""
+		Streams a completion, waiting for a free slot when the concurrency cap is reached.
+
+		Args:
+			prompt (DescriptionPrompt): The messages and output budget.
+			on_progress (callable, optional): Coroutine function awaited with the text so far as chunks arrive.
+
+		Returns:
+			tuple: The completed text and its :class:`Usage`, or None if the backend reported none.
+
+		Raises:
+			openai.OpenAIError: If the backend could not produce a completion.
+		"""
+		acquired = False
+		with self._lock:
+			self.waiting += 1
+		try:
+			async with self._semaphore():
+				with self._lock:
+					acquired = True
+					self.waiting -= 1
+					self.in_flight += 1
+					self.max_in_flight = max(self.max_in_flight, self.in_flight)
+				try:
+					return await self._complete(prompt, on_progress)
+				finally:
+					with self._lock:
+						self.in_flight -= 1
+						self.completions += 1
+		finally:
+			if not acquired:  # Cancelled while waiting for a slot
+				with self._lock:
+					self.waiting -= 1
+
+	@abc.abstractmethod
+	async def _complete(self, prompt, on_progress):
+		"""
+		Produces one completion; called by :meth:`complete` once a slot is free.
+
+		Args:
+			prompt (DescriptionPrompt): The messages and output budget.
+			on_progress (callable or None): Coroutine function awaited with the text so far as chunks arrive.
+
+		Returns:
+			tuple: The completed text and its :class:`Usage`, or None if the backend reported none.
+		"""
+
+	def stats(self):
+		"""
+		Reports the provider's concurrency counters.
+
+		Returns:
+			dict: Provider and model, the cap, completions in flight, their peak, callers waiting and completions done.
+		"""
+		with self._lock:
+			return {
+				'provider': type(self).__name__,
+				'model': self.model,
+				'max_concurrency': self.max_concurrency,
+				'in_flight': self.in_flight,
+				'max_in_flight': self.max_in_flight,
+				'waiting': self.waiting,
+				'completions': self.completions,
+			}
+
+
+class OpenAIProvider(LLMProvider):
+	"""
+	Completions from an OpenAI-compatible endpoint over a pooled client.
+
+	An ``AsyncOpenAI`` client wraps an ``httpx.AsyncClient``, which is bound to the event
+	loop it was first used on, so one client is kept per running loop.
+
+	Attributes:
+		base_url (str): The endpoint, e.g. NVIDIA's or a local fake server's.
+		api_key (str): Key sent with every request.
+		timeout (tuple): (connect, read) timeout in seconds.
+	"""
+
+	def __init__(self, base_url, api_key, model, timeout=DEFAULT_TIMEOUT, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+		super().__init__(model=model, max_concurrency=max_concurrency)
+		self.base_url = base_url
+		self.api_key = api_key
+		self.timeout = timeout
+		self._clients = weakref.WeakKeyDictionary()
+
+	@property
+	def client(self):
+		"""
+		AsyncOpenAI: The pooled client of the running event loop.
+		"""
+		loop = asyncio.get_running_loop()
+		client = self._clients.get(loop)
+		if client is None:
+			connect, read = self.timeout
+			client = AsyncOpenAI(
+				base_url=self.base_url,
+				api_key=self.api_key,
+				timeout=httpx.Timeout(read, connect=connect),
+				max_retries=0,  # The circuit breaker decides when to try again
+				http_client=httpx.AsyncClient(limits=httpx.Limits(
+					max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)),
+			)
+			self._clients[loop] = client
+		return client
+
+	async def _complete(self, prompt, on_progress):
+		completion = await self.client.chat.completions.create(
+			model=self.model,
+			messages=prompt.messages,
+			temperature=0.1,
+			top_p=0.5,
+			max_tokens=prompt.max_output_tokens,
+			stream=True,
+			stream_options={'include_usage': True},
+		)
+		text = ""  # Collect all the content here
+		usage = None
+		async for chunk in completion:
+			if chunk.usage is not None:
+				usage = chunk.usage
+			if not chunk.choices:  # The usage chunk carries no content
+				continue
+			delta_content = chunk.choices[0].delta.content
+			if delta_content:  # Only add non-None content
+				text += delta_content
+				if on_progress is not None:
+					await on_progress(text)
+		return text, usage
+
+
+class StubProvider(LLMProvider):
+	"""
+	A local backend that streams a description chosen deterministically from the prompt.
+
+	The same prompt always yields the same text, and no network or API key is needed.
+
+	Attributes:
+		token_latency (float): Seconds to wait before each streamed word.
+	"""
+
+	DESCRIPTIONS = [
+		"Probably owns three identical black hoodies and treats every bus ride like a private concert.",
+		"Thinks in playlists, dresses in thrifted denim and has strong opinions about vinyl pressings.",
+		"Shows up ten minutes late in sunglasses, humming a chorus nobody else has heard yet.",
+		"Color-codes their closet, overthinks texts and dances like nobody has ever been watching.",
+		"Lives in oversized tees, romanticizes rainy days and narrates life like a movie soundtrack.",
+	]
+
+	def __init__(self, model='stub', max_concurrency=DEFAULT_MAX_CONCURRENCY, token_latency=0.0):
+		super().__init__(model=model, max_concurrency=max_concurrency)
+		self.token_latency = token_latency
+
+	async def _complete(self, prompt, on_progress):
+		content = ''.join(message['content'] for message in prompt.messages)
+		digest = int(hashlib.sha256(content.encode()).hexdigest(), 16)
+		words = self.DESCRIPTIONS[digest % len(self.DESCRIPTIONS)].split(' ')
+		text = ''
+		for n, word in enumerate(words):
+			if self.token_latency:
+				await asyncio.sleep(self.token_latency)
+			text += word if n == 0 else f' {word}'
+			if on_progress is not None:
+				await on_progress(text)
+		return text, Usage(prompt.input_tokens, estimate_tokens(text))
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def build_provider(name):
+	"""
+	Creates a provider configured from settings.
+
+	Args:
+		name (str): ``'openai'``, ``'stub'`` or a dotted path to an :class:`LLMProvider` subclass.
+
+	Returns:
+		LLMProvider: The new provider.
+	"""
+	max_concurrency = getattr(settings, 'LLM_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY)
+	if name == 'openai':
+		return OpenAIProvider(
+			base_url=settings.LLM_BASE_URL,
+			api_key=os.getenv('OPENAI_API_KEY'),
+			model=settings.LLM_MODEL,
+			timeout=getattr(settings, 'LLM_TIMEOUT', DEFAULT_TIMEOUT),
+			max_concurrency=max_concurrency,
+		)
+	if name == 'stub':
+		return StubProvider(max_concurrency=max_concurrency,
+		                    token_latency=getattr(settings, 'LLM_STUB_TOKEN_LATENCY', 0.0))
+	return import_string(name)(model=getattr(settings, 'LLM_MODEL', ''), max_concurrency=max_concurrency)
+
+
+def get_provider():
+	"""
+	Returns the process-wide provider named by ``LLM_PROVIDER``, creating it on first use.
+
+	Returns:
+		LLMProvider: The shared provider.
+	"""
+	global _provider
+	if _provider is None:
+		with _provider_lock:
+			if _provider is None:
+				_provider = build_provider(getattr(settings, 'LLM_PROVIDER', 'openai'))
+	return _provider
@@ -0,0 +1,204 @@
+"""
+Regenerates missing or stale AI descriptions of existing wraps.
+
+Runs outside the web process, so backfilling never competes with wrap requests for
+the server's LLM slots. Wraps are scanned in primary-key order, one chunk at a time;
+the last finished chunk is recorded in a checkpoint file, so an interrupted run picks
+up where it stopped. Wraps left pending by a background job that died are picked up
+too. Wraps whose description failed are recorded in the checkpoint as well and tried
+again once the scan is done, and by every later run until they succeed. Completions
+run with bounded parallelism, draw from a tokens-per-minute budget and wait out an
+open LLM circuit breaker rather than fail fast while it lasts.
+
+Usage:
+	python manage.py backfill_descriptions [--stale] [--chunk-size 200] [--concurrency 4]
+		[--tokens-per-minute 20000] [--checkpoint PATH] [--restart] [--limit N] [--dry-run]
+"""
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from main.catalog import hydrate_wrap
+from main.circuit import get_breaker
+from main.description_cache import get_description_cache
+from main.descriptions import LEASE_SECONDS, lease_key, llama_description, save_description
+from main.models import Wraps
+from main.prompts import PROMPT_VERSION, build_description_prompt
+from main.ratelimit import TokenBucket
+
+
+def needs_description(wrap, stale):
+	"""
+	Checks whether a wrap's description should be regenerated.
+
+	Args:
+		wrap (Wraps): The wrap, with ``payload`` and ``description_status`` loaded.
+		stale (bool): Also regenerate descriptions written with an older prompt version.
+
+	Returns:
+		bool: True if the description is missing, failed, (with ``stale``) outdated, or
+			pending with no job holding its lease any more.
+	"""
+	if wrap.description_status == Wraps.DESCRIPTION_PENDING:
+		# Its job holds the lease until it saves; a job lost to a restart or crash lets it lapse.
+		# Only a cache shared with the web processes (REDIS_URL) shows their leases here.
+		return cache.get(lease_key(wrap.pk)) is None
+	data = wrap.document
+	if wrap.description_status == Wraps.DESCRIPTION_FAILED or not data.get('llama_description'):
+		return True
+	return stale and data.get('llama_description_version', 1) < PROMPT_VERSION
+
+
+class Command(BaseCommand):
+	help = 'Regenerates missing or stale AI descriptions of existing wraps, resumably and within a token budget.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--stale', action='store_true',
+		                    help='Also regenerate descriptions written with an older prompt version.')
+		parser.add_argument('--chunk-size', type=int, default=200, help='Wraps scanned per chunk.')
+		parser.add_argument('--concurrency', type=int, default=4, help='Completions in flight at once.')
+		parser.add_argument('--tokens-per-minute', type=int, default=20000,
+		                    help='Estimated prompt and reply tokens allowed per minute.')
+		parser.add_argument('--checkpoint', default='backfill_descriptions.checkpoint.json',
+		                    help='File recording the progress of the run.')
+		parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the first wrap.')
+		parser.add_argument('--limit', type=int, help='Stop after regenerating this many descriptions.')
+		parser.add_argument('--dry-run', action='store_true', help='Only count the wraps that would be regenerated.')
+
+	def handle(self, *args, **options):
+		checkpoint = Path(options['checkpoint'])
+		progress = {'last_pk': 0, 'scanned': 0, 'regenerated': 0, 'cached': 0, 'retry': [], 'tokens': 0}
+		if checkpoint.exists() and not options['restart']:
+			progress.update(json.loads(checkpoint.read_text()))
+			self.stdout.write(f"Resuming after wrap {progress['last_pk']}")
+
+		tokens_per_minute = options['tokens_per_minute']
+		self.budget = TokenBucket(rate=tokens_per_minute / 60, burst=tokens_per_minute)
+		self.semaphore = None
+		self.options = options
+		try:
+			asyncio.run(self.backfill(progress, checkpoint))
+		except KeyboardInterrupt:
+			self.stdout.write(f"Interrupted; rerun to resume after wrap {progress['last_pk']}")
+			return
+		self.stdout.write(self.style.SUCCESS(
+			f"{'Dry run' if options['dry_run'] else 'Done'}: scanned {progress['scanned']}, regenerated {progress['regenerated']} "
+			f"({progress['cached']} from the description cache), failed {len(progress['retry'])}, "
+			f"~{progress['tokens']} tokens"
+		))
+
+	def save(self, progress, checkpoint):
+		if not self.options['dry_run']:
+			checkpoint.write_text(json.dumps(progress))
+
+	async def run_chunk(self, todo, progress):
+		"""
+		Regenerates the descriptions of a batch of wraps and tallies the results.
+
+		Returns:
+			list: Primary keys of the wraps whose description failed.
+		"""
+		if not self.options['dry_run']:
+			results = await asyncio.gather(*(self.regenerate(wrap) for wrap in todo))
+		else:
+			results = [(True, False, 0)] * len(todo)
+
+		failed = []
+		for wrap, (ok, cached, tokens) in zip(todo, results):
+			if ok:
+				progress['regenerated'] += 1
+			else:
+				failed.append(wrap.pk)
+			progress['cached'] += cached
+			progress['tokens'] += tokens
+		return failed
+
+	async def backfill(self, progress, checkpoint):
+		self.semaphore = asyncio.Semaphore(self.options['concurrency'])
+		limit = self.options['limit']
+		retry = set(progress['retry'])
+		while limit is None or progress['regenerated'] < limit:
+			chunk = await sync_to_async(list)(
+				Wraps.objects.filter(pk__gt=progress['last_pk']).order_by('pk')
+				.only('pk', 'payload', 'description_status')[:self.options['chunk_size']]
+			)
+			if not chunk:
+				break
+			todo = [wrap for wrap in chunk if needs_description(wrap, self.options['stale'])]
+			if limit is not None:
+				todo = todo[:limit - progress['regenerated']]
+			retry.update(await self.run_chunk(todo, progress))
+
+			progress['scanned'] += len(chunk)
+			progress['last_pk'] = chunk[-1].pk
+			progress['retry'] = sorted(retry)
+			self.save(progress, checkpoint)
+			self.stdout.write(f"Up to wrap {progress['last_pk']}: {len(todo)} of {len(chunk)} needed a description")
+
+		# Failures are mostly LLM outages, which wait_for_llm has sat out by now
+		if retry and (limit is None or progress['regenerated'] < limit):
+			wraps = await sync_to_async(list)(
+				Wraps.objects.filter(pk__in=retry).order_by('pk').only('pk', 'payload', 'description_status'))
+			# Wraps deleted or described elsewhere since they failed drop out
+			pending = [wrap for wrap in wraps if needs_description(wrap, self.options['stale'])]
+			todo = pending if limit is None else pending[:limit - progress['regenerated']]
+			self.stdout.write(f"Retrying {len(todo)} failed descriptions")
+			failed = await self.run_chunk(todo, progress)
+			progress['retry'] = sorted({wrap.pk for wrap in pending[len(todo):]} | set(failed))
+			self.save(progress, checkpoint)
+
+	async def wait_for_llm(self):
+		"""
+		Waits while the LLM circuit breaker is open, so calls are not failed fast during an outage.
+		"""
+		while True:
+			breaker = get_breaker('llm').stats()
+			if breaker['state'] != 'open' or not breaker['retry_in']:
+				return
+			self.stdout.write(f"The LLM is failing; pausing {breaker['retry_in']:.0f}s")
+			await asyncio.sleep(breaker['retry_in'])
+
+	async def reserve(self, tokens):
+		"""
+		Waits until the token budget allows a call of the given cost.
+		"""
+		wait = self.budget.reserve(time.monotonic(), tokens)
+		if wait > 0:
+			await asyncio.sleep(wait)
+
+	async def regenerate(self, wrap):
+		"""
+		Regenerates one description.
+
+		Returns:
+			tuple: Whether it succeeded, whether it came from the description cache, and the tokens reserved for it.
+		"""
+		if wrap.description_status == Wraps.DESCRIPTION_PENDING and \
+				not await cache.aadd(lease_key(wrap.pk), 1, timeout=LEASE_SECONDS):
+			return True, False, 0  # A web request queued it again meanwhile; that job writes it
+		data = await sync_to_async(hydrate_wrap)(wrap.document)
+		description_cache = get_description_cache()
+		outdated = data.get('llama_description') and data.get('llama_description_version', 1) < PROMPT_VERSION
+		if not outdated:
+			# A missing description may already exist for an identical taste; a stale one must be rewritten
+			description = await sync_to_async(description_cache.get)(data)
+			if description:
+				await sync_to_async(save_description)(wrap.pk, description)
+				return True, True, 0
+
+		prompt = build_description_prompt(data)
+		tokens = prompt.input_tokens + prompt.max_output_tokens
+		async with self.semaphore:
+			await self.wait_for_llm()
+			await self.reserve(tokens)
+			started = time.monotonic()
+			description = await llama_description(data)
+		if description:
+			await sync_to_async(description_cache.set)(data, description, time.monotonic() - started)
+			await sync_to_async(save_description)(wrap.pk, description)
+		return bool(description), False, tokens
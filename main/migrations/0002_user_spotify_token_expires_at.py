@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='spotify_token_expires_at',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+    ]
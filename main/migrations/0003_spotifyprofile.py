@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_user_spotify_token_expires_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpotifyProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('display_name', models.CharField(blank=True, default='', max_length=255)),
+                ('country', models.CharField(blank=True, default='', max_length=2)),
+                ('product', models.CharField(blank=True, default='', max_length=50)),
+                ('image_url', models.URLField(blank=True, default='', max_length=500)),
+                ('fetched_at', models.DateTimeField()),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='spotify_profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
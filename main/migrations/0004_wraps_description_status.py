@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_spotifyprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wraps',
+            name='description_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=10),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_wraps_description_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedDescription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64, unique=True)),
+                ('term', models.CharField(max_length=15)),
+                ('features', models.JSONField()),
+                ('description', models.TextField()),
+                ('generation_seconds', models.FloatField(default=0.0)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'last_used_at'], name='main_cached_term_c766c4_idx')],
+            },
+        ),
+    ]
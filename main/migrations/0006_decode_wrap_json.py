@@ -0,0 +1,43 @@
+# Wraps used to store json.dumps() output in their JSONField, so every row held a
+# JSON-encoded string instead of an object. Decode those rows in place.
+
+import json
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def _convert(apps, convert):
+    Wraps = apps.get_model('main', 'Wraps')
+    batch = []
+    for wrap in Wraps.objects.only('pk', 'wrap_json').iterator(chunk_size=BATCH_SIZE):
+        value = convert(wrap.wrap_json)
+        if value is None:
+            continue
+        wrap.wrap_json = value
+        batch.append(wrap)
+        if len(batch) == BATCH_SIZE:
+            Wraps.objects.bulk_update(batch, ['wrap_json'])
+            batch = []
+    if batch:
+        Wraps.objects.bulk_update(batch, ['wrap_json'])
+
+
+def decode_wrap_json(apps, schema_editor):
+    _convert(apps, lambda value: json.loads(value) if isinstance(value, str) else None)
+
+
+def encode_wrap_json(apps, schema_editor):
+    _convert(apps, lambda value: None if isinstance(value, str) else json.dumps(value))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_cacheddescription'),
+    ]
+
+    operations = [
+        migrations.RunPython(decode_wrap_json, encode_wrap_json),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_decode_wrap_json'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wraps',
+            index=models.Index(fields=['username', 'creation_date'], name='main_wraps_usernam_02c53f_idx'),
+        ),
+    ]
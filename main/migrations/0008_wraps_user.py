@@ -0,0 +1,63 @@
+# Replaces Wraps.username with a foreign key to User. Existing wraps are linked to
+# the user with their username; wraps whose user no longer exists are deleted, as
+# deleting the user would have done.
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_users(apps, schema_editor):
+    User = apps.get_model('main', 'User')
+    Wraps = apps.get_model('main', 'Wraps')
+    for pk, username in User.objects.values_list('pk', 'username').iterator():
+        Wraps.objects.filter(username=username).update(user_id=pk)
+    Wraps.objects.filter(user__isnull=True).delete()
+
+
+def unlink_users(apps, schema_editor):
+    User = apps.get_model('main', 'User')
+    Wraps = apps.get_model('main', 'Wraps')
+    for pk, username in User.objects.values_list('pk', 'username').iterator():
+        Wraps.objects.filter(user_id=pk).update(username=username)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_wraps_username_creation_date_index'),
+    ]
+
+    operations = [
+        # Nullable while both columns exist, so that migrating backwards can refill it
+        migrations.AlterField(
+            model_name='wraps',
+            name='username',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='wraps',
+            name='user',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='wraps', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(link_users, unlink_users),
+        migrations.RemoveIndex(
+            model_name='wraps',
+            name='main_wraps_usernam_02c53f_idx',
+        ),
+        migrations.RemoveField(
+            model_name='wraps',
+            name='username',
+        ),
+        migrations.AlterField(
+            model_name='wraps',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='wraps', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='wraps',
+            index=models.Index(fields=['user', 'creation_date'], name='main_wraps_user_id_9bdeb9_idx'),
+        ),
+    ]
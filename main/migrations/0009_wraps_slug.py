@@ -0,0 +1,42 @@
+# Gives every wrap a short random slug to identify it in URLs instead of its
+# creation timestamp. Existing wraps get theirs before the column is made unique.
+
+from django.db import migrations, models
+
+import main.models
+
+BATCH_SIZE = 500
+
+
+def fill_slugs(apps, schema_editor):
+    Wraps = apps.get_model('main', 'Wraps')
+    batch = []
+    for wrap in Wraps.objects.filter(slug__isnull=True).only('pk').iterator(chunk_size=BATCH_SIZE):
+        wrap.slug = main.models.new_wrap_slug()
+        batch.append(wrap)
+        if len(batch) == BATCH_SIZE:
+            Wraps.objects.bulk_update(batch, ['slug'])
+            batch = []
+    if batch:
+        Wraps.objects.bulk_update(batch, ['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_wraps_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wraps',
+            name='slug',
+            field=models.SlugField(editable=False, max_length=10, null=True),
+        ),
+        migrations.RunPython(fill_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='wraps',
+            name='slug',
+            field=models.SlugField(default=main.models.new_wrap_slug, editable=False, max_length=10, unique=True),
+        ),
+    ]
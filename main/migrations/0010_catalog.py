@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_wraps_slug'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Album',
+            fields=[
+                ('spotify_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('image_url', models.URLField(blank=True, default='', max_length=500)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Artist',
+            fields=[
+                ('spotify_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('image_url', models.URLField(blank=True, default='', max_length=500)),
+                ('popularity', models.PositiveSmallIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Track',
+            fields=[
+                ('spotify_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('popularity', models.PositiveSmallIntegerField(default=0)),
+                ('preview_url', models.URLField(blank=True, max_length=500, null=True)),
+                ('album', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tracks', to='main.album')),
+                ('artist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tracks', to='main.artist')),
+            ],
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Builds the compressed get_wrapped body of every existing wrap, a batch at a time,
+# resolving the catalog IDs of each batch with one query per catalog table.
+
+import gzip
+import json
+
+from django.db import migrations, models
+
+BATCH_SIZE = 200
+
+
+def _resolve(entries, catalog):
+    return [catalog[entry] if isinstance(entry, str) else entry
+            for entry in entries if not isinstance(entry, str) or entry in catalog]
+
+
+def build_payloads(apps, schema_editor):
+    Wraps = apps.get_model('main', 'Wraps')
+    Track = apps.get_model('main', 'Track')
+    Artist = apps.get_model('main', 'Artist')
+
+    def flush(batch):
+        track_ids = {entry for wrap in batch for entry in wrap.wrap_json.get('top_tracks', []) if isinstance(entry, str)}
+        artist_ids = {entry for wrap in batch for entry in wrap.wrap_json.get('top_artists', []) if isinstance(entry, str)}
+        tracks = {
+            track.spotify_id: {
+                'track_name': track.name, 'track_id': track.spotify_id,
+                'album_name': track.album.name, 'album_id': track.album.spotify_id,
+                'artist_name': track.artist.name, 'artist_id': track.artist.spotify_id,
+                'popularity': track.popularity, 'cover_image': track.album.image_url, 'preview': track.preview_url,
+            }
+            for track in Track.objects.select_related('album', 'artist').filter(spotify_id__in=track_ids)
+        }
+        artists = {
+            artist.spotify_id: {
+                'artist_name': artist.name, 'artist_id': artist.spotify_id,
+                'popularity': artist.popularity, 'artist_image': artist.image_url,
+            }
+            for artist in Artist.objects.filter(spotify_id__in=artist_ids)
+        }
+        for wrap in batch:
+            data = dict(wrap.wrap_json)
+            if 'top_tracks' in data:
+                data['top_tracks'] = _resolve(data['top_tracks'], tracks)
+            if 'top_artists' in data:
+                data['top_artists'] = _resolve(data['top_artists'], artists)
+            document = {'data': data, 'slug': wrap.slug, 'dt': wrap.creation_date.isoformat(),
+                        'description_status': wrap.description_status}
+            wrap.payload = gzip.compress(json.dumps(document).encode(), mtime=0)
+        Wraps.objects.bulk_update(batch, ['payload'])
+
+    batch = []
+    wraps = Wraps.objects.filter(payload__isnull=True).only('pk', 'slug', 'creation_date', 'description_status',
+                                                           'wrap_json')
+    for wrap in wraps.iterator(chunk_size=BATCH_SIZE):
+        batch.append(wrap)
+        if len(batch) == BATCH_SIZE:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_catalog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wraps',
+            name='payload',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(build_payloads, migrations.RunPython.noop),
+    ]
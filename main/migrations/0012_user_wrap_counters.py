@@ -0,0 +1,36 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:33
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_wraps(apps, schema_editor):
+    User = apps.get_model('main', 'User')
+    Wraps = apps.get_model('main', 'Wraps')
+    wraps = Wraps.objects.filter(user=OuterRef('pk')).order_by().values('user')
+    User.objects.update(
+        wrap_count=Coalesce(Subquery(wraps.annotate(count=Count('pk')).values('count')[:1]), 0),
+        last_wrap_at=Subquery(wraps.annotate(latest=Max('creation_date')).values('latest')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_wraps_payload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='last_wrap_at',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='wrap_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_wraps, migrations.RunPython.noop),
+    ]
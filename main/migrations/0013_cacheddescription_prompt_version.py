@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_user_wrap_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cacheddescription',
+            name='prompt_version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Moves each wrap's data into its gzip-compressed payload, a batch at a time, and drops
+# the uncompressed wrap_json column. The payload used to hold a second, fully hydrated
+# copy of the wrap for get_wrapped; that copy is replaced, not kept.
+
+import gzip
+import json
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def _convert(apps, convert, fields):
+    Wraps = apps.get_model('main', 'Wraps')
+    batch = []
+    for wrap in Wraps.objects.only('pk', 'wrap_json', 'payload').iterator(chunk_size=BATCH_SIZE):
+        convert(wrap)
+        batch.append(wrap)
+        if len(batch) == BATCH_SIZE:
+            Wraps.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        Wraps.objects.bulk_update(batch, fields)
+
+
+def compress_wrap_json(apps, schema_editor):
+    def compress(wrap):
+        wrap.payload = gzip.compress(json.dumps(wrap.wrap_json).encode(), mtime=0)
+    _convert(apps, compress, ['payload'])
+
+
+def decompress_payload(apps, schema_editor):
+    def decompress(wrap):
+        wrap.wrap_json = json.loads(gzip.decompress(wrap.payload))
+        wrap.payload = None  # Rebuilt on its next read by the get_wrapped of the time
+    _convert(apps, decompress, ['wrap_json', 'payload'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_cacheddescription_prompt_version'),
+    ]
+
+    operations = [
+        # Nullable while it moves, so the column can be added back when migrating backwards
+        migrations.AlterField(
+            model_name='wraps',
+            name='wrap_json',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='wraps',
+            name='payload',
+            field=models.BinaryField(null=True, editable=False),
+        ),
+        migrations.RunPython(compress_wrap_json, decompress_payload),
+        migrations.RemoveField(
+            model_name='wraps',
+            name='wrap_json',
+        ),
+        migrations.AlterField(
+            model_name='wraps',
+            name='payload',
+            field=models.BinaryField(editable=False),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:25
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_compress_wrap_json'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='Genre',
+        ),
+    ]
@@ -1,9 +1,14 @@
+import gzip
+import json
 from datetime import datetime
 
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.models import UserManager, AbstractBaseUser, PermissionsMixin
 from django.db import models
-from django.db.models import JSONField
+from django.utils.crypto import get_random_string
+
+# Wrap slugs are alphanumeric, so they never collide with the ISO timestamps that used to identify wraps
+WRAP_SLUG_LENGTH = 10
 
 
 # Create your models here.
@@ -39,9 +44,14 @@ class User(AbstractBaseUser, PermissionsMixin):
 
 	spotify_access_token = models.CharField(max_length=255, blank=True, null=True, default=None)
 	spotify_refresh_token = models.CharField(max_length=255, blank=True, null=True, default=None)
+	spotify_token_expires_at = models.DateTimeField(blank=True, null=True, default=None)
 
 	current_display_name = models.CharField(max_length=255, blank=True, null=True, default=None)
 
+	# Kept up to date by the signal handlers in main.signals, so the account page needs no wrap queries
+	wrap_count = models.PositiveIntegerField(default=0)
+	last_wrap_at = models.DateTimeField(blank=True, null=True, default=None)
+
 	objects = CustomUserManager()
 	USERNAME_FIELD = 'username'
 	REQUIRED_FIELDS = []
@@ -54,18 +64,135 @@ class User(AbstractBaseUser, PermissionsMixin):
 		return self.username
 
 	def delete_with_wraps(self):
-		# Delete all associated Wraps first
-		Wraps.objects.filter(username=self.username).delete()
-		# Delete the user
+		# Wraps cascade from the user, so one delete removes both
 		self.delete()
 
 
+class SpotifyProfile(models.Model):
+	user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='spotify_profile')
+	display_name = models.CharField(max_length=255, blank=True, default='')
+	country = models.CharField(max_length=2, blank=True, default='')
+	product = models.CharField(max_length=50, blank=True, default='')
+	image_url = models.URLField(max_length=500, blank=True, default='')
+	fetched_at = models.DateTimeField()
+
+	def __str__(self):
+		return self.display_name
+
+
+class Artist(models.Model):
+	"""
+	A Spotify artist in the catalog shared by every wrap.
+	"""
+	spotify_id = models.CharField(max_length=64, primary_key=True)
+	name = models.CharField(max_length=255)
+	image_url = models.URLField(max_length=500, blank=True, default='')
+	popularity = models.PositiveSmallIntegerField(default=0)
+
+	def __str__(self):
+		return self.name
+
+
+class Album(models.Model):
+	"""
+	A Spotify album in the catalog shared by every wrap.
+	"""
+	spotify_id = models.CharField(max_length=64, primary_key=True)
+	name = models.CharField(max_length=255)
+	image_url = models.URLField(max_length=500, blank=True, default='')
+
+	def __str__(self):
+		return self.name
+
+
+class Track(models.Model):
+	"""
+	A Spotify track in the catalog shared by every wrap.
+	"""
+	spotify_id = models.CharField(max_length=64, primary_key=True)
+	name = models.CharField(max_length=255)
+	album = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='tracks')
+	artist = models.ForeignKey(Artist, on_delete=models.CASCADE, related_name='tracks')  # The first credited artist
+	popularity = models.PositiveSmallIntegerField(default=0)
+	preview_url = models.URLField(max_length=500, null=True, blank=True)
+
+	def __str__(self):
+		return self.name
+
+
+def new_wrap_slug():
+	return get_random_string(WRAP_SLUG_LENGTH)
+
+
 class Wraps(models.Model):
-	username = models.CharField(max_length=50, unique=False)
+	"""
+	A user's wrap: their top tracks, artists and genres for one term.
+
+	The wrap's data is stored once, gzip-compressed, in ``payload`` and read and written
+	through ``document``. Tracks and artists are kept as ordered catalog IDs; the names,
+	images and popularity behind them are looked up in the shared catalog when the wrap
+	is served.
+	"""
+	DESCRIPTION_PENDING = 'pending'
+	DESCRIPTION_READY = 'ready'
+	DESCRIPTION_FAILED = 'failed'
+	DESCRIPTION_STATUSES = [
+		(DESCRIPTION_PENDING, 'Pending'),
+		(DESCRIPTION_READY, 'Ready'),
+		(DESCRIPTION_FAILED, 'Failed'),
+	]
+
+	# The (user, creation_date) index below covers lookups by user alone
+	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wraps', db_index=False)
+	# Identifies the wrap in URLs
+	slug = models.SlugField(max_length=WRAP_SLUG_LENGTH, unique=True, default=new_wrap_slug, editable=False)
 	term = models.CharField(max_length=15, null=True, blank=True)
 	spotify_display_name = models.CharField(max_length=255, default='')
 	creation_date = models.DateTimeField(default=datetime.now)
-	wrap_json = JSONField()
+	# The AI description is generated in the background after the wrap is saved
+	description_status = models.CharField(max_length=10, choices=DESCRIPTION_STATUSES, default=DESCRIPTION_READY)
+	# The wrap's data as compact JSON, gzip-compressed; read and written through ``document``
+	payload = models.BinaryField(editable=False)
+
+	class Meta:
+		# Every lookup filters by user; most then match or order by creation_date
+		indexes = [models.Index(fields=['user', 'creation_date'])]
+
+	def __str__(self):
+		return self.user.username + str(self.creation_date)
+
+	@property
+	def document(self):
+		"""
+		dict: The wrap's data, decompressed from ``payload`` on every access; assign a new dict to change it.
+		"""
+		if not self.payload:
+			return {}
+		return json.loads(gzip.decompress(self.payload))
+
+	@document.setter
+	def document(self, value):
+		# mtime=0 keeps the bytes identical for identical documents
+		self.payload = gzip.compress(json.dumps(value).encode(), mtime=0)
+
+
+class CachedDescription(models.Model):
+	"""
+	An AI description shared by every wrap with the same (or a similar) taste fingerprint.
+	"""
+	fingerprint = models.CharField(max_length=64, unique=True)
+	term = models.CharField(max_length=15)
+	features = models.JSONField()  # Sorted 'artist:<id>' and 'genre:<name>' entries
+	description = models.TextField()
+	# main.prompts.PROMPT_VERSION the text was generated with; entries from before it was recorded count as 1
+	prompt_version = models.PositiveSmallIntegerField(default=1)
+	generation_seconds = models.FloatField(default=0.0)  # LLM time a hit on this entry saves
+	hits = models.PositiveIntegerField(default=0)
+	created_at = models.DateTimeField(auto_now_add=True)
+	last_used_at = models.DateTimeField()
+
+	class Meta:
+		indexes = [models.Index(fields=['term', 'last_used_at'])]
 
 	def __str__(self):
-		return self.username + str(self.creation_date)
+		return f'{self.term} {self.fingerprint[:12]}'
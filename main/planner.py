@@ -0,0 +1,122 @@
+"""
+Request planning for Spotify top-items calls.
+
+Several consumers of a single request often want overlapping windows of the same
+top-items list, e.g. the top 5 artists for the wrap and the top 20 artists for the
+genre breakdown. A :class:`TopItemsPlan` collects those needs, fetches the largest
+window once per (item type, time range) and slices it for every consumer. When given
+a :class:`~main.spotify_cache.TopItemsCache`, windows already cached for the user are
+read from it instead of Spotify.
+"""
+import asyncio
+from functools import partial
+
+from asgiref.sync import sync_to_async
+
+# The largest window Spotify returns for /me/top/{type}
+MAX_LIMIT = 50
+
+
+class TopItemsPlan:
+	"""
+	Collects top-items needs and fetches each (item type, time range) exactly once.
+
+	Attributes:
+		windows (dict): Maps (item_type, time_range) to the largest limit requested.
+		responses (dict): Maps (item_type, time_range) to the response of each window fetched from Spotify.
+		cache (TopItemsCache or None): Read-through cache of previously fetched windows.
+		user_id (int or None): Primary key of the user the cache entries belong to.
+	"""
+
+	def __init__(self, cache=None, user_id=None):
+		self.windows = {}
+		self.responses = {}
+		self.cache = cache
+		self.user_id = user_id
+		self._payloads = {}
+
+	def request(self, item_type, time_range, limit):
+		"""
+		Registers a consumer's need for the top ``limit`` items.
+
+		Args:
+			item_type (str): Either ``'tracks'`` or ``'artists'``.
+			time_range (str): One of ``'short_term'``, ``'medium_term'`` or ``'long_term'``.
+			limit (int): Number of items the consumer needs.
+		"""
+		key = (item_type, time_range)
+		self.windows[key] = min(max(self.windows.get(key, 0), limit), MAX_LIMIT)
+
+	async def aexecute(self, client, access_token, extra_calls=None):
+		"""
+		Fetches every planned window that is not cached concurrently, along with any unrelated calls.
+
+		Args:
+			client (AsyncSpotifyClient): The client used to issue the requests.
+			access_token (str): The user's Spotify access token.
+			extra_calls (dict, optional): Other zero-argument coroutine functions to await in the same batch.
+
+		Returns:
+			dict: The results of ``extra_calls``, keyed by name.
+		"""
+		calls = dict(extra_calls or {})
+		for key in await sync_to_async(self._read_cache)():
+			calls[key] = partial(client.top_items, access_token, key[0], self.windows[key], key[1])
+
+		values = await asyncio.gather(*(call() for call in calls.values()))
+		results = dict(zip(calls, values))
+		await sync_to_async(self._store)(results)
+		return results
+
+	def _read_cache(self):
+		"""
+		Loads every cached window and returns the keys of those that must be fetched.
+		"""
+		self._payloads = {}
+		missing = []
+		for (item_type, time_range), limit in self.windows.items():
+			cached = self.cache.get(self.user_id, item_type, time_range, limit) if self.cache else None
+			if cached is not None:
+				self._payloads[(item_type, time_range)] = cached
+			else:
+				missing.append((item_type, time_range))
+		return missing
+
+	def _store(self, results):
+		"""
+		Moves the fetched windows out of ``results`` and caches the successful ones.
+		"""
+		self.responses = {key: results.pop(key) for key in self.windows if key in results}
+		for key, response in self.responses.items():
+			if response.status_code == 200:
+				self._payloads[key] = response.json()
+				if self.cache:
+					self.cache.set(self.user_id, *key, self.windows[key], self._payloads[key])
+
+	@property
+	def ok(self):
+		"""
+		bool: Whether every planned window was read from the cache or fetched successfully.
+		"""
+		return all(key in self._payloads for key in self.windows)
+
+	@property
+	def unauthorized(self):
+		"""
+		bool: Whether Spotify rejected the access token for any fetched window.
+		"""
+		return any(response.status_code == 401 for response in self.responses.values())
+
+	def items(self, item_type, time_range, limit):
+		"""
+		Returns a consumer's slice of a fetched window.
+
+		Args:
+			item_type (str): Either ``'tracks'`` or ``'artists'``.
+			time_range (str): One of ``'short_term'``, ``'medium_term'`` or ``'long_term'``.
+			limit (int): Number of items the consumer asked for.
+
+		Returns:
+			list: The top ``limit`` items, in Spotify's order.
+		"""
+		return self._payloads[(item_type, time_range)]['items'][:limit]
@@ -0,0 +1,125 @@
+"""
+Cached Spotify profiles of linked users.
+
+The profile (display name, country, product and image) is stored when the user links
+their account and served from the database afterwards, so wrap generation never waits
+on ``/v1/me``. Once a profile is older than ``SPOTIFY_PROFILE_TTL`` it is still served,
+but a background refresh is scheduled so the next read sees current data.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import SpotifyProfile, User
+from .spotify import SpotifyUnavailable, get_client
+from .tokens import get_access_token
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_TTL = 24 * 60 * 60
+REFRESH_LEASE_SECONDS = 60
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='spotify-profile')
+
+
+def store_profile(user, me_data):
+	"""
+	Saves a user's Spotify profile from a ``/v1/me`` payload.
+
+	Also keeps ``User.current_display_name`` in sync, since the account page reads it.
+
+	Args:
+		user (User): The linked user.
+		me_data (dict): Decoded ``/v1/me`` response.
+
+	Returns:
+		SpotifyProfile: The saved profile.
+	"""
+	images = me_data.get('images') or []
+	profile, _ = SpotifyProfile.objects.update_or_create(user=user, defaults={
+		'display_name': me_data.get('display_name') or 'Unknown User',
+		'country': me_data.get('country') or '',
+		'product': me_data.get('product') or '',
+		'image_url': images[0]['url'] if images else '',
+		'fetched_at': timezone.now(),
+	})
+	if user.current_display_name != profile.display_name:
+		user.current_display_name = profile.display_name
+		user.save(update_fields=['current_display_name'])
+	return profile
+
+
+def refresh_profile(user_id):
+	"""
+	Fetches and stores a user's profile; run on the background executor.
+
+	Args:
+		user_id (int): Primary key of the user.
+	"""
+	close_old_connections()
+	try:
+		user = User.objects.get(pk=user_id)
+		access_token = get_access_token(user)
+		if not access_token:
+			return
+		response = get_client().me(access_token)
+		if response.status_code == 200:
+			store_profile(user, response.json())
+		else:
+			logger.info('Refreshing the Spotify profile of user %s returned %s', user_id, response.status_code)
+	except (User.DoesNotExist, SpotifyUnavailable):
+		pass
+	except Exception:  # pylint: disable=broad-except
+		logger.exception('Refreshing the Spotify profile of user %s failed', user_id)
+	finally:
+		cache.delete(f'spotify:profile-refresh:{user_id}')
+		close_old_connections()
+
+
+def schedule_refresh(user):
+	"""
+	Queues a background profile refresh unless one is already pending for the user.
+
+	Args:
+		user (User): The linked user.
+	"""
+	if cache.add(f'spotify:profile-refresh:{user.pk}', 1, timeout=REFRESH_LEASE_SECONDS):
+		_executor.submit(refresh_profile, user.pk)
+
+
+def get_profile(user):
+	"""
+	Returns the user's cached profile, scheduling a refresh if it is stale or missing.
+
+	Args:
+		user (User): The linked user.
+
+	Returns:
+		SpotifyProfile or None: The cached profile, possibly stale, or None if none was stored yet.
+	"""
+	profile = SpotifyProfile.objects.filter(user=user).first()
+	ttl = getattr(settings, 'SPOTIFY_PROFILE_TTL', DEFAULT_PROFILE_TTL)
+	if profile is None or profile.fetched_at <= timezone.now() - timedelta(seconds=ttl):
+		schedule_refresh(user)
+	return profile
+
+
+def display_name_for(user):
+	"""
+	Returns the display name to stamp on a new wrap without contacting Spotify.
+
+	Args:
+		user (User): The linked user.
+
+	Returns:
+		str: The cached display name, falling back to the one saved at login.
+	"""
+	profile = get_profile(user)
+	if profile is not None:
+		return profile.display_name
+	return user.current_display_name or 'Unknown User'
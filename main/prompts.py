@@ -0,0 +1,166 @@
+"""
+Compact, token-budgeted prompts for the AI description.
+
+The description only depends on a wrap's term, artists, genres and tracks, so the
+prompt carries their names and nothing else: no IDs, image or preview URLs, or
+popularity numbers. Token counts are estimated with a characters-per-token heuristic
+(the hosted model's tokenizer is not available locally) and lists are trimmed, least
+important entries first, until the prompt fits ``LLM_MAX_INPUT_TOKENS``. The reply is
+capped at ``LLM_MAX_OUTPUT_TOKENS``.
+
+Usage reported by the LLM, or the estimate when it reports none, is totalled in the
+default cache and exposed on the status endpoint.
+"""
+import logging
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .counters import incr_counter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_INPUT_TOKENS = 400
+DEFAULT_MAX_OUTPUT_TOKENS = 80
+# Rough average for English text across Llama and GPT tokenizers
+CHARS_PER_TOKEN = 4
+# Genres past the most common few say little about the listener
+MAX_GENRES = 10
+
+# Bump whenever the instructions or the prompt layout change, so older descriptions count as stale
+PROMPT_VERSION = 2
+
+INSTRUCTIONS = (
+	"Based on the following list of top artists, genres and tracks from a user's Spotify Wrapped, craft a fun, engaging, slightly sassy "
+	"description of how someone who listens to this kind of music tends to act, think and dress."
+	"Be playful and witty, but avoid being mean or overly critical. Tie the music preferences to relatable behaviors and quirks. "
+	"ENSURE THAT THE RESPONSE IS CONCISE, SELF-CONTAINED AND LESS THAN 50 TOKENS. ENSURE THERE IS NO OTHER INFORMATION ASIDE FROM HOW THE USER ACTS, THINKS AND DRESSES"
+)
+
+TERMS = {
+	'short_term': 'the last 4 weeks',
+	'medium_term': 'the last 6 months',
+	'long_term': 'the last year',
+}
+
+USAGE_KEYS = {
+	'calls': 'llm:usage:calls',
+	'input_tokens': 'llm:usage:input-tokens',
+	'output_tokens': 'llm:usage:output-tokens',
+}
+
+
+def estimate_tokens(text):
+	"""
+	Estimates how many tokens a text takes up.
+
+	Args:
+		text (str): The text.
+
+	Returns:
+		int: Estimated token count.
+	"""
+	return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class DescriptionPrompt:
+	"""
+	The messages and token budget of one description request.
+
+	Attributes:
+		messages (list): Chat messages to send.
+		input_tokens (int): Estimated tokens in ``messages``.
+		max_output_tokens (int): Cap on the reply's length.
+	"""
+
+	def __init__(self, messages, input_tokens, max_output_tokens):
+		self.messages = messages
+		self.input_tokens = input_tokens
+		self.max_output_tokens = max_output_tokens
+
+
+def _render(term, artists, genres, tracks):
+	lines = [f'Listening period: {TERMS.get(term, term)}']
+	if artists:
+		lines.append('Top artists: ' + ', '.join(artists))
+	if genres:
+		lines.append('Top genres: ' + ', '.join(genres))
+	if tracks:
+		lines.append('Top tracks: ' + '; '.join(tracks))
+	return '\n'.join(lines)
+
+
+def build_description_prompt(data, max_input_tokens=None, max_output_tokens=None):
+	"""
+	Builds the description prompt for a wrap within the input token budget.
+
+	When the full prompt is over budget, tracks are trimmed first, then genres, then
+	artists, always from the least played end and keeping at least one of each.
+
+	Args:
+		data (dict): The wrap's Spotify data, as built by ``make_wrapped``.
+		max_input_tokens (int, optional): Defaults to ``LLM_MAX_INPUT_TOKENS``.
+		max_output_tokens (int, optional): Defaults to ``LLM_MAX_OUTPUT_TOKENS``.
+
+	Returns:
+		DescriptionPrompt: The prompt and its budget.
+	"""
+	if max_input_tokens is None:
+		max_input_tokens = getattr(settings, 'LLM_MAX_INPUT_TOKENS', DEFAULT_MAX_INPUT_TOKENS)
+	if max_output_tokens is None:
+		max_output_tokens = getattr(settings, 'LLM_MAX_OUTPUT_TOKENS', DEFAULT_MAX_OUTPUT_TOKENS)
+
+	term = data.get('time_range', '')
+	artists = [artist['artist_name'] for artist in data.get('top_artists', [])]
+	# top_genres is sorted by ascending count; list the most common first
+	genres = list(reversed(data.get('top_genres', [])))[:MAX_GENRES]
+	tracks = [f"{track['track_name']} by {track['artist_name']}" for track in data.get('top_tracks', [])]
+
+	budget = max_input_tokens - estimate_tokens(INSTRUCTIONS)
+	content = _render(term, artists, genres, tracks)
+	for items in (tracks, genres, artists):
+		while len(items) > 1 and estimate_tokens(content) > budget:
+			items.pop()
+			content = _render(term, artists, genres, tracks)
+
+	prompt = f'{INSTRUCTIONS}\n\n{content}'
+	return DescriptionPrompt([{'role': 'user', 'content': prompt}], estimate_tokens(prompt), max_output_tokens)
+
+
+def record_usage(prompt, completion_text, usage=None):
+	"""
+	Logs and totals the tokens of one completed description call.
+
+	Args:
+		prompt (DescriptionPrompt): The prompt that was sent.
+		completion_text (str): The generated text.
+		usage (openai.types.CompletionUsage, optional): Usage reported by the LLM, if any.
+
+	Returns:
+		dict: The call's input and output tokens, and whether they were estimated.
+	"""
+	if usage is not None:
+		tokens = {'input_tokens': usage.prompt_tokens, 'output_tokens': usage.completion_tokens, 'estimated': False}
+	else:
+		tokens = {'input_tokens': prompt.input_tokens, 'output_tokens': estimate_tokens(completion_text), 'estimated': True}
+	logger.info('LLM description call used %(input_tokens)s input and %(output_tokens)s output tokens'
+	            ' (estimated: %(estimated)s)', tokens)
+
+	for name, key in USAGE_KEYS.items():
+		incr_counter(key, 1 if name == 'calls' else tokens[name])
+	return tokens
+
+
+def usage_stats():
+	"""
+	Reports the totals of every recorded description call.
+
+	Returns:
+		dict: Calls, input and output tokens, and the average tokens per call.
+	"""
+	totals = {name: cache.get(key, 0) for name, key in USAGE_KEYS.items()}
+	calls = totals['calls']
+	totals['avg_input_tokens'] = round(totals['input_tokens'] / calls, 1) if calls else 0.0
+	totals['avg_output_tokens'] = round(totals['output_tokens'] / calls, 1) if calls else 0.0
+	return totals
@@ -0,0 +1,236 @@
+"""
+Client-side rate limiting for calls to a rate-limited upstream such as Spotify.
+
+A :class:`RateLimitScheduler` owns a token bucket shared by every thread that calls
+the same upstream app (one per Spotify client ID). Bursts above the bucket's rate are
+delayed instead of sent, at most ``max_queue`` callers wait at once, and a 429 reply
+pauses the whole bucket for the ``Retry-After`` period before the call is retried.
+"""
+import asyncio
+import threading
+import time
+
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 20
+DEFAULT_MAX_QUEUE = 100
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_MAX_RETRY_AFTER = 30.0
+
+
+class QueueFull(Exception):
+	"""
+	Raised when a call would have to wait while the wait queue is already full.
+	"""
+
+
+class TokenBucket:
+	"""
+	A token bucket that hands out future send times instead of rejecting calls.
+
+	Attributes:
+		rate (float): Tokens added per second.
+		burst (int): Maximum number of tokens the bucket holds.
+	"""
+
+	def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+		self.rate = rate
+		self.burst = burst
+		self.tokens = float(burst)
+		self.updated = time.monotonic()
+		self.blocked_until = 0.0
+
+	def reserve(self, now, tokens=1):
+		"""
+		Takes tokens, borrowing from the future when the bucket runs short.
+
+		Args:
+			now (float): The current ``time.monotonic()`` value.
+			tokens (float): How many tokens the call costs.
+
+		Returns:
+			float: Seconds the caller must wait before sending.
+		"""
+		self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+		self.tokens -= tokens
+		wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+		return max(wait, self.blocked_until - now)
+
+	def cancel(self):
+		"""
+		Returns a token taken by a reservation that was abandoned.
+		"""
+		self.tokens += 1
+
+	def block(self, now, seconds):
+		"""
+		Holds every reservation back for ``seconds``, e.g. after a 429 reply.
+
+		Args:
+			now (float): The current ``time.monotonic()`` value.
+			seconds (float): How long the upstream asked us to back off.
+		"""
+		self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+def retry_after_seconds(response):
+	"""
+	Reads the back-off period from a 429 response.
+
+	Args:
+		response (requests.Response or httpx.Response): The rate-limited response.
+
+	Returns:
+		float: Seconds to wait, defaulting to 1 when the header is missing or malformed.
+	"""
+	try:
+		return max(float(response.headers.get('Retry-After', 1)), 0.0)
+	except (TypeError, ValueError):
+		return 1.0
+
+
+class RateLimitScheduler:
+	"""
+	Smooths calls to a rate-limited upstream through a shared token bucket.
+
+	Attributes:
+		bucket (TokenBucket): The bucket shared by every caller.
+		max_queue (int): Maximum number of callers allowed to wait at once.
+		max_retries (int): How many times a 429 reply is retried.
+		max_retry_after (float): Longest Retry-After period worth waiting for; longer ones are returned as-is.
+	"""
+
+	def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_queue=DEFAULT_MAX_QUEUE,
+	             max_retries=DEFAULT_MAX_RETRIES, max_retry_after=DEFAULT_MAX_RETRY_AFTER):
+		self.bucket = TokenBucket(rate, burst)
+		self.max_queue = max_queue
+		self.max_retries = max_retries
+		self.max_retry_after = max_retry_after
+		self.queue_depth = 0
+		self.max_queue_depth = 0
+		self.throttled_seconds = 0.0
+		self.throttled_calls = 0
+		self.rate_limited = 0
+		self.rejected = 0
+		self._lock = threading.Lock()
+
+	def acquire(self):
+		"""
+		Reserves a send slot, joining the wait queue if the slot is in the future.
+
+		Every successful call must be paired with :meth:`release`.
+
+		Returns:
+			float: Seconds to wait before sending.
+
+		Raises:
+			QueueFull: If the caller would have to wait and the queue is full.
+		"""
+		with self._lock:
+			wait = self.bucket.reserve(time.monotonic())
+			if wait > 0:
+				if self.queue_depth >= self.max_queue:
+					self.bucket.cancel()
+					self.rejected += 1
+					raise QueueFull(f'{self.queue_depth} calls are already waiting')
+				self.queue_depth += 1
+				self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+			return wait
+
+	def release(self, waited):
+		"""
+		Leaves the wait queue once the reserved slot has been reached.
+
+		Args:
+			waited (float): The wait returned by :meth:`acquire`.
+		"""
+		if waited > 0:
+			with self._lock:
+				self.queue_depth -= 1
+				self.throttled_seconds += waited
+				self.throttled_calls += 1
+
+	def backoff(self, response):
+		"""
+		Records a 429 reply and pauses the bucket for its Retry-After period.
+
+		Args:
+			response (requests.Response): The rate-limited response.
+
+		Returns:
+			bool: Whether the call should be retried.
+		"""
+		seconds = retry_after_seconds(response)
+		with self._lock:
+			self.rate_limited += 1
+			if seconds > self.max_retry_after:
+				return False
+			self.bucket.block(time.monotonic(), seconds)
+		return True
+
+	def call(self, send):
+		"""
+		Sends a request once the bucket allows it, retrying 429 replies after their Retry-After.
+
+		Args:
+			send (callable): Zero-argument callable that performs the request.
+
+		Returns:
+			requests.Response: The first non-429 response, or the last 429 once retries run out.
+
+		Raises:
+			QueueFull: If the call would have to wait and the queue is full.
+		"""
+		for attempt in range(self.max_retries + 1):
+			wait = self.acquire()
+			try:
+				if wait:
+					time.sleep(wait)
+			finally:
+				self.release(wait)
+			response = send()
+			if response.status_code != 429 or attempt == self.max_retries or not self.backoff(response):
+				return response
+		return response
+
+	async def acall(self, send):
+		"""
+		Async counterpart of :meth:`call` that waits without blocking the event loop.
+
+		Args:
+			send (callable): Zero-argument coroutine function that performs the request.
+
+		Returns:
+			httpx.Response: The first non-429 response, or the last 429 once retries run out.
+
+		Raises:
+			QueueFull: If the call would have to wait and the queue is full.
+		"""
+		for attempt in range(self.max_retries + 1):
+			wait = self.acquire()
+			try:
+				if wait:
+					await asyncio.sleep(wait)
+			finally:
+				self.release(wait)
+			response = await send()
+			if response.status_code != 429 or attempt == self.max_retries or not self.backoff(response):
+				return response
+		return response
+
+	def stats(self):
+		"""
+		Reports the scheduler's queue and throttling metrics.
+
+		Returns:
+			dict: Current and peak queue depth, time spent throttled and 429/rejection counts.
+		"""
+		with self._lock:
+			return {
+				'queue_depth': self.queue_depth,
+				'max_queue_depth': self.max_queue_depth,
+				'throttled_calls': self.throttled_calls,
+				'throttled_seconds': round(self.throttled_seconds, 3),
+				'rate_limited': self.rate_limited,
+				'rejected': self.rejected,
+			}
@@ -0,0 +1,40 @@
+"""
+Keeps the wrap counters on ``User`` in step with the user's wraps.
+
+Each handler is a single UPDATE computed by the database, so concurrent wrap
+creations and deletions never overwrite each other's counts.
+"""
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import User, Wraps
+
+
+@receiver(post_save, sender=Wraps)
+def count_created_wrap(sender, instance, created, raw=False, **kwargs):
+	"""
+	Counts a new wrap and moves the user's last wrap date forward if it is newer.
+	"""
+	if not created or raw:
+		return
+	created_at = Value(instance.creation_date)
+	User.objects.filter(pk=instance.user_id).update(
+		wrap_count=F('wrap_count') + 1,
+		last_wrap_at=Greatest(Coalesce('last_wrap_at', created_at), created_at),
+	)
+
+
+@receiver(post_delete, sender=Wraps)
+def count_deleted_wrap(sender, instance, origin=None, **kwargs):
+	"""
+	Uncounts a deleted wrap and looks up the user's latest remaining wrap.
+	"""
+	if isinstance(origin, User) or getattr(origin, 'model', None) is User:
+		return  # The user is being deleted along with their wraps
+	latest = Wraps.objects.filter(user=OuterRef('pk')).order_by('-creation_date').values('creation_date')[:1]
+	User.objects.filter(pk=instance.user_id, wrap_count__gt=0).update(
+		wrap_count=F('wrap_count') - 1,
+		last_wrap_at=Subquery(latest),
+	)
@@ -0,0 +1,406 @@
+"""
+Shared HTTP clients for the Spotify Web API and Accounts service.
+
+Every outbound Spotify call goes through a single process-wide ``requests.Session``
+so TLS connections to api.spotify.com and accounts.spotify.com are kept alive and
+reused between requests instead of being re-negotiated on every call. Async views
+use :class:`AsyncSpotifyClient`, which keeps an equivalent ``httpx.AsyncClient`` pool
+per event loop. Both share the same rate limiter.
+"""
+import asyncio
+import base64
+import os
+import threading
+import weakref
+from functools import partial
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .circuit import CircuitOpen, get_breaker
+from .ratelimit import QueueFull, RateLimitScheduler
+
+API_BASE_URL = 'https://api.spotify.com/v1'
+ACCOUNTS_BASE_URL = 'https://accounts.spotify.com'
+
+DEFAULT_TIMEOUT = (3.05, 10)
+DEFAULT_POOL_MAXSIZE = 20
+
+
+class SpotifyUnavailable(Exception):
+	"""
+	Raised when a Spotify call cannot be made right now: too many calls are queued, the
+	circuit breaker is open, or Spotify could not be reached in time.
+	"""
+
+
+def _record_outcome(breaker, response):
+	"""
+	Reports a reply to the circuit breaker; only server errors count as failures.
+	"""
+	if response.status_code >= 500:
+		breaker.record_failure()
+	else:
+		breaker.record_success()
+
+
+def bearer_headers(access_token):
+	"""
+	Builds the authorization headers for a Web API call on behalf of a user.
+
+	Args:
+		access_token (str): The user's Spotify access token.
+
+	Returns:
+		dict: Headers carrying the bearer token.
+	"""
+	return {'Authorization': f'Bearer {access_token}'}
+
+
+def client_credentials_headers():
+	"""
+	Builds the HTTP Basic headers used to authenticate the app against the Accounts service.
+
+	Returns:
+		dict: Headers carrying the base64-encoded client ID and secret.
+	"""
+	auth_string = os.getenv('SPOTIFY_CLIENT_ID') + ":" + os.getenv('SPOTIFY_CLIENT_SECRET')
+	auth_base64 = str(base64.b64encode(auth_string.encode("utf-8")), "utf-8")
+	return {
+		'Authorization': 'Basic ' + auth_base64,
+		'Content-Type': 'application/x-www-form-urlencoded',
+	}
+
+
+class SpotifyClient:
+	"""
+	A thin wrapper around a pooled ``requests.Session`` for talking to Spotify.
+
+	Attributes:
+		session (requests.Session): Keep-alive session shared by every call.
+		timeout (tuple): Default (connect, read) timeout in seconds.
+		scheduler (RateLimitScheduler or None): Rate limiter every call is sent through.
+		breaker (CircuitBreaker or None): Circuit breaker guarding every call.
+		api_base_url (str): Base URL of the Web API, e.g. a local fake server's.
+		accounts_base_url (str): Base URL of the Accounts service.
+	"""
+
+	def __init__(self, timeout=DEFAULT_TIMEOUT, pool_maxsize=DEFAULT_POOL_MAXSIZE, scheduler=None, breaker=None,
+	             api_base_url=API_BASE_URL, accounts_base_url=ACCOUNTS_BASE_URL):
+		self.timeout = timeout
+		self.scheduler = scheduler
+		self.breaker = breaker
+		self.api_base_url = api_base_url
+		self.accounts_base_url = accounts_base_url
+		self.session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize)
+		self.session.mount('https://', adapter)
+		self.session.mount('http://', adapter)
+
+	def _request(self, method, url, **kwargs):
+		"""
+		Sends a single request through the circuit breaker, if any.
+		"""
+		if self.breaker is None:
+			return self.session.request(method, url, **kwargs)
+		self.breaker.allow()
+		try:
+			response = self.session.request(method, url, **kwargs)
+		except requests.RequestException:
+			self.breaker.record_failure()
+			raise
+		except BaseException:
+			# Not Spotify's fault, but an abandoned half-open probe must still give its slot back
+			self.breaker.release()
+			raise
+		_record_outcome(self.breaker, response)
+		return response
+
+	def _send(self, method, url, **kwargs):
+		"""
+		Sends a request through the rate limiter and circuit breaker, if any.
+
+		Raises:
+			SpotifyUnavailable: If the call was refused, timed out or could not connect.
+		"""
+		kwargs.setdefault('timeout', self.timeout)
+		send = partial(self._request, method, url, **kwargs)
+		try:
+			if self.scheduler is None:
+				return send()
+			return self.scheduler.call(send)
+		except QueueFull as e:
+			raise SpotifyUnavailable('Too many Spotify requests are waiting on the rate limit.') from e
+		except CircuitOpen as e:
+			raise SpotifyUnavailable('Spotify calls are paused while Spotify recovers.') from e
+		except requests.RequestException as e:
+			raise SpotifyUnavailable(f'Spotify could not be reached: {e}') from e
+
+	def get(self, path, access_token, params=None):
+		"""
+		Sends a GET request to the Web API.
+
+		Args:
+			path (str): Path relative to the API base URL, e.g. ``/me``.
+			access_token (str): The user's Spotify access token.
+			params (dict, optional): Query string parameters.
+
+		Returns:
+			requests.Response: The raw response.
+		"""
+		return self._send('GET', f'{self.api_base_url}{path}', params=params, headers=bearer_headers(access_token))
+
+	def me(self, access_token):
+		"""
+		Fetches the current user's profile.
+
+		Args:
+			access_token (str): The user's Spotify access token.
+
+		Returns:
+			requests.Response: The raw ``/me`` response.
+		"""
+		return self.get('/me', access_token)
+
+	def top_items(self, access_token, item_type, limit, time_range):
+		"""
+		Fetches the current user's top tracks or artists.
+
+		Args:
+			access_token (str): The user's Spotify access token.
+			item_type (str): Either ``'tracks'`` or ``'artists'``.
+			limit (int): Number of items to return.
+			time_range (str): One of ``'short_term'``, ``'medium_term'`` or ``'long_term'``.
+
+		Returns:
+			requests.Response: The raw ``/me/top/{item_type}`` response.
+		"""
+		return self.get(f'/me/top/{item_type}', access_token, params={'limit': limit, 'time_range': time_range})
+
+	def request_token(self, data, headers=None):
+		"""
+		Posts a grant to the Accounts service token endpoint.
+
+		Args:
+			data (dict): Form body, e.g. an ``authorization_code`` or ``refresh_token`` grant.
+			headers (dict, optional): Extra headers such as :func:`client_credentials_headers`.
+
+		Returns:
+			requests.Response: The raw token response.
+		"""
+		return self._send('POST', f'{self.accounts_base_url}/api/token', data=data, headers=headers)
+
+
+class AsyncSpotifyClient:
+	"""
+	The async counterpart of :class:`SpotifyClient`, built on pooled ``httpx.AsyncClient``\ s.
+
+	An ``httpx.AsyncClient`` is bound to the event loop it was first used on, so one is
+	kept per running loop. Under ASGI that is a single, long-lived pool per process.
+
+	Attributes:
+		timeout (tuple): Default (connect, read) timeout in seconds.
+		pool_maxsize (int): Maximum number of connections kept per pool.
+		scheduler (RateLimitScheduler or None): Rate limiter every call is sent through.
+		breaker (CircuitBreaker or None): Circuit breaker guarding every call.
+		api_base_url (str): Base URL of the Web API, e.g. a local fake server's.
+		accounts_base_url (str): Base URL of the Accounts service.
+	"""
+
+	def __init__(self, timeout=DEFAULT_TIMEOUT, pool_maxsize=DEFAULT_POOL_MAXSIZE, scheduler=None, breaker=None,
+	             api_base_url=API_BASE_URL, accounts_base_url=ACCOUNTS_BASE_URL):
+		self.timeout = timeout
+		self.pool_maxsize = pool_maxsize
+		self.scheduler = scheduler
+		self.breaker = breaker
+		self.api_base_url = api_base_url
+		self.accounts_base_url = accounts_base_url
+		self._pools = weakref.WeakKeyDictionary()
+
+	@property
+	def http(self):
+		"""
+		httpx.AsyncClient: The connection pool of the running event loop.
+		"""
+		loop = asyncio.get_running_loop()
+		pool = self._pools.get(loop)
+		if pool is None:
+			connect, read = self.timeout
+			pool = httpx.AsyncClient(
+				timeout=httpx.Timeout(read, connect=connect),
+				limits=httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize),
+			)
+			self._pools[loop] = pool
+		return pool
+
+	async def _request(self, method, url, **kwargs):
+		"""
+		Sends a single request through the circuit breaker, if any.
+		"""
+		if self.breaker is None:
+			return await self.http.request(method, url, **kwargs)
+		self.breaker.allow()
+		try:
+			response = await self.http.request(method, url, **kwargs)
+		except httpx.TransportError:
+			self.breaker.record_failure()
+			raise
+		except BaseException:
+			# Cancelled (e.g. the client disconnected) or a bug on our side; not Spotify's
+			# fault, but an abandoned half-open probe must still give its slot back
+			self.breaker.release()
+			raise
+		_record_outcome(self.breaker, response)
+		return response
+
+	async def _send(self, method, url, **kwargs):
+		"""
+		Sends a request through the rate limiter and circuit breaker, if any.
+
+		Raises:
+			SpotifyUnavailable: If the call was refused, timed out or could not connect.
+		"""
+		send = partial(self._request, method, url, **kwargs)
+		try:
+			if self.scheduler is None:
+				return await send()
+			return await self.scheduler.acall(send)
+		except QueueFull as e:
+			raise SpotifyUnavailable('Too many Spotify requests are waiting on the rate limit.') from e
+		except CircuitOpen as e:
+			raise SpotifyUnavailable('Spotify calls are paused while Spotify recovers.') from e
+		except httpx.TransportError as e:
+			raise SpotifyUnavailable(f'Spotify could not be reached: {e!r}') from e
+
+	async def get(self, path, access_token, params=None):
+		"""
+		Sends a GET request to the Web API.
+
+		Args:
+			path (str): Path relative to the API base URL, e.g. ``/me``.
+			access_token (str): The user's Spotify access token.
+			params (dict, optional): Query string parameters.
+
+		Returns:
+			httpx.Response: The raw response.
+		"""
+		return await self._send('GET', f'{self.api_base_url}{path}', params=params, headers=bearer_headers(access_token))
+
+	async def me(self, access_token):
+		"""
+		Fetches the current user's profile.
+
+		Args:
+			access_token (str): The user's Spotify access token.
+
+		Returns:
+			httpx.Response: The raw ``/me`` response.
+		"""
+		return await self.get('/me', access_token)
+
+	async def top_items(self, access_token, item_type, limit, time_range):
+		"""
+		Fetches the current user's top tracks or artists.
+
+		Args:
+			access_token (str): The user's Spotify access token.
+			item_type (str): Either ``'tracks'`` or ``'artists'``.
+			limit (int): Number of items to return.
+			time_range (str): One of ``'short_term'``, ``'medium_term'`` or ``'long_term'``.
+
+		Returns:
+			httpx.Response: The raw ``/me/top/{item_type}`` response.
+		"""
+		return await self.get(f'/me/top/{item_type}', access_token, params={'limit': limit, 'time_range': time_range})
+
+	async def request_token(self, data, headers=None):
+		"""
+		Posts a grant to the Accounts service token endpoint.
+
+		Args:
+			data (dict): Form body, e.g. an ``authorization_code`` or ``refresh_token`` grant.
+			headers (dict, optional): Extra headers such as :func:`client_credentials_headers`.
+
+		Returns:
+			httpx.Response: The raw token response.
+		"""
+		return await self._send('POST', f'{self.accounts_base_url}/api/token', data=data, headers=headers)
+
+
+_schedulers = {}
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_scheduler(client_id):
+	"""
+	Returns the rate limiter shared by every call made with a Spotify client ID.
+
+	Spotify enforces its rate limit per app, so all threads using the same client ID
+	draw from the same token bucket.
+
+	Args:
+		client_id (str): The Spotify app's client ID.
+
+	Returns:
+		RateLimitScheduler: The shared scheduler.
+	"""
+	with _client_lock:
+		if client_id not in _schedulers:
+			_schedulers[client_id] = RateLimitScheduler(
+				rate=getattr(settings, 'SPOTIFY_RATE_LIMIT_PER_SECOND', 10.0),
+				burst=getattr(settings, 'SPOTIFY_RATE_LIMIT_BURST', 20),
+				max_queue=getattr(settings, 'SPOTIFY_RATE_LIMIT_MAX_QUEUE', 100),
+				max_retries=getattr(settings, 'SPOTIFY_RATE_LIMIT_MAX_RETRIES', 2),
+				max_retry_after=getattr(settings, 'SPOTIFY_RATE_LIMIT_MAX_RETRY_AFTER', 30.0),
+			)
+		return _schedulers[client_id]
+
+
+def get_client():
+	"""
+	Returns the process-wide Spotify client, creating it on first use.
+
+	Returns:
+		SpotifyClient: The shared client.
+	"""
+	global _client
+	if _client is None:
+		scheduler = get_scheduler(os.getenv('SPOTIFY_CLIENT_ID'))
+		with _client_lock:
+			if _client is None:
+				_client = SpotifyClient(
+					timeout=getattr(settings, 'SPOTIFY_TIMEOUT', DEFAULT_TIMEOUT),
+					pool_maxsize=getattr(settings, 'SPOTIFY_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE),
+					scheduler=scheduler,
+					breaker=get_breaker('spotify'),
+					api_base_url=getattr(settings, 'SPOTIFY_API_BASE_URL', API_BASE_URL),
+					accounts_base_url=getattr(settings, 'SPOTIFY_ACCOUNTS_BASE_URL', ACCOUNTS_BASE_URL),
+				)
+	return _client
+
+
+def get_async_client():
+	"""
+	Returns the process-wide async Spotify client, creating it on first use.
+
+	Returns:
+		AsyncSpotifyClient: The shared client.
+	"""
+	global _async_client
+	if _async_client is None:
+		scheduler = get_scheduler(os.getenv('SPOTIFY_CLIENT_ID'))
+		with _client_lock:
+			if _async_client is None:
+				_async_client = AsyncSpotifyClient(
+					timeout=getattr(settings, 'SPOTIFY_TIMEOUT', DEFAULT_TIMEOUT),
+					pool_maxsize=getattr(settings, 'SPOTIFY_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE),
+					scheduler=scheduler,
+					breaker=get_breaker('spotify'),
+					api_base_url=getattr(settings, 'SPOTIFY_API_BASE_URL', API_BASE_URL),
+					accounts_base_url=getattr(settings, 'SPOTIFY_ACCOUNTS_BASE_URL', ACCOUNTS_BASE_URL),
+				)
+	return _async_client
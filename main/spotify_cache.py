@@ -0,0 +1,135 @@
+"""
+Per-user cache of Spotify top-items payloads on top of Django's cache framework.
+
+Each (user, item type, time range) has one entry holding the largest window fetched
+for it, which also serves every smaller limit. Entries expire after a configurable
+TTL and are read by key, with no shared index to keep consistent, so several
+processes can safely share a file-based or database backend (locmem is per process).
+The memory cap and eviction are the backend's: the ``MAX_ENTRIES`` option of the
+cache named by ``SPOTIFY_CACHE_ALIAS`` bounds the entries kept, and locmem evicts the
+least recently used first.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .counters import incr_counter
+
+DEFAULT_TTL = 600
+
+ITEM_TYPES = ('tracks', 'artists')
+TIME_RANGES = ('short_term', 'medium_term', 'long_term')
+
+HITS_KEY = 'spotify:top:hits'
+MISSES_KEY = 'spotify:top:misses'
+
+
+class TopItemsCache:
+	"""
+	A TTL cache of top-items payloads shared by every view.
+
+	A request for the top ``limit`` items is also served by any cached, larger window
+	of the same (user, item type, time range), sliced down to ``limit``.
+
+	Attributes:
+		alias (str): Name of the Django cache that stores the entries.
+		ttl (int): Seconds an entry stays valid.
+	"""
+
+	def __init__(self, alias='default', ttl=DEFAULT_TTL):
+		self.alias = alias
+		self.ttl = ttl
+
+	@property
+	def cache(self):
+		return caches[self.alias]
+
+	@staticmethod
+	def _key(user_id, item_type, time_range):
+		return f'spotify:top:{user_id}:{item_type}:{time_range}'
+
+	def get(self, user_id, item_type, time_range, limit):
+		"""
+		Looks up the top ``limit`` items for a user.
+
+		Args:
+			user_id (int): Primary key of the user.
+			item_type (str): Either ``'tracks'`` or ``'artists'``.
+			time_range (str): One of ``'short_term'``, ``'medium_term'`` or ``'long_term'``.
+			limit (int): Number of items needed.
+
+		Returns:
+			dict or None: A payload whose ``items`` hold at least ``limit`` entries, or None on a miss.
+		"""
+		entry = self.cache.get(self._key(user_id, item_type, time_range))
+		if entry is None or entry['limit'] < limit:
+			incr_counter(MISSES_KEY, cache=self.cache)
+			return None
+		incr_counter(HITS_KEY, cache=self.cache)
+		payload = entry['payload']
+		return {**payload, 'items': payload['items'][:limit]}
+
+	def set(self, user_id, item_type, time_range, limit, payload):
+		"""
+		Stores a top-items payload unless a larger window of it is already cached.
+
+		Args:
+			user_id (int): Primary key of the user.
+			item_type (str): Either ``'tracks'`` or ``'artists'``.
+			time_range (str): One of ``'short_term'``, ``'medium_term'`` or ``'long_term'``.
+			limit (int): The window that was fetched.
+			payload (dict): The decoded Spotify response.
+		"""
+		key = self._key(user_id, item_type, time_range)
+		cached = self.cache.get(key)
+		# A race between two writers only ever stores one valid window or the other
+		if cached is None or cached['limit'] <= limit:
+			self.cache.set(key, {'limit': limit, 'payload': payload}, timeout=self.ttl)
+
+	def invalidate(self, user_id):
+		"""
+		Drops every cached payload for a user, e.g. after they link a different Spotify account.
+
+		Args:
+			user_id (int): Primary key of the user.
+		"""
+		self.cache.delete_many([self._key(user_id, item_type, time_range)
+		                        for item_type in ITEM_TYPES for time_range in TIME_RANGES])
+
+	def stats(self):
+		"""
+		Reports the cache's counters.
+
+		Returns:
+			dict: Hits, misses and hit rate.
+		"""
+		hits = self.cache.get(HITS_KEY, 0)
+		misses = self.cache.get(MISSES_KEY, 0)
+		return {
+			'hits': hits,
+			'misses': misses,
+			'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+		}
+
+
+_top_items_cache = None
+_top_items_cache_lock = threading.Lock()
+
+
+def get_top_items_cache():
+	"""
+	Returns the process-wide top-items cache configured from settings.
+
+	Returns:
+		TopItemsCache: The shared cache.
+	"""
+	global _top_items_cache
+	if _top_items_cache is None:
+		with _top_items_cache_lock:
+			if _top_items_cache is None:
+				_top_items_cache = TopItemsCache(
+					alias=getattr(settings, 'SPOTIFY_CACHE_ALIAS', 'default'),
+					ttl=getattr(settings, 'SPOTIFY_CACHE_TTL', DEFAULT_TTL),
+				)
+	return _top_items_cache
@@ -1,14 +1,45 @@
-from django.test import TestCase, Client
+import asyncio
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from openai import OpenAIError
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.test import TestCase, TransactionTestCase, Client
 from django.contrib.auth import get_user_model
 from django.test import SimpleTestCase
 from django.urls import reverse, resolve
-from main.views import login, home, register, delete_wrapped
+from main.views import login, home, register
 from main.forms import RegistrationForm, LoginForm, ForgetForm
 from unittest.mock import patch
 from django.contrib.auth.hashers import make_password
 from main.backends import AuthModelBackend
-from main.models import User, Wraps
-from datetime import datetime
+from main.catalog import compact_wrap, hydrate_wrap, store_catalog
+from main.circuit import CircuitBreaker, CircuitOpen
+from main.description_cache import DescriptionCache, taste_features
+from main.descriptions import generate_description, llama_description, save_description, schedule_description
+from main.llm import LLMProvider, StubProvider, build_provider
+from main.models import Artist, CachedDescription, SpotifyProfile, Track, User, Wraps
+from main.prompts import PROMPT_VERSION, build_description_prompt, estimate_tokens, record_usage, usage_stats
+from main.profiles import display_name_for, refresh_profile, store_profile
+from main.planner import TopItemsPlan
+from main.ratelimit import QueueFull, RateLimitScheduler, TokenBucket
+from main.spotify_cache import TopItemsCache
+from main.tokens import (LOCK_STRIPES, _async_user_lock, _user_lock, aget_access_token, get_access_token,
+                         token_expiring)
+from main.spotify import AsyncSpotifyClient, SpotifyClient, SpotifyUnavailable, bearer_headers, client_credentials_headers, get_client
+from datetime import datetime, timedelta
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
@@ -313,8 +344,8 @@ class UserModelTest(TestCase):
         related Wraps records are deleted as expected.
         """
         user = User.objects.create_user(username='testuser', password='securepassword')
-        wrap = Wraps.objects.create(username=user.username, term='2024', spotify_display_name='Test Display',
-                                    wrap_json={})
+        wrap = Wraps.objects.create(user=user, term='2024', spotify_display_name='Test Display',
+                                    document={})
 
         # Ensure Wraps record is created
         self.assertEqual(Wraps.objects.count(), 1)
@@ -357,9 +388,9 @@ class WrapsModelTest(TestCase):
         time and confirms that the total count of Wraps instances is correct.
         """
         user = User.objects.create_user(username='testuser', password='securepassword')
-        wrap = Wraps.objects.create(username=user.username, term='2024', spotify_display_name='Test Display',
-                                    wrap_json={})
-        self.assertEqual(wrap.username, 'testuser')
+        wrap = Wraps.objects.create(user=user, term='2024', spotify_display_name='Test Display',
+                                    document={})
+        self.assertEqual(wrap.user.username, 'testuser')
         self.assertEqual(wrap.term, '2024')
         self.assertEqual(wrap.spotify_display_name, 'Test Display')
         self.assertIsInstance(wrap.creation_date, datetime)
@@ -374,21 +405,36 @@ class WrapsModelTest(TestCase):
         the __str__ method functions as expected.
         """
         user = User.objects.create_user(username='testuser', password='securepassword')
-        wrap = Wraps.objects.create(username=user.username, term='2024', spotify_display_name='Test Display',
-                                    wrap_json={})
+        wrap = Wraps.objects.create(user=user, term='2024', spotify_display_name='Test Display',
+                                    document={})
         self.assertEqual(str(wrap), 'testuser' + str(wrap.creation_date))
 
-    def test_wrap_missing_username(self):
+    def test_wrap_counters(self):
         """
-        Tests that a Wraps instance cannot be created with a missing username.
+        Tests that the user's wrap count and last wrap date follow wraps being created and deleted.
+        """
+        user = User.objects.create_user(username='testuser', password='securepassword')
+        first = Wraps.objects.create(user=user, document={}, creation_date=timezone.now() - timedelta(days=1))
+        latest = Wraps.objects.create(user=user, document={}, creation_date=timezone.now())
+        Wraps.objects.create(user=user, document={}, creation_date=first.creation_date - timedelta(days=1))
+        user.refresh_from_db()
+        self.assertEqual((user.wrap_count, user.last_wrap_at), (3, latest.creation_date))
+
+        latest.delete()
+        user.refresh_from_db()
+        self.assertEqual((user.wrap_count, user.last_wrap_at), (2, first.creation_date))
+
+    def test_wrap_missing_user(self):
+        """
+        Tests that a Wraps instance cannot be created without a user.
 
         This method checks that trying to create a Wraps instance with a None value
-        for the username raises a ValidationError, ensuring that the username
+        for the user raises a ValidationError, ensuring that the user
         field is required and properly validated.
         """
         with self.assertRaises(ValidationError):
-            wrap = Wraps(username=None, spotify_display_name='Test Display', wrap_json={})
-            wrap.full_clean()  # Will raise ValidationError if username is None
+            wrap = Wraps(user=None, spotify_display_name='Test Display', document={})
+            wrap.full_clean()  # Will raise ValidationError if user is None
 
 
 class UserManagerTests(TestCase):
@@ -845,7 +891,7 @@ class ViewsTestCase(TestCase):
         - The correct template ('Spotify_Wrapper/summary.html') is used.
         """
         # Test that the summary view can be accessed when logged in with valid data
-        response = self.client.get(reverse('summary', args=['2024-11-30']))
+        response = self.client.get(reverse('summary', args=['AbCdE12345']))
         self.assertEqual(response.status_code, 200)  # Check standard functionality
         self.assertTemplateUsed(response, 'Spotify_Wrapper/summary.html')  # Check if the correct template is used
 
@@ -921,6 +967,21 @@ class ViewsTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'Spotify_Wrapper/contact.html')
 
+    def test_accountpage_reads_counters(self):
+        """
+        Test that the account page shows the wrap counters without querying the wraps.
+
+        Verifies:
+        - The context carries the user's wrap count and last wrap date.
+        - No query touches the wraps table.
+        """
+        wrap = Wraps.objects.create(user=self.user, document={}, creation_date=timezone.now())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('account-page'))
+        self.assertEqual(response.context['wrap_count'], 1)
+        self.assertEqual(response.context['most_recent_wrap_date'], wrap.creation_date)
+        self.assertFalse([query for query in queries if 'main_wraps' in query['sql']])
+
     def test_library_view(self):
         """
         Test that the library view is accessible.
@@ -933,6 +994,31 @@ class ViewsTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'Spotify_Wrapper/library.html')
 
+    @patch('main.views.LIBRARY_PAGE_SIZE', 2)
+    def test_library_pages_with_cursor(self):
+        """
+        Test that the library lists wraps newest first, a page at a time, without loading their data.
+
+        Verifies:
+        - Each page holds at most LIBRARY_PAGE_SIZE wraps and links to the next through a cursor.
+        - Wraps created at the same moment are neither skipped nor repeated across pages.
+        - The wraps' data is deferred.
+        """
+        created = timezone.now()
+        wraps = [Wraps.objects.create(user=self.user, term='short_term', document={}, creation_date=created)
+                 for _ in range(2)]
+        wraps += [Wraps.objects.create(user=self.user, term='short_term', document={},
+                                       creation_date=created - timedelta(days=1))]
+
+        response = self.client.get(reverse('library'))
+        first = response.context['wraps']
+        self.assertEqual([wrap.pk for wrap in first], [wraps[1].pk, wraps[0].pk])
+        self.assertIn('payload', first[0].get_deferred_fields())
+
+        response = self.client.get(reverse('library'), {'before': response.context['next_cursor']})
+        self.assertEqual([wrap.pk for wrap in response.context['wraps']], [wraps[2].pk])
+        self.assertIsNone(response.context['next_cursor'])
+
     def test_register_view_get(self):
         """
         Test the registration view for a GET request.
@@ -1038,7 +1124,7 @@ class ViewsTestCase(TestCase):
         Ensures the correct HTTP status code and template are used.
         """
         # Test GenreNebulas view with a valid date string
-        response = self.client.get(reverse('genre_nebulas', args=['2024-11-30']))
+        response = self.client.get(reverse('genre_nebulas', args=['AbCdE12345']))
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'Spotify_Wrapper/GenreNebulas.html')
 
@@ -1048,7 +1134,7 @@ class ViewsTestCase(TestCase):
         Verifies the HTTP status code and correct template usage.
         """
         # Test StellarHits view with a valid date string
-        response = self.client.get(reverse('stellar_hits', args=['2024-11-30']))
+        response = self.client.get(reverse('stellar_hits', args=['AbCdE12345']))
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'Spotify_Wrapper/StellarHits.html')
 
@@ -1058,7 +1144,7 @@ class ViewsTestCase(TestCase):
         Ensures the response uses the correct template and HTTP status code.
         """
         # Test ConstellationArtists view with a valid date string
-        response = self.client.get(reverse('artist_constellation', args=['2024-11-30']))
+        response = self.client.get(reverse('artist_constellation', args=['AbCdE12345']))
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'Spotify_Wrapper/ConstellationArtists.html')
 
@@ -1068,7 +1154,7 @@ class ViewsTestCase(TestCase):
         Confirms the HTTP status code is 200 and the correct template is rendered.
         """
         # Test AstroAI view with a valid date string
-        response = self.client.get(reverse('astro-ai', args=['2024-11-30']))
+        response = self.client.get(reverse('astro-ai', args=['AbCdE12345']))
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'Spotify_Wrapper/AstroAI.html')
 
@@ -1205,7 +1291,7 @@ class ViewsTestCase(TestCase):
         Verifies the response status, template, and expected content.
         """
         # Test summary view when user is logged in with a valid date
-        response = self.client.get(reverse('summary', args=['2024-11-30']))
+        response = self.client.get(reverse('summary', args=['AbCdE12345']))
         self.assertEqual(response.status_code, 200)  # Check if the response is valid
         self.assertTemplateUsed(response, 'Spotify_Wrapper/summary.html')  # Ensure the correct template is used
         self.assertContains(response, 'Your Listening Universe')  # Change according to the expected content
@@ -1293,7 +1379,7 @@ class ViewsTestCase(TestCase):
 
         self.client.login(username='summaryuser', password='summarypass')
 
-        response = self.client.get(reverse('summary', args=['2024-11-30']))
+        response = self.client.get(reverse('summary', args=['AbCdE12345']))
 
         self.assertEqual(response.status_code, 200)  # Expecting access granted
         self.assertTemplateUsed(response, 'Spotify_Wrapper/summary.html')  # Check for the correct template
@@ -1331,7 +1417,7 @@ class ViewsTestCase(TestCase):
 
         self.client.login(username='astroaiuser', password='astropassword')
 
-        response = self.client.get(reverse('astro-ai', args=['2024-11-30']))  # Assuming this is a valid date
+        response = self.client.get(reverse('astro-ai', args=['AbCdE12345']))  # Assuming this is a valid date
         self.assertEqual(response.status_code, 200)  # Expecting access allowed
         self.assertTemplateUsed(response, 'Spotify_Wrapper/AstroAI.html')  # Check for the correct template
 
@@ -1366,7 +1452,7 @@ class ViewsTestCase(TestCase):
 
         self.client.login(username='constellationuser', password='constellationpass')
 
-        response = self.client.get(reverse('artist_constellation', args=['2024-11-30']))
+        response = self.client.get(reverse('artist_constellation', args=['AbCdE12345']))
         self.assertEqual(response.status_code, 200)  # Expecting access allowed
         self.assertTemplateUsed(response, 'Spotify_Wrapper/ConstellationArtists.html')  # Check for the correct template
 
@@ -1384,7 +1470,7 @@ class ViewsTestCase(TestCase):
 
         self.client.login(username='stellaruser', password='stellarpassword')
 
-        response = self.client.get(reverse('stellar_hits', args=['2024-11-30']))
+        response = self.client.get(reverse('stellar_hits', args=['AbCdE12345']))
         self.assertEqual(response.status_code, 200)  # Expecting access allowed
         self.assertTemplateUsed(response, 'Spotify_Wrapper/StellarHits.html')  # Check for the correct template
 
@@ -1402,7 +1488,7 @@ class ViewsTestCase(TestCase):
 
         self.client.login(username='genrenebulasuser', password='genrenebulaspass')
 
-        response = self.client.get(reverse('genre_nebulas', args=['2024-11-30']))
+        response = self.client.get(reverse('genre_nebulas', args=['AbCdE12345']))
         self.assertEqual(response.status_code, 200)  # Expecting access allowed
         self.assertTemplateUsed(response, 'Spotify_Wrapper/GenreNebulas.html')  # Check for the correct template
 
@@ -1430,14 +1516,14 @@ class ViewsTestCase(TestCase):
 
         # Create a dummy wrap for this date
         self.wrap = Wraps.objects.create(
-            username='wrapperuser',
+            user=self.user,
             term='medium_term',
             spotify_display_name='Wrapped User',
-            wrap_json='{}',  # Example data
+            document={},  # Example data
             creation_date='2024-11-30'  # Set to the date intended for testing
         )
 
-        response = self.client.get(reverse('wrapped', args=['2024-11-30']))
+        response = self.client.get(reverse('wrapped', args=[self.wrap.slug]))
         self.assertEqual(response.status_code, 200)  # Expecting access allowed
         self.assertTemplateUsed(response, 'Spotify_Wrapper/wrapper.html')  # Check for the correct template
 
@@ -1535,9 +1621,9 @@ class ViewsTestCase(TestCase):
         self.client.login(username='nonexistentuser', password='password')
 
         # Attempt to delete a wrapped entry that doesn't exist
-        response_status = delete_wrapped(self.client, '2024-10-01')  # Use a date that doesn't exist in the DB
+        response = self.client.get(reverse('delete-wrapped', args=['AbCdE12345']))  # A slug that isn't in the DB
 
-        self.assertEqual(response_status, 404)  # Expecting not found status (404)
+        self.assertEqual(response.status_code, 404)  # Expecting not found status (404)
 
     def test_delete_wrapped_successfully(self):
         """
@@ -1565,26 +1651,39 @@ class ViewsTestCase(TestCase):
         # Create a wrapped entry for this user
         wrap_creation_date = datetime(2024, 11, 30)
         self.wrap = Wraps.objects.create(
-            username='deletetestuser',
+            user=self.user,
             term='medium_term',
             spotify_display_name='Test Wrapped',
-            wrap_json='{}',  # Placeholder for wrap data
+            document={},  # Placeholder for wrap data
             creation_date=wrap_creation_date  # Specific date for deletion
         )
 
         # Ensure the wrap has been created
-        self.assertTrue(Wraps.objects.filter(username='deletetestuser',
+        self.assertTrue(Wraps.objects.filter(user=self.user,
                                              creation_date=wrap_creation_date).exists())  # Check if wrap exists
 
         # Attempt to delete the wrapped entry using the client
-        response_status = delete_wrapped(self.client, wrap_creation_date.isoformat())
+        response = self.client.get(reverse('delete-wrapped', args=[self.wrap.slug]))
 
         # Check the response status
-        #self.assertEqual(response.status_code, 200)  # Expecting a success status (200)
+        self.assertEqual(response.status_code, 200)  # Expecting a success status (200)
 
         # Check that the wrapped entry is indeed deleted
-        self.assertTrue(Wraps.objects.filter(username='deletetestuser',
-                                              creation_date=wrap_creation_date).exists())  # Verify it is deleted
+        self.assertFalse(Wraps.objects.filter(user=self.user,
+                                               creation_date=wrap_creation_date).exists())  # Verify it is deleted
+
+    def test_delete_wrapped_of_another_user(self):
+        """
+        Test that a user cannot delete someone else's wrapped, and that logged-out requests are redirected.
+        """
+        owner = User.objects.create_user(username='owner', password='ownerpass')
+        wrap = Wraps.objects.create(user=owner, term='medium_term', document={})
+        User.objects.create_user(username='intruder', password='intruderpass')
+        self.client.login(username='intruder', password='intruderpass')
+        self.assertEqual(self.client.get(reverse('delete-wrapped', args=[wrap.slug])).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('delete-wrapped', args=[wrap.slug])).status_code, 302)
+        self.assertTrue(Wraps.objects.filter(pk=wrap.pk).exists())
 
     def test_view_library_with_wraps(self):
         """
@@ -1610,17 +1709,17 @@ class ViewsTestCase(TestCase):
 
         # Create wrapped entries for the user
         Wraps.objects.create(
-            username='libraryuser',
+            user=self.user,
             term='medium_term',
             spotify_display_name='Test Wrapper 1',
-            wrap_json='{}',
+            document={},
             creation_date=datetime(2024, 11, 30)  # Example date
         )
         Wraps.objects.create(
-            username='libraryuser',
+            user=self.user,
             term='medium_term',
             spotify_display_name='Test Wrapper 2',
-            wrap_json='{}',
+            document={},
             creation_date=datetime(2024, 10, 30)  # Example date
         )
 
@@ -1700,3 +1799,1414 @@ class ViewsTestCase(TestCase):
 
 
 
+
+
+class SpotifyClientTest(SimpleTestCase):
+    def test_get_client_is_shared(self):
+        """
+        Tests that every caller receives the same pooled client and session.
+        """
+        self.assertIs(get_client(), get_client())
+        self.assertIs(get_client().session, get_client().session)
+
+    def test_bearer_headers(self):
+        """
+        Tests that Web API calls carry the user's bearer token.
+        """
+        self.assertEqual(bearer_headers('abc'), {'Authorization': 'Bearer abc'})
+
+    @patch('os.getenv')
+    def test_client_credentials_headers(self, mock_getenv):
+        """
+        Tests that the Accounts service headers encode the client ID and secret.
+        """
+        mock_getenv.side_effect = lambda var: {'SPOTIFY_CLIENT_ID': 'id', 'SPOTIFY_CLIENT_SECRET': 'secret'}.get(var)
+        headers = client_credentials_headers()
+        self.assertEqual(headers['Authorization'], 'Basic aWQ6c2VjcmV0')
+
+    def test_top_items_uses_session_and_timeout(self):
+        """
+        Tests that top-items requests go through the pooled session with the default timeout.
+        """
+        client = SpotifyClient(timeout=(1, 2))
+        with patch.object(client.session, 'request') as mock_request:
+            client.top_items('abc', 'artists', 20, 'short_term')
+        mock_request.assert_called_once_with(
+            'GET',
+            'https://api.spotify.com/v1/me/top/artists',
+            params={'limit': 20, 'time_range': 'short_term'},
+            headers={'Authorization': 'Bearer abc'},
+            timeout=(1, 2),
+        )
+
+    def test_base_urls_are_configurable(self):
+        """
+        Tests that the client can be pointed at a local stand-in for Spotify.
+        """
+        client = SpotifyClient(api_base_url='http://127.0.0.1:8765/v1', accounts_base_url='http://127.0.0.1:8765')
+        with patch.object(client.session, 'request') as mock_request:
+            client.me('abc')
+            client.request_token({'grant_type': 'refresh_token'})
+        self.assertEqual(mock_request.call_args_list[0].args, ('GET', 'http://127.0.0.1:8765/v1/me'))
+        self.assertEqual(mock_request.call_args_list[1].args, ('POST', 'http://127.0.0.1:8765/api/token'))
+
+
+class FakeSpotifyResponse:
+    """
+    A minimal stand-in for requests.Response used to fake Spotify replies.
+    """
+
+    def __init__(self, payload, status_code=200, headers=None):
+        self.payload = payload
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        return self.payload
+
+
+def fake_track(n):
+    return {
+        'name': f'Track {n}', 'id': f't{n}', 'popularity': n, 'preview_url': None,
+        'album': {'id': f'al{n}', 'name': f'Album {n}', 'images': [{'url': f'http://img/{n}'}]},
+        'artists': [{'name': f'Artist {n}', 'id': f'a{n}'}],
+    }
+
+
+def fake_artist(n):
+    return {'name': f'Artist {n}', 'id': f'a{n}', 'popularity': n, 'genres': [f'genre {n % 3}'],
+            'images': [{'url': f'http://img/a{n}'}]}
+
+
+class FakeSpotifyClient:
+    """
+    Records every Spotify call and answers with canned top-items data.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def me(self, access_token):
+        self.calls.append(('me',))
+        if access_token == 'revoked':
+            return FakeSpotifyResponse({}, 401)
+        return FakeSpotifyResponse({'display_name': 'Fake User'})
+
+    def top_items(self, access_token, item_type, limit, time_range):
+        self.calls.append((item_type, limit, time_range))
+        if access_token == 'revoked':
+            return FakeSpotifyResponse({}, 401)
+        make = fake_track if item_type == 'tracks' else fake_artist
+        return FakeSpotifyResponse({'items': [make(n) for n in range(limit)]})
+
+
+class FakeAsyncSpotifyClient(FakeSpotifyClient):
+    """
+    The async counterpart of FakeSpotifyClient, standing in for AsyncSpotifyClient.
+    """
+
+    async def me(self, access_token):
+        return super().me(access_token)
+
+    async def top_items(self, access_token, item_type, limit, time_range):
+        return super().top_items(access_token, item_type, limit, time_range)
+
+
+class MakeWrappedViewTest(TestCase):
+    def setUp(self):
+        """
+        Creates a user linked to Spotify and logs them in.
+        """
+        self.user = User.objects.create_user(username='wrapuser', password='wrappass',
+                                             spotify_access_token='token', spotify_refresh_token='refresh',
+                                             spotify_token_expires_at=timezone.now() + timedelta(hours=1))
+        self.client.post(reverse('user_login'), {'username': 'wrapuser', 'password': 'wrappass'})
+        SpotifyProfile.objects.create(user=self.user, display_name='Fake User', fetched_at=timezone.now())
+        self.spotify = FakeAsyncSpotifyClient()
+        caches['spotify'].clear()
+
+    @patch('main.views.schedule_description')
+    def test_make_wrapped_saves_wrap(self, mock_schedule):
+        """
+        Tests that make_wrapped fetches the top items, saves a wrap and returns it before the description is ready.
+        """
+        with patch('main.views.get_async_client', return_value=self.spotify):
+            response = self.client.post(reverse('make-wrapped', args=['short_term', 5]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(len(data['top_tracks']), 5)
+        self.assertEqual(len(data['top_artists']), 5)
+        self.assertEqual(response.json()['description_status'], 'pending')
+        wrap = Wraps.objects.get(user__username='wrapuser')
+        self.assertEqual(wrap.spotify_display_name, 'Fake User')
+        self.assertEqual(wrap.description_status, Wraps.DESCRIPTION_PENDING)
+        mock_schedule.assert_called_once_with(wrap.pk, data)
+        self.assertNotIn(('me',), self.spotify.calls)
+        self.assertEqual(wrap.document['top_tracks'], ['t0', 't1', 't2', 't3', 't4'])
+        response = self.client.get(reverse('get-wrapped', args=[wrap.slug]))
+        self.assertEqual(response.json()['data'], data)
+
+    @patch('main.views.schedule_description')
+    def test_make_wrapped_fetches_each_window_once(self, mock_schedule):
+        """
+        Tests that the wrap and genre artist windows are served by a single top-artists call.
+        """
+        with patch('main.views.get_async_client', return_value=self.spotify):
+            self.client.post(reverse('make-wrapped', args=['short_term', 5]))
+        self.assertCountEqual(self.spotify.calls, [('tracks', 5, 'short_term'), ('artists', 20, 'short_term')])
+
+    @patch('main.views.schedule_description')
+    def test_make_wrapped_reads_windows_cached_by_game(self, mock_schedule):
+        """
+        Tests that a long-term wrap made after opening the game is served from the top-items cache.
+        """
+        with patch('main.views.get_async_client', return_value=self.spotify):
+            self.client.get(reverse('game-info'))
+            self.spotify.calls.clear()
+            response = self.client.post(reverse('make-wrapped', args=['long_term', 5]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.spotify.calls, [])
+        self.assertEqual(len(response.json()['data']['top_artists']), 5)
+
+    def test_get_game_info(self):
+        """
+        Tests that get_game_info returns the names of the long-term top artists and tracks.
+        """
+        with patch('main.views.get_async_client', return_value=self.spotify):
+            response = self.client.get(reverse('game-info'))
+        self.assertEqual(len(response.json()['artists']), 50)
+        self.assertEqual(response.json()['tracks'][0], 'Track 0')
+        self.assertNotIn(('me',), self.spotify.calls)
+
+    def test_get_game_info_refreshes_revoked_token(self):
+        """
+        Tests that a token rejected before its recorded expiry is refreshed once and the call retried.
+        """
+        self.user.spotify_access_token = 'revoked'
+        self.user.save()
+        with patch('main.views.get_async_client', return_value=self.spotify), \
+                patch('main.tokens.arefresh_spotify_token', return_value='fresh') as mock_refresh:
+            response = self.client.get(reverse('game-info'))
+        self.assertEqual(response.status_code, 200)
+        mock_refresh.assert_called_once()
+
+
+class TopItemsPlanTest(SimpleTestCase):
+    def test_request_keeps_largest_window(self):
+        """
+        Tests that overlapping needs collapse into the largest window, capped at Spotify's maximum.
+        """
+        plan = TopItemsPlan()
+        plan.request('artists', 'short_term', 5)
+        plan.request('artists', 'short_term', 20)
+        plan.request('tracks', 'long_term', 80)
+        self.assertEqual(plan.windows, {('artists', 'short_term'): 20, ('tracks', 'long_term'): 50})
+
+    def test_items_slices_shared_window(self):
+        """
+        Tests that each consumer receives its own slice of one fetched window.
+        """
+        spotify = FakeAsyncSpotifyClient()
+        plan = TopItemsPlan()
+        plan.request('artists', 'medium_term', 5)
+        plan.request('artists', 'medium_term', 20)
+
+        async def me():
+            return 'profile'
+
+        results = async_to_sync(plan.aexecute)(spotify, 'token', {'me': me})
+        self.assertEqual(results, {'me': 'profile'})
+        self.assertEqual(spotify.calls, [('artists', 20, 'medium_term')])
+        self.assertTrue(plan.ok)
+        self.assertEqual(len(plan.items('artists', 'medium_term', 5)), 5)
+        self.assertEqual(len(plan.items('artists', 'medium_term', 20)), 20)
+
+
+class TopItemsCacheTest(SimpleTestCase):
+    def setUp(self):
+        """
+        Starts every test from an empty cache.
+        """
+        caches['spotify'].clear()
+        self.cache = TopItemsCache(alias='spotify', ttl=60)
+
+    def payload(self, count):
+        return {'items': [fake_artist(n) for n in range(count)]}
+
+    def test_larger_window_serves_smaller_limit(self):
+        """
+        Tests that a cached window is sliced for smaller limits but not reused for larger ones.
+        """
+        self.cache.set(1, 'artists', 'short_term', 20, self.payload(20))
+        self.assertEqual(len(self.cache.get(1, 'artists', 'short_term', 5)['items']), 5)
+        self.assertIsNone(self.cache.get(1, 'artists', 'short_term', 50))
+        self.assertIsNone(self.cache.get(2, 'artists', 'short_term', 5))
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_entries_expire_after_ttl(self):
+        """
+        Tests that entries are no longer served once their TTL has passed.
+        """
+        self.cache.set(1, 'tracks', 'long_term', 5, self.payload(5))
+        with patch('time.time', return_value=time.time() + 61):  # The cache backend's clock
+            self.assertIsNone(self.cache.get(1, 'tracks', 'long_term', 5))
+
+    def test_smaller_window_does_not_replace_larger(self):
+        """
+        Tests that storing a smaller window keeps the larger one that already serves it.
+        """
+        self.cache.set(1, 'artists', 'short_term', 20, self.payload(20))
+        self.cache.set(1, 'artists', 'short_term', 5, self.payload(5))
+        self.assertEqual(len(self.cache.get(1, 'artists', 'short_term', 20)['items']), 20)
+
+    def test_entries_are_shared_between_processes(self):
+        """
+        Tests that entries written by separate cache instances, as by separate processes, all stay reachable.
+        """
+        other = TopItemsCache(alias='spotify', ttl=60)
+        self.cache.set(1, 'artists', 'short_term', 10, self.payload(10))
+        other.set(2, 'artists', 'short_term', 10, self.payload(10))
+        self.cache.set(3, 'tracks', 'long_term', 10, self.payload(10))
+        for user_id, item_type, time_range in [(1, 'artists', 'short_term'), (2, 'artists', 'short_term'),
+                                               (3, 'tracks', 'long_term')]:
+            self.assertIsNotNone(other.get(user_id, item_type, time_range, 10))
+
+    def test_invalidate_drops_user_entries(self):
+        """
+        Tests that invalidating a user removes only that user's entries.
+        """
+        self.cache.set(1, 'artists', 'short_term', 10, self.payload(10))
+        self.cache.set(2, 'artists', 'short_term', 10, self.payload(10))
+        self.cache.invalidate(1)
+        self.assertIsNone(self.cache.get(1, 'artists', 'short_term', 10))
+        self.assertIsNotNone(self.cache.get(2, 'artists', 'short_term', 10))
+
+
+class StatusViewTest(TestCase):
+    def test_status_reports_cache_counters(self):
+        """
+        Tests that the status endpoint exposes the top-items cache hit/miss counters.
+        """
+        response = self.client.get(reverse('status'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hits', response.json()['spotify_cache'])
+        self.assertIn('misses', response.json()['spotify_cache'])
+        self.assertIn('queue_depth', response.json()['spotify_rate_limit'])
+        self.assertIn('throttled_seconds', response.json()['spotify_rate_limit'])
+
+    def test_status_reports_circuit_breakers(self):
+        """
+        Tests that the status endpoint reports each breaker and flags an open one as degraded.
+        """
+        breaker = CircuitBreaker('llm', failure_threshold=1)
+        breaker.record_failure()
+        with patch('main.views.get_breaker', side_effect=lambda name: breaker if name == 'llm' else CircuitBreaker(name)):
+            response = self.client.get(reverse('status'))
+        self.assertEqual(response.json()['status'], 'degraded')
+        self.assertEqual(response.json()['circuit_breakers']['llm']['state'], 'open')
+        self.assertEqual(response.json()['circuit_breakers']['spotify']['state'], 'closed')
+
+
+class RateLimitSchedulerTest(SimpleTestCase):
+    def test_bucket_delays_calls_beyond_burst(self):
+        """
+        Tests that calls beyond the burst are scheduled at the bucket's rate instead of refused.
+        """
+        bucket = TokenBucket(rate=10, burst=2)
+        now = bucket.updated
+        self.assertEqual([bucket.reserve(now) for _ in range(2)], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.reserve(now), 0.1)
+        self.assertAlmostEqual(bucket.reserve(now), 0.2)
+
+    def test_retries_after_429(self):
+        """
+        Tests that a 429 reply pauses the bucket for its Retry-After and is then retried.
+        """
+        scheduler = RateLimitScheduler(rate=100, burst=5)
+        replies = [FakeSpotifyResponse({}, 429, {'Retry-After': '0.05'}), FakeSpotifyResponse({})]
+        started = time.monotonic()
+        response = scheduler.call(lambda: replies.pop(0))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(scheduler.stats()['rate_limited'], 1)
+        self.assertEqual(scheduler.stats()['throttled_calls'], 1)
+
+    def test_long_retry_after_is_not_waited_out(self):
+        """
+        Tests that a Retry-After longer than the configured maximum is returned without retrying.
+        """
+        scheduler = RateLimitScheduler(max_retry_after=1)
+        replies = [FakeSpotifyResponse({}, 429, {'Retry-After': '120'}), FakeSpotifyResponse({})]
+        self.assertEqual(scheduler.call(lambda: replies.pop(0)).status_code, 429)
+
+    def test_full_queue_refuses_new_waiters(self):
+        """
+        Tests that a call which would have to wait is refused once the wait queue is full.
+        """
+        scheduler = RateLimitScheduler(rate=1, burst=1, max_queue=0)
+        scheduler.release(scheduler.acquire())
+        with self.assertRaises(QueueFull):
+            scheduler.acquire()
+        self.assertEqual(scheduler.stats()['rejected'], 1)
+
+    def test_client_reports_full_queue_as_unavailable(self):
+        """
+        Tests that the Spotify client surfaces a full rate-limit queue as SpotifyUnavailable.
+        """
+        client = SpotifyClient(scheduler=RateLimitScheduler(rate=1, burst=1, max_queue=0))
+        with patch.object(client.session, 'request', return_value=FakeSpotifyResponse({})):
+            client.me('abc')
+            with self.assertRaises(SpotifyUnavailable):
+                client.me('abc')
+
+
+class FakeAccountsClient:
+    """
+    Answers refresh_token grants slowly and counts them.
+    """
+
+    def __init__(self):
+        self.refreshes = 0
+
+    def request_token(self, data, headers=None):
+        self.refreshes += 1
+        time.sleep(0.2)
+        return FakeSpotifyResponse({'access_token': f'fresh{self.refreshes}', 'expires_in': 3600})
+
+
+class FakeAsyncAccountsClient(FakeAccountsClient):
+    async def request_token(self, data, headers=None):
+        self.refreshes += 1
+        await asyncio.sleep(0.2)
+        return FakeSpotifyResponse({'access_token': f'fresh{self.refreshes}', 'expires_in': 3600})
+
+
+@patch('main.tokens.client_credentials_headers', return_value={})
+class TokenRefreshTest(TransactionTestCase):
+    def setUp(self):
+        """
+        Creates a linked user whose access token has expired.
+        """
+        self.user = User.objects.create_user(username='tokenuser', password='tokenpass',
+                                             spotify_access_token='old', spotify_refresh_token='refresh',
+                                             spotify_token_expires_at=timezone.now() - timedelta(minutes=1))
+        self.accounts = FakeAccountsClient()
+
+    def test_token_expiring(self, mock_headers):
+        """
+        Tests that tokens without an expiry or close to it are due for a refresh.
+        """
+        self.assertTrue(token_expiring(self.user))
+        self.user.spotify_token_expires_at = timezone.now() + timedelta(seconds=30)
+        self.assertTrue(token_expiring(self.user, margin=60))
+        self.user.spotify_token_expires_at = timezone.now() + timedelta(hours=1)
+        self.assertFalse(token_expiring(self.user, margin=60))
+        self.user.spotify_token_expires_at = None
+        self.assertTrue(token_expiring(self.user))
+
+    def test_refresh_locks_do_not_grow_with_users(self, mock_headers):
+        """
+        Tests that every user maps onto the same fixed set of refresh locks, always the same one per user.
+        """
+        self.assertEqual(len({id(_user_lock(user_id)) for user_id in range(10000)}), LOCK_STRIPES)
+        self.assertIs(_user_lock(42), _user_lock(42))
+
+        async def async_locks():
+            locks = {id(_async_user_lock(user_id)) for user_id in range(10000)}
+            return locks, _async_user_lock(42) is _async_user_lock(42)
+
+        locks, same = async_to_sync(async_locks)()
+        self.assertEqual((len(locks), same), (LOCK_STRIPES, True))
+
+    def test_valid_token_is_not_refreshed(self, mock_headers):
+        """
+        Tests that a token far from expiry is used as-is without contacting Spotify.
+        """
+        self.user.spotify_token_expires_at = timezone.now() + timedelta(hours=1)
+        with patch('main.tokens.get_client', return_value=self.accounts):
+            self.assertEqual(get_access_token(self.user), 'old')
+        self.assertEqual(self.accounts.refreshes, 0)
+
+    def test_refresh_stores_new_token_and_expiry(self, mock_headers):
+        """
+        Tests that refreshing saves the new token and its expiry.
+        """
+        with patch('main.tokens.get_client', return_value=self.accounts):
+            self.assertEqual(get_access_token(self.user), 'fresh1')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.spotify_access_token, 'fresh1')
+        self.assertEqual(self.user.spotify_refresh_token, 'refresh')
+        self.assertFalse(token_expiring(self.user))
+
+    def test_concurrent_requests_refresh_once(self, mock_headers):
+        """
+        Tests that concurrent requests for the same user share a single refresh.
+        """
+        tokens = []
+
+        def request():
+            tokens.append(get_access_token(User.objects.get(pk=self.user.pk)))
+            connection.close()
+
+        with patch('main.tokens.get_client', return_value=self.accounts):
+            threads = [threading.Thread(target=request) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(self.accounts.refreshes, 1)
+        self.assertEqual(tokens, ['fresh1'] * 5)
+
+    def test_async_refresh_leaves_sync_thread_free(self, mock_headers):
+        """
+        Tests that concurrent async requests share one refresh that does not hold the shared sync thread.
+        """
+        accounts = FakeAsyncAccountsClient()
+
+        async def requests_and_orm_call():
+            users = [await User.objects.aget(pk=self.user.pk) for _ in range(3)]
+            refreshes = [asyncio.ensure_future(aget_access_token(user)) for user in users]
+            await asyncio.sleep(0.05)
+            started = time.monotonic()
+            await User.objects.filter(pk=self.user.pk).aexists()  # Runs on the shared sync thread
+            orm_wait = time.monotonic() - started
+            return await asyncio.gather(*refreshes), orm_wait
+
+        with patch('main.tokens.get_async_client', return_value=accounts):
+            tokens, orm_wait = async_to_sync(requests_and_orm_call)()
+        self.assertEqual(tokens, ['fresh1'] * 3)
+        self.assertEqual(accounts.refreshes, 1)
+        self.assertLess(orm_wait, 0.1)
+
+
+class SpotifyProfileTest(TestCase):
+    def setUp(self):
+        """
+        Creates a linked user without a cached profile.
+        """
+        self.user = User.objects.create_user(username='profileuser', password='profilepass',
+                                             spotify_access_token='token',
+                                             spotify_token_expires_at=timezone.now() + timedelta(hours=1))
+        cache.clear()
+
+    def test_store_profile(self):
+        """
+        Tests that a /v1/me payload is cached and the display name kept in sync.
+        """
+        profile = store_profile(self.user, {'display_name': 'Profile User', 'country': 'US', 'product': 'premium',
+                                            'images': [{'url': 'http://img/me'}]})
+        self.assertEqual((profile.country, profile.product, profile.image_url), ('US', 'premium', 'http://img/me'))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.current_display_name, 'Profile User')
+
+    def test_stale_profile_is_served_and_refreshed_in_background(self):
+        """
+        Tests that a stale profile is still returned while a single refresh is queued.
+        """
+        store_profile(self.user, {'display_name': 'Old Name'})
+        SpotifyProfile.objects.update(fetched_at=timezone.now() - timedelta(days=2))
+        with patch('main.profiles._executor.submit') as mock_submit:
+            self.assertEqual(display_name_for(self.user), 'Old Name')
+            display_name_for(self.user)
+        mock_submit.assert_called_once_with(refresh_profile, self.user.pk)
+
+    def test_fresh_profile_is_not_refreshed(self):
+        """
+        Tests that a profile within its TTL does not trigger a refresh.
+        """
+        store_profile(self.user, {'display_name': 'Fresh Name'})
+        with patch('main.profiles._executor.submit') as mock_submit:
+            self.assertEqual(display_name_for(self.user), 'Fresh Name')
+        mock_submit.assert_not_called()
+
+    def test_refresh_profile(self):
+        """
+        Tests that the background refresh stores the latest /v1/me payload.
+        """
+        with patch('main.profiles.get_client', return_value=FakeSpotifyClient()), \
+                patch('main.profiles.close_old_connections'):
+            refresh_profile(self.user.pk)
+        self.assertEqual(SpotifyProfile.objects.get(user=self.user).display_name, 'Fake User')
+
+
+    @patch('main.views.client_credentials_headers', return_value={})
+    def test_callback_keeps_wrap_counters_moved_meanwhile(self, mock_headers):
+        """
+        Tests that linking Spotify saves only the tokens and display name, not a stale wrap count.
+        """
+        user = self.user
+
+        class LinkingClient:
+            async def request_token(self, data, headers=None):
+                return FakeSpotifyResponse({'access_token': 'linked', 'refresh_token': 'refresh', 'expires_in': 3600})
+
+            async def me(self, access_token):
+                # A wrap finishes while Spotify is answering
+                await Wraps.objects.acreate(user=user, document={}, creation_date=timezone.now())
+                return FakeSpotifyResponse({'display_name': 'Linked User'})
+
+        self.client.post(reverse('user_login'), {'username': 'profileuser', 'password': 'profilepass'})
+        with patch('main.views.get_async_client', return_value=LinkingClient()):
+            self.client.get(reverse('spotify_callback'), {'code': 'code'})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.spotify_access_token, 'linked')
+        self.assertEqual(self.user.current_display_name, 'Linked User')
+        self.assertEqual(self.user.wrap_count, 1)
+
+class AsyncSpotifyClientTest(SimpleTestCase):
+    def test_pool_is_reused_within_event_loop(self):
+        """
+        Tests that calls on the same event loop share one httpx connection pool.
+        """
+        client = AsyncSpotifyClient()
+
+        async def pools():
+            return client.http, client.http
+
+        first, second = async_to_sync(pools)()
+        self.assertIs(first, second)
+
+    def test_top_items_goes_through_scheduler(self):
+        """
+        Tests that async requests are rate limited by the shared scheduler.
+        """
+        scheduler = RateLimitScheduler(rate=1, burst=1, max_queue=0)
+        client = AsyncSpotifyClient(scheduler=scheduler)
+
+        async def request(method, url, **kwargs):
+            return FakeSpotifyResponse({'items': []})
+
+        async def two_calls():
+            with patch.object(client.http, 'request', side_effect=request):
+                await client.top_items('abc', 'tracks', 5, 'short_term')
+                await client.top_items('abc', 'tracks', 5, 'short_term')
+
+        with self.assertRaises(SpotifyUnavailable):
+            async_to_sync(two_calls)()
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def test_opens_after_threshold(self):
+        """
+        Tests that consecutive failures open the breaker and later calls fail fast.
+        """
+        breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=60)
+        breaker.record_failure()
+        breaker.allow()
+        breaker.record_failure()
+        with self.assertRaises(CircuitOpen):
+            breaker.allow()
+        self.assertEqual(breaker.stats()['rejected'], 1)
+
+    def test_success_resets_failure_count(self):
+        """
+        Tests that only consecutive failures count towards the threshold.
+        """
+        breaker = CircuitBreaker('test', failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.stats()['state'], 'closed')
+
+    def test_half_open_probe(self):
+        """
+        Tests that after the recovery timeout one probe is let through and its result decides the state.
+        """
+        breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        breaker.allow()
+        self.assertEqual(breaker.stats()['state'], 'half_open')
+        with self.assertRaises(CircuitOpen):
+            breaker.allow()  # Only one probe at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.stats()['state'], 'open')
+
+        time.sleep(0.02)
+        breaker.allow()
+        breaker.record_success()
+        self.assertEqual(breaker.stats()['state'], 'closed')
+
+    def test_client_fails_fast_when_spotify_is_down(self):
+        """
+        Tests that server errors open the client's breaker and further calls raise SpotifyUnavailable unsent.
+        """
+        client = SpotifyClient(breaker=CircuitBreaker('spotify', failure_threshold=2, recovery_timeout=60))
+        with patch.object(client.session, 'request', return_value=FakeSpotifyResponse({}, 503)) as mock_request:
+            for _ in range(2):
+                self.assertEqual(client.top_items('abc', 'tracks', 5, 'short_term').status_code, 503)
+            with self.assertRaises(SpotifyUnavailable):
+                client.top_items('abc', 'tracks', 5, 'short_term')
+        self.assertEqual(mock_request.call_count, 2)
+
+    def test_client_maps_timeouts(self):
+        """
+        Tests that a timed-out request counts as a failure and surfaces as SpotifyUnavailable.
+        """
+        breaker = CircuitBreaker('spotify', failure_threshold=5)
+        client = SpotifyClient(breaker=breaker)
+        with patch.object(client.session, 'request', side_effect=requests.Timeout):
+            with self.assertRaises(SpotifyUnavailable):
+                client.top_items('abc', 'tracks', 5, 'short_term')
+        self.assertEqual(breaker.stats()['consecutive_failures'], 1)
+
+    def test_cancelled_probe_releases_breaker(self):
+        """
+        Tests that a half-open probe cancelled mid-request frees its slot without counting as a failure.
+        """
+        breaker = CircuitBreaker('spotify', failure_threshold=1, recovery_timeout=0.01)
+        client = AsyncSpotifyClient(breaker=breaker)
+        breaker.record_failure()
+        time.sleep(0.02)
+
+        async def hang(method, url, **kwargs):
+            await asyncio.Event().wait()  # An upstream that never replies
+
+        async def cancel_probe():
+            with patch.object(client.http, 'request', side_effect=hang):
+                probe = asyncio.ensure_future(client.top_items('abc', 'tracks', 5, 'short_term'))
+                await asyncio.sleep(0.01)
+                probe.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await probe
+
+        async_to_sync(cancel_probe)()
+        stats = breaker.stats()
+        self.assertEqual(stats['state'], 'half_open')
+        self.assertEqual(stats['consecutive_failures'], 1)
+        self.assertEqual(stats['total_failures'], 1)
+        breaker.allow()  # The next probe is admitted
+
+    def test_cancelled_requests_do_not_open_breaker(self):
+        """
+        Tests that cancelled calls on a closed breaker never add up to opening it.
+        """
+        breaker = CircuitBreaker('spotify', failure_threshold=2)
+        client = SpotifyClient(breaker=breaker)
+        with patch.object(client.session, 'request', side_effect=KeyboardInterrupt):
+            for _ in range(3):
+                with self.assertRaises(KeyboardInterrupt):
+                    client.top_items('abc', 'tracks', 5, 'short_term')
+        self.assertEqual(breaker.stats()['state'], 'closed')
+        self.assertEqual(breaker.stats()['total_failures'], 0)
+
+    def test_cancelled_llm_probe_releases_breaker(self):
+        """
+        Tests that a cancelled LLM completion frees its probe slot without counting as a failure.
+        """
+        breaker = CircuitBreaker('llm', failure_threshold=1, recovery_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        with patch('main.descriptions.get_breaker', return_value=breaker), patch('main.descriptions.get_provider') as mock_provider:
+            mock_provider.return_value.complete.side_effect = asyncio.CancelledError
+            with self.assertRaises(asyncio.CancelledError):
+                async_to_sync(llama_description)({})
+        self.assertEqual(breaker.stats()['state'], 'half_open')
+        self.assertEqual(breaker.stats()['total_failures'], 1)
+        breaker.allow()
+
+    def test_llama_description_skipped_while_open(self):
+        """
+        Tests that the AI description is skipped without calling the LLM while its breaker is open.
+        """
+        breaker = CircuitBreaker('llm', failure_threshold=1, recovery_timeout=60)
+        breaker.record_failure()
+        with patch('main.descriptions.get_breaker', return_value=breaker), patch('main.descriptions.get_provider') as mock_provider:
+            self.assertEqual(async_to_sync(llama_description)({}), '')
+        mock_provider.assert_not_called()
+
+
+def read_stream(response):
+    if not response.is_async:
+        return b''.join(response.streaming_content).decode()
+
+    async def collect():
+        return b''.join([chunk async for chunk in response.streaming_content])
+    return async_to_sync(collect)().decode()
+
+
+class WrapDescriptionTest(TestCase):
+    def setUp(self):
+        """
+        Creates a logged-in user with a wrap whose description is still pending.
+        """
+        self.user = User.objects.create_user(username='astro', password='astropass')
+        self.client.post(reverse('user_login'), {'username': 'astro', 'password': 'astropass'})
+        self.wrap = Wraps.objects.create(user=self.user, term='short_term', document={'top_genres': []},
+                                         description_status=Wraps.DESCRIPTION_PENDING)
+        self.slug = self.wrap.slug
+        cache.delete(f'wrap:description:{self.wrap.pk}')
+
+    def test_generate_description_writes_wrap(self):
+        """
+        Tests that the background job stores the description in the wrap and marks it ready.
+        """
+        with patch('main.descriptions.llama_description', return_value='Wears space boots.'), \
+                patch('main.descriptions.close_old_connections'):
+            async_to_sync(generate_description)(self.wrap.pk, {'top_genres': []})
+        self.wrap.refresh_from_db()
+        self.assertEqual(self.wrap.description_status, Wraps.DESCRIPTION_READY)
+        self.assertEqual(self.wrap.document['llama_description'], 'Wears space boots.')
+
+    def test_empty_description_marks_failed(self):
+        """
+        Tests that a description the LLM could not produce is marked failed instead of left pending.
+        """
+        with patch('main.descriptions.close_old_connections'):
+            save_description(self.wrap.pk, '')
+        self.wrap.refresh_from_db()
+        self.assertEqual(self.wrap.description_status, Wraps.DESCRIPTION_FAILED)
+
+    def test_schedule_is_single_flight(self):
+        """
+        Tests that a wrap's description is only queued again once the running job's lease is gone.
+        """
+        with patch('main.descriptions.asyncio.run_coroutine_threadsafe') as mock_run:
+            self.assertTrue(schedule_description(self.wrap.pk, {}))
+            self.assertFalse(schedule_description(self.wrap.pk, {}))
+        self.assertEqual(mock_run.call_count, 1)
+        mock_run.call_args.args[0].close()
+
+    def test_poll_reports_status(self):
+        """
+        Tests that the poll endpoint reports a pending description and then the finished one.
+        """
+        cache.add(f'wrap:description:{self.wrap.pk}', 1)  # A job is already running
+        response = self.client.get(reverse('wrap-description', args=[self.slug]))
+        self.assertEqual(response.json(), {'status': 'pending', 'description': ''})
+
+        with patch('main.descriptions.close_old_connections'):
+            save_description(self.wrap.pk, 'Wears space boots.')
+        response = self.client.get(reverse('wrap-description', args=[self.slug]))
+        self.assertEqual(response.json(), {'status': 'ready', 'description': 'Wears space boots.'})
+
+    def test_stream_sends_ready_description(self):
+        """
+        Tests that streaming a finished description sends it whole, followed by a done event.
+        """
+        with patch('main.descriptions.close_old_connections'):
+            save_description(self.wrap.pk, 'Wears space boots.')
+        response = self.client.get(reverse('stream-description', args=[self.slug]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = read_stream(response)
+        self.assertEqual(body, 'data: "Wears space boots."\n\nevent: done\ndata: {"status": "ready"}\n\n')
+
+    def test_stream_forwards_partial_text(self):
+        """
+        Tests that text is forwarded as the background job produces it, then completed from the saved wrap.
+        """
+        cache.add(f'wrap:description:{self.wrap.pk}', 1)  # A job is running
+        cache.set(f'wrap:description:{self.wrap.pk}:partial', 'Wears ')
+
+        def finish_job(delay):
+            save_description(self.wrap.pk, 'Wears space boots.')
+
+        with patch('main.views.time.sleep', side_effect=finish_job), \
+                patch('main.descriptions.close_old_connections'):
+            response = self.client.get(reverse('stream-description', args=[self.slug]))
+            body = read_stream(response)
+        self.assertEqual(body, 'data: "Wears "\n\ndata: "space boots."\n\nevent: done\ndata: {"status": "ready"}\n\n')
+
+    def test_stream_sends_chunks_incrementally(self):
+        """
+        Tests that under WSGI each piece of text is sent as soon as it is generated, not when the stream ends.
+        """
+        cache.add(f'wrap:description:{self.wrap.pk}', 1)  # A job is running
+        cache.set(f'wrap:description:{self.wrap.pk}:partial', 'Wears ')
+        response = self.client.get(reverse('stream-description', args=[self.slug]))
+        self.assertFalse(response.is_async)
+        chunks = iter(response.streaming_content)
+        self.assertEqual(next(chunks), b'data: "Wears "\n\n')
+
+        cache.set(f'wrap:description:{self.wrap.pk}:partial', 'Wears space')
+        self.assertEqual(next(chunks), b'data: "space"\n\n')
+
+        with patch('main.descriptions.close_old_connections'):
+            save_description(self.wrap.pk, 'Wears space boots.')
+        self.assertEqual(b''.join(chunks), b'data: " boots."\n\nevent: done\ndata: {"status": "ready"}\n\n')
+
+    def test_stream_sends_chunks_incrementally_under_asgi(self):
+        """
+        Tests that under ASGI the stream is async and forwards each piece of text as it is generated.
+        """
+        cache.add(f'wrap:description:{self.wrap.pk}', 1)  # A job is running
+        cache.set(f'wrap:description:{self.wrap.pk}:partial', 'Wears ')
+
+        async def stream():
+            await self.async_client.aforce_login(self.user)
+            response = await self.async_client.get(reverse('stream-description', args=[self.slug]))
+            self.assertTrue(response.is_async)
+            chunks = aiter(response.streaming_content)
+            received = [await anext(chunks)]
+            await cache.aset(f'wrap:description:{self.wrap.pk}:partial', 'Wears space')
+            received.append(await anext(chunks))
+            await sync_to_async(save_description)(self.wrap.pk, 'Wears space boots.')
+            return received + [chunk async for chunk in chunks]
+
+        with patch('main.descriptions.close_old_connections'):
+            received = async_to_sync(stream)()
+        self.assertEqual(received, [b'data: "Wears "\n\n', b'data: "space"\n\n', b'data: " boots."\n\n',
+                                    b'event: done\ndata: {"status": "ready"}\n\n'])
+
+    def test_poll_requeues_orphaned_job(self):
+        """
+        Tests that polling a pending description whose job has gone away queues it again.
+        """
+        with patch('main.views.schedule_description') as mock_schedule:
+            self.client.get(reverse('wrap-description', args=[self.slug]))
+        mock_schedule.assert_called_once_with(self.wrap.pk, {'top_genres': []})
+
+    def test_get_wrapped_serves_stored_json(self):
+        """
+        Tests that a saved wrap is served with its stored data, status and date.
+        """
+        with patch('main.descriptions.close_old_connections'):
+            save_description(self.wrap.pk, 'Wears "space" boots.')
+        session = self.client.session
+        session['username'] = 'astro'
+        session.save()
+        self.wrap.refresh_from_db()
+        response = self.client.get(reverse('get-wrapped', args=[self.slug]))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json(), {
+            'data': {'top_genres': [], 'llama_description': 'Wears "space" boots.',
+                     'llama_description_version': PROMPT_VERSION},
+            'slug': self.slug,
+            'dt': self.wrap.creation_date.isoformat(),
+            'description_status': 'ready',
+        })
+
+    def test_get_wrapped_sends_compressed_body(self):
+        """
+        Tests that clients accepting gzip get a gzip-compressed body with a Content-Encoding header.
+        """
+        response = self.client.get(reverse('get-wrapped', args=[self.slug]), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content))['data'], {'top_genres': []})
+
+    def test_get_wrapped_honours_accept_encoding_q_values(self):
+        """
+        Tests that only an explicit gzip coding with a non-zero q-value gets a compressed body.
+        """
+        for header, compressed in [('gzip;q=0', False), ('deflate, GZIP; q=0.000', False), ('x-gzip', False),
+                                   ('br, gzip;q=0.5', True), ('deflate, gzip ; q=1', True)]:
+            with self.subTest(header=header):
+                response = self.client.get(reverse('get-wrapped', args=[self.slug]), HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(response.has_header('Content-Encoding'), compressed)
+                content = gzip.decompress(response.content) if compressed else response.content
+                self.assertEqual(json.loads(content)['data'], {'top_genres': []})
+
+    def test_wrap_is_stored_compressed_and_served_from_catalog(self):
+        """
+        Tests that a wrap stores only its compressed catalog IDs and is served with the catalog's current entries.
+        """
+        data = catalog_wrap(['t1'], ['t1'])
+        store_catalog(data)
+        self.wrap.document = compact_wrap(data)
+        self.wrap.save()
+        self.wrap.refresh_from_db()
+        stored = json.loads(gzip.decompress(self.wrap.payload))
+        self.assertEqual((stored['top_tracks'], stored['top_artists']), (['t1'], ['a-t1']))
+
+        Track.objects.filter(spotify_id='t1').update(popularity=99)
+        response = self.client.get(reverse('get-wrapped', args=[self.slug]))
+        self.assertEqual(response.json()['data']['top_tracks'][0]['popularity'], 99)
+
+    def test_timestamp_urls_redirect_to_slug(self):
+        """
+        Tests that URLs identifying the wrap by its creation timestamp redirect to its slug URLs.
+        """
+        dt = self.wrap.creation_date.isoformat()
+        response = self.client.get(f'/wrapper/{dt}/')
+        self.assertRedirects(response, reverse('wrapped', args=[self.slug]), status_code=301)
+        response = self.client.get(f'/api/wrap-description/{dt}/')
+        self.assertRedirects(response, reverse('wrap-description', args=[self.slug]), status_code=301)
+
+        response = self.client.get('/wrapper/2001-01-01T00:00:00+00:00/')
+        self.assertEqual(response.status_code, 404)
+
+
+def wrap_data(artist_ids, genres, term='short_term'):
+    return {'time_range': term, 'top_artists': [{'artist_id': artist_id} for artist_id in artist_ids],
+            'top_genres': genres}
+
+
+class DescriptionCacheTest(TestCase):
+    def setUp(self):
+        """
+        Clears the hit/miss counters kept in the default cache.
+        """
+        cache.clear()
+
+    def test_fingerprint_ignores_order(self):
+        """
+        Tests that the same artists and genres in a different order share a fingerprint.
+        """
+        self.assertEqual(taste_features(wrap_data(['a', 'b'], ['pop', 'rock'])),
+                         taste_features(wrap_data(['b', 'a'], ['rock', 'Pop'])))
+
+    def test_exact_hit_reports_seconds_saved(self):
+        """
+        Tests that a wrap with the same taste reuses the description and counts the LLM time it saved.
+        """
+        descriptions = DescriptionCache()
+        self.assertIsNone(descriptions.get(wrap_data(['a', 'b'], ['pop'])))
+        descriptions.set(wrap_data(['a', 'b'], ['pop']), 'Wears glitter.', 4.5)
+        self.assertEqual(descriptions.get(wrap_data(['b', 'a'], ['pop'])), 'Wears glitter.')
+        self.assertIsNone(descriptions.get(wrap_data(['a', 'b'], ['pop'], term='long_term')))
+        stats = descriptions.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+        self.assertEqual(stats['llm_seconds_saved'], 4.5)
+        self.assertEqual(CachedDescription.objects.get().hits, 1)
+
+    def test_near_duplicate_threshold(self):
+        """
+        Tests that a similar taste is only served when it meets the similarity threshold.
+        """
+        stored = wrap_data(['a', 'b', 'c', 'd'], ['pop'])
+        similar = wrap_data(['a', 'b', 'c', 'e'], ['pop'])  # Jaccard 4/6
+        DescriptionCache().set(stored, 'Wears glitter.', 1.0)
+        self.assertIsNone(DescriptionCache(similarity=0.8).get(similar))
+        self.assertEqual(DescriptionCache(similarity=0.6).get(similar), 'Wears glitter.')
+        self.assertEqual(DescriptionCache().stats()['near_hits'], 1)
+
+    def test_older_prompt_version_not_served(self):
+        """
+        Tests that descriptions written with an older prompt are neither served nor matched as near-duplicates.
+        """
+        data = wrap_data(['a', 'b'], ['pop'])
+        DescriptionCache().set(data, 'Old text.', 1.0)
+        CachedDescription.objects.update(prompt_version=PROMPT_VERSION - 1)
+        self.assertIsNone(DescriptionCache().get(data))
+        self.assertIsNone(DescriptionCache(similarity=0.5).get(wrap_data(['a', 'c'], ['pop'])))
+
+        DescriptionCache().set(data, 'New text.', 1.0)
+        self.assertEqual(DescriptionCache().get(data), 'New text.')
+        self.assertEqual(CachedDescription.objects.get().prompt_version, PROMPT_VERSION)
+
+    def test_least_recently_used_evicted(self):
+        """
+        Tests that the least recently used description is evicted past the entry cap.
+        """
+        descriptions = DescriptionCache(max_entries=2)
+        descriptions.set(wrap_data(['a'], []), 'A', 1.0)
+        descriptions.set(wrap_data(['b'], []), 'B', 1.0)
+        descriptions.get(wrap_data(['a'], []))
+        descriptions.set(wrap_data(['c'], []), 'C', 1.0)
+        self.assertEqual(sorted(CachedDescription.objects.values_list('description', flat=True)), ['A', 'C'])
+
+    def test_generate_description_skips_llm_on_hit(self):
+        """
+        Tests that the background job serves a cached description without calling the LLM.
+        """
+        user = User.objects.create_user(username='twin', password='twinpass')
+        data = wrap_data(['a'], ['pop'])
+        wrap = Wraps.objects.create(user=user, document=data, description_status=Wraps.DESCRIPTION_PENDING)
+        DescriptionCache().set(data, 'Wears glitter.', 3.0)
+        with patch('main.descriptions.llama_description') as mock_llama, \
+                patch('main.descriptions.close_old_connections'):
+            async_to_sync(generate_description)(wrap.pk, data)
+        mock_llama.assert_not_called()
+        wrap.refresh_from_db()
+        self.assertEqual(wrap.document['llama_description'], 'Wears glitter.')
+
+
+class DescriptionPromptTest(SimpleTestCase):
+    def setUp(self):
+        """
+        Builds a wrap's data the way make_wrapped does.
+        """
+        self.data = {
+            'time_range': 'short_term', 'limit': 5,
+            'top_tracks': [{'track_name': f'Track {n}', 'track_id': f'id{n}', 'album_name': 'Album', 'album_id': 'Album',
+                            'artist_name': f'Artist {n}', 'artist_id': f'a{n}', 'popularity': 50,
+                            'cover_image': 'https://i.scdn.co/image/cover', 'preview': 'https://p.scdn.co/mp3'}
+                           for n in range(5)],
+            'top_artists': [{'artist_name': f'Artist {n}', 'artist_id': f'a{n}', 'popularity': 50,
+                             'artist_image': 'https://i.scdn.co/image/artist'} for n in range(5)],
+            'top_genres': ['jazz', 'rock', 'pop'],
+        }
+        cache.clear()
+
+    def test_prompt_keeps_only_names(self):
+        """
+        Tests that the prompt carries names and genres but no IDs, URLs or popularity numbers.
+        """
+        content = build_description_prompt(self.data, max_input_tokens=1000).messages[0]['content']
+        self.assertIn('Top artists: Artist 0, Artist 1', content)
+        self.assertIn('Top genres: pop, rock, jazz', content)
+        self.assertIn('Track 0 by Artist 0', content)
+        self.assertIn('the last 4 weeks', content)
+        self.assertNotIn('https://', content)
+        self.assertNotIn('a0', content)
+        self.assertLess(estimate_tokens(content), estimate_tokens(f'{self.data}'))
+
+    def test_budget_trims_tracks_first(self):
+        """
+        Tests that an over-budget prompt drops the least played tracks before any artist.
+        """
+        full = build_description_prompt(self.data, max_input_tokens=1000)
+        trimmed = build_description_prompt(self.data, max_input_tokens=full.input_tokens - 10, max_output_tokens=60)
+        content = trimmed.messages[0]['content']
+        self.assertLessEqual(trimmed.input_tokens, full.input_tokens - 10)
+        self.assertNotIn('Track 4', content)
+        self.assertIn('Artist 4', content)
+        self.assertEqual(trimmed.max_output_tokens, 60)
+
+    def test_record_usage_prefers_reported_tokens(self):
+        """
+        Tests that usage reported by the LLM is totalled, and estimated when it is missing.
+        """
+        prompt = build_description_prompt(self.data)
+
+        class Usage:
+            prompt_tokens = 150
+            completion_tokens = 30
+
+        self.assertFalse(record_usage(prompt, 'Wears space boots.', Usage())['estimated'])
+        self.assertTrue(record_usage(prompt, 'Wears space boots.')['estimated'])
+        stats = usage_stats()
+        self.assertEqual(stats['calls'], 2)
+        self.assertEqual(stats['input_tokens'], 150 + prompt.input_tokens)
+        self.assertEqual(stats['output_tokens'], 30 + estimate_tokens('Wears space boots.'))
+
+
+class FailingProvider(LLMProvider):
+    async def _complete(self, prompt, on_progress):
+        raise OpenAIError('The LLM is down')
+
+
+class LLMProviderTest(SimpleTestCase):
+    def setUp(self):
+        """
+        Builds a prompt for a small wrap.
+        """
+        self.prompt = build_description_prompt({'time_range': 'short_term', 'top_genres': ['pop']})
+
+    def test_stub_is_deterministic(self):
+        """
+        Tests that the stub provider streams the same description for the same prompt.
+        """
+        progress = []
+
+        async def on_progress(text):
+            progress.append(text)
+
+        provider = StubProvider()
+        text, usage = async_to_sync(provider.complete)(self.prompt, on_progress)
+        self.assertEqual(async_to_sync(provider.complete)(self.prompt)[0], text)
+        self.assertIn(text, StubProvider.DESCRIPTIONS)
+        self.assertEqual(progress[-1], text)
+        self.assertGreater(len(progress), 1)
+        self.assertEqual(usage.prompt_tokens, self.prompt.input_tokens)
+
+    def test_concurrency_is_capped(self):
+        """
+        Tests that no more than max_concurrency completions run at once and the rest wait.
+        """
+        provider = StubProvider(max_concurrency=2, token_latency=0.001)
+
+        async def burst():
+            return await asyncio.gather(*(provider.complete(self.prompt) for _ in range(6)))
+
+        self.assertEqual(len(async_to_sync(burst)()), 6)
+        stats = provider.stats()
+        self.assertEqual(stats['max_in_flight'], 2)
+        self.assertEqual((stats['in_flight'], stats['waiting'], stats['completions']), (0, 0, 6))
+
+    def test_build_provider_from_dotted_path(self):
+        """
+        Tests that a provider can be plugged in by its dotted path.
+        """
+        self.assertIsInstance(build_provider('main.llm.StubProvider'), StubProvider)
+
+    def test_incomplete_provider_cannot_be_built(self):
+        """
+        Tests that a provider without _complete fails when it is built rather than on its first completion.
+        """
+        class IncompleteProvider(LLMProvider):
+            pass
+
+        with self.assertRaises(TypeError):
+            IncompleteProvider()
+
+    def test_llama_description_uses_provider(self):
+        """
+        Tests that the description comes from the configured provider and provider errors open the breaker.
+        """
+        breaker = CircuitBreaker('llm', failure_threshold=1, recovery_timeout=60)
+        with patch('main.descriptions.get_breaker', return_value=breaker), \
+                patch('main.descriptions.get_provider', return_value=StubProvider()):
+            self.assertIn(async_to_sync(llama_description)({'time_range': 'short_term'}), StubProvider.DESCRIPTIONS)
+        with patch('main.descriptions.get_breaker', return_value=breaker), \
+                patch('main.descriptions.get_provider', return_value=FailingProvider()):
+            self.assertEqual(async_to_sync(llama_description)({'time_range': 'short_term'}), '')
+        self.assertEqual(breaker.stats()['state'], 'open')
+
+
+class BackfillDescriptionsTest(TransactionTestCase):
+    def setUp(self):
+        """
+        Creates wraps with a missing, a failed, a stale and an up-to-date description.
+        """
+        cache.clear()
+        data = {'time_range': 'short_term', 'top_artists': [], 'top_tracks': [], 'top_genres': ['pop']}
+        user = User.objects.create_user(username='fan', password='fanpass')
+        self.missing = Wraps.objects.create(user=user, document=data)
+        self.failed = Wraps.objects.create(user=user, document={**data, 'top_genres': ['jazz']},
+                                           description_status=Wraps.DESCRIPTION_FAILED)
+        self.stale = Wraps.objects.create(user=user, document={
+            **data, 'top_genres': ['rock'], 'llama_description': 'Old.'})
+        self.current = Wraps.objects.create(user=user, document={
+            **data, 'top_genres': ['metal'], 'llama_description': 'New.', 'llama_description_version': PROMPT_VERSION})
+        self.checkpoint = tempfile.NamedTemporaryFile(suffix='.json', delete=False).name
+        self.addCleanup(os.remove, self.checkpoint)
+
+    def backfill(self, *args):
+        out = io.StringIO()
+        with patch('main.descriptions.get_provider', return_value=StubProvider()), \
+                patch('main.descriptions.close_old_connections'):
+            call_command('backfill_descriptions', '--checkpoint', self.checkpoint, '--restart', '--chunk-size', '2',
+                         *args, stdout=out)
+        return out.getvalue()
+
+    def description(self, wrap):
+        wrap.refresh_from_db()
+        return wrap.document.get('llama_description')
+
+    def test_backfills_missing_and_failed(self):
+        """
+        Tests that missing and failed descriptions are regenerated and good ones are left alone.
+        """
+        self.backfill()
+        self.assertIn(self.description(self.missing), StubProvider.DESCRIPTIONS)
+        self.assertIn(self.description(self.failed), StubProvider.DESCRIPTIONS)
+        self.assertEqual(self.description(self.stale), 'Old.')
+        self.assertEqual(self.description(self.current), 'New.')
+        self.assertEqual(json.loads(open(self.checkpoint).read())['last_pk'], self.current.pk)
+
+    def test_orphaned_pending_descriptions(self):
+        """
+        Tests that a pending description is backfilled once no job holds its lease, and left alone while one does.
+        """
+        Wraps.objects.filter(pk__in=[self.missing.pk, self.failed.pk]).update(
+            description_status=Wraps.DESCRIPTION_PENDING)
+        cache.add(f'wrap:description:{self.failed.pk}', 1)  # Its job is still running
+        self.backfill()
+        self.assertIn(self.description(self.missing), StubProvider.DESCRIPTIONS)
+        self.assertEqual(self.missing.description_status, Wraps.DESCRIPTION_READY)
+        self.assertIsNone(self.description(self.failed))
+        self.assertEqual(self.failed.description_status, Wraps.DESCRIPTION_PENDING)
+
+    def test_stale_descriptions(self):
+        """
+        Tests that --stale also rewrites descriptions from an older prompt version.
+        """
+        self.backfill('--stale')
+        self.assertIn(self.description(self.stale), StubProvider.DESCRIPTIONS)
+        self.assertEqual(self.description(self.current), 'New.')
+
+    def test_resumes_from_checkpoint(self):
+        """
+        Tests that a rerun skips the wraps covered by the checkpoint.
+        """
+        with open(self.checkpoint, 'w') as checkpoint:
+            json.dump({'last_pk': self.failed.pk}, checkpoint)
+        out = io.StringIO()
+        with patch('main.descriptions.get_provider', return_value=StubProvider()), \
+                patch('main.descriptions.close_old_connections'):
+            call_command('backfill_descriptions', '--checkpoint', self.checkpoint, '--stale', stdout=out)
+        self.assertIn(f'Resuming after wrap {self.failed.pk}', out.getvalue())
+        self.assertIsNone(self.description(self.missing))
+        self.assertIn(self.description(self.stale), StubProvider.DESCRIPTIONS)
+
+    def test_failed_descriptions_are_retried(self):
+        """
+        Tests that a description failing mid-scan is tried again once the scan is done, not skipped by the checkpoint.
+        """
+        with patch('main.management.commands.backfill_descriptions.llama_description',
+                   side_effect=['', 'Wears jazz shoes.', 'Wears glitter.']):
+            out = self.backfill()
+        self.assertIn('Retrying 1 failed descriptions', out)
+        self.assertIsNotNone(self.description(self.missing))
+        self.assertIsNotNone(self.description(self.failed))
+        self.assertEqual(json.loads(open(self.checkpoint).read())['retry'], [])
+
+    def test_failures_are_kept_for_the_next_run(self):
+        """
+        Tests that descriptions still failing are recorded in the checkpoint and retried by the next run.
+        """
+        with patch('main.management.commands.backfill_descriptions.llama_description', return_value=''):
+            self.backfill()
+        progress = json.loads(open(self.checkpoint).read())
+        self.assertEqual((progress['last_pk'], progress['retry']), (self.current.pk, [self.missing.pk, self.failed.pk]))
+
+        out = io.StringIO()
+        with patch('main.descriptions.get_provider', return_value=StubProvider()), \
+                patch('main.descriptions.close_old_connections'):
+            call_command('backfill_descriptions', '--checkpoint', self.checkpoint, stdout=out)
+        self.assertIn('Retrying 2 failed descriptions', out.getvalue())
+        self.assertIn(self.description(self.missing), StubProvider.DESCRIPTIONS)
+        self.assertEqual(json.loads(open(self.checkpoint).read())['retry'], [])
+
+    def test_waits_out_open_breaker_before_each_call(self):
+        """
+        Tests that calls wait for an open LLM breaker to reach its next probe instead of failing fast.
+        """
+        breaker = CircuitBreaker('llm', failure_threshold=1, recovery_timeout=0.05)
+        breaker.record_failure()
+        with patch('main.management.commands.backfill_descriptions.get_breaker', return_value=breaker):
+            out = self.backfill()
+        self.assertIn('The LLM is failing; pausing', out)
+        self.assertIn(self.description(self.missing), StubProvider.DESCRIPTIONS)
+
+    def test_token_budget_paces_calls(self):
+        """
+        Tests that calls beyond the tokens-per-minute budget wait for it to refill.
+        """
+        prompt = build_description_prompt(self.missing.document)
+        cost = prompt.input_tokens + prompt.max_output_tokens
+        with patch('main.management.commands.backfill_descriptions.asyncio.sleep') as mock_sleep:
+            self.backfill('--tokens-per-minute', str(cost))
+        self.assertGreater(mock_sleep.call_count, 0)
+        self.assertAlmostEqual(mock_sleep.call_args_list[0].args[0], 60, delta=1)
+
+
+def catalog_wrap(track_ids, artist_ids, image='http://img/a'):
+    return {
+        'time_range': 'short_term',
+        'top_tracks': [{'track_name': f'Track {n}', 'track_id': n, 'album_name': f'Album {n}', 'album_id': f'al-{n}',
+                        'artist_name': f'Artist {n}', 'artist_id': f'a-{n}', 'popularity': 50,
+                        'cover_image': f'http://img/{n}', 'preview': None} for n in track_ids],
+        'top_artists': [{'artist_name': f'Artist {n}', 'artist_id': f'a-{n}', 'popularity': 70, 'artist_image': image}
+                        for n in artist_ids],
+        'top_genres': ['pop', 'indie'],
+    }
+
+
+class CatalogTest(TestCase):
+    def test_round_trip(self):
+        """
+        Tests that a compacted wrap keeps only IDs and hydrates back to the original data.
+        """
+        data = catalog_wrap(['t1', 't2'], ['t2', 't1'])
+        store_catalog(data)
+        compact = compact_wrap(data)
+        self.assertEqual(compact['top_tracks'], ['t1', 't2'])
+        self.assertEqual(compact['top_artists'], ['a-t2', 'a-t1'])
+        with self.assertNumQueries(2):
+            self.assertEqual(hydrate_wrap(compact), data)
+
+    def test_entries_are_shared_and_refreshed(self):
+        """
+        Tests that wraps share catalog rows, and a track credit never blanks a top artist's details.
+        """
+        store_catalog(catalog_wrap(['t1'], ['t1'], image='http://img/old'))
+        store_catalog(catalog_wrap(['t1', 't2'], [], image='http://img/new'))
+        store_catalog(catalog_wrap([], ['t2'], image='http://img/new'))
+        self.assertEqual(Track.objects.count(), 2)
+        self.assertEqual(Artist.objects.get(pk='a-t1').image_url, 'http://img/old')
+        self.assertEqual(Artist.objects.get(pk='a-t2').image_url, 'http://img/new')
+
+    def test_hydrate_keeps_inline_entries(self):
+        """
+        Tests that wraps saved with full entries before the catalog existed are served unchanged.
+        """
+        data = catalog_wrap(['t1'], ['t1'])
+        with self.assertNumQueries(0):
+            self.assertEqual(hydrate_wrap(data), data)
+
+
+
+class WrapMigrationsTest(TransactionTestCase):
+    """
+    Runs the data migrations that rewrote stored wraps against the schema they were written for.
+    """
+
+    def migrate(self, target):
+        """
+        Migrates the test database to a migration of main and returns the models as they were then.
+        """
+        executor = MigrationExecutor(connection)
+        executor.migrate([('main', target)])
+        return executor.loader.project_state([('main', target)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_decode_wrap_json_migration(self):
+        """
+        Tests that the data migration decodes wraps stored as JSON-encoded strings and leaves objects alone.
+        """
+        old_apps = self.migrate('0005_cacheddescription')
+        OldWraps = old_apps.get_model('main', 'Wraps')
+        legacy = OldWraps.objects.create(username='astro', wrap_json=json.dumps({'top_genres': ['pop']}))
+        current = OldWraps.objects.create(username='astro', wrap_json={'top_genres': []})
+
+        OldWraps = self.migrate('0006_decode_wrap_json').get_model('main', 'Wraps')
+        self.assertEqual(OldWraps.objects.get(pk=legacy.pk).wrap_json, {'top_genres': ['pop']})
+        self.assertEqual(OldWraps.objects.get(pk=current.pk).wrap_json, {'top_genres': []})
+
+    def test_build_payloads_migration(self):
+        """
+        Tests that the payload migration builds the body get_wrapped served from the catalog.
+        """
+        old_apps = self.migrate('0010_catalog')
+        user = old_apps.get_model('main', 'User').objects.create(username='astro', password='!',
+                                                                 date_joined=timezone.now())
+        album = old_apps.get_model('main', 'Album').objects.create(spotify_id='al-1', name='Album 1',
+                                                                   image_url='http://img/1')
+        artist = old_apps.get_model('main', 'Artist').objects.create(spotify_id='a-1', name='Artist 1',
+                                                                     image_url='http://img/a', popularity=70)
+        old_apps.get_model('main', 'Track').objects.create(spotify_id='t1', name='Track 1', album=album, artist=artist,
+                                                           popularity=50, preview_url=None)
+        wrap = old_apps.get_model('main', 'Wraps').objects.create(
+            user=user, wrap_json={'top_tracks': ['t1'], 'top_artists': ['a-1'], 'top_genres': ['pop']})
+
+        wrap = self.migrate('0011_wraps_payload').get_model('main', 'Wraps').objects.get(pk=wrap.pk)
+        document = json.loads(gzip.decompress(wrap.payload))
+        self.assertEqual(document['slug'], wrap.slug)
+        self.assertEqual(document['data']['top_tracks'][0]['album_name'], 'Album 1')
+        self.assertEqual(document['data']['top_artists'][0]['artist_name'], 'Artist 1')
+
+    def test_compress_wrap_json_migration(self):
+        """
+        Tests that wraps' data moves into the compressed payload, replacing the hydrated copy, and back again.
+        """
+        old_apps = self.migrate('0013_cacheddescription_prompt_version')
+        user = old_apps.get_model('main', 'User').objects.create(username='astro', password='!',
+                                                                 date_joined=timezone.now())
+        stored = {'top_tracks': ['t1'], 'top_artists': ['a-1'], 'top_genres': ['pop']}
+        wrap = old_apps.get_model('main', 'Wraps').objects.create(
+            user=user, wrap_json=stored, payload=gzip.compress(json.dumps({'data': {'hydrated': True}}).encode()))
+
+        self.migrate('0014_compress_wrap_json')
+        self.assertEqual(Wraps.objects.get(pk=wrap.pk).document, stored)
+
+        wrap = self.migrate('0013_cacheddescription_prompt_version').get_model('main', 'Wraps').objects.get(pk=wrap.pk)
+        self.assertEqual(wrap.wrap_json, stored)
+        self.assertIsNone(wrap.payload)
+
+class SQLiteSetupTest(TestCase):
+    def pragmas(self, db, *names):
+        with db.cursor() as cursor:
+            return [cursor.execute(f'PRAGMA {name}').fetchone()[0] for name in names]
+
+    def test_connection_runs_pragmas(self):
+        """
+        Tests that the test database connection was opened with the configured pragmas.
+        """
+        # synchronous 1 is NORMAL
+        self.assertEqual(self.pragmas(connection, 'busy_timeout', 'synchronous', 'cache_size'), [5000, 1, -20000])
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234, 'cache_size': -4000})
+    def test_pragmas_follow_settings(self):
+        """
+        Tests that the pragmas are read from the SQLITE_PRAGMAS setting when a connection is created.
+        """
+        db = connections.create_connection('default')
+        self.addCleanup(db.close)
+        self.assertEqual(self.pragmas(db, 'busy_timeout', 'cache_size'), [1234, -4000])
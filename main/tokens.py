@@ -0,0 +1,232 @@
+"""
+Spotify access token lifecycle for linked users.
+
+Access tokens are refreshed shortly *before* they expire rather than after Spotify
+rejects them, and refreshes are single-flight per user: concurrent requests for the
+same user wait for the one refresh in progress instead of each posting their own
+``refresh_token`` grant. Within a process this is one of a fixed set of locks picked
+by user; across processes a short lease in the default cache plays the same role
+when the cache is shared.
+
+The async views refresh through :func:`aget_access_token`, which posts the grant with
+the async client and waits on an ``asyncio`` lock, so a slow refresh never occupies
+the shared sync thread the ORM's async calls run on.
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .spotify import client_credentials_headers, get_async_client, get_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_MARGIN = 60
+LEASE_SECONDS = 10
+LEASE_POLL_INTERVAL = 0.1
+
+TOKEN_FIELDS = ['spotify_access_token', 'spotify_refresh_token', 'spotify_token_expires_at']
+
+# Refreshes take one of a fixed set of locks picked by user, so the locks never grow with
+# the number of users; two users sharing a lock only queue behind each other
+LOCK_STRIPES = 64
+
+_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+_locks_lock = threading.Lock()
+# asyncio locks are bound to the loop they are first used on, so each loop keeps its own
+_async_locks = weakref.WeakKeyDictionary()
+
+
+def _user_lock(user_id):
+	return _locks[hash(user_id) % LOCK_STRIPES]
+
+
+def _async_user_lock(user_id):
+	loop = asyncio.get_running_loop()
+	with _locks_lock:
+		locks = _async_locks.get(loop)
+		if locks is None:
+			locks = _async_locks[loop] = [asyncio.Lock() for _ in range(LOCK_STRIPES)]
+	return locks[hash(user_id) % LOCK_STRIPES]
+
+
+def lease_key(user_id):
+	return f'spotify:refresh:{user_id}'
+
+
+def token_expiring(user, margin=None):
+	"""
+	Checks whether a user's access token is missing an expiry or expires within the margin.
+
+	Args:
+		user (User): The user whose token is checked.
+		margin (int, optional): Seconds of head room; defaults to ``SPOTIFY_TOKEN_REFRESH_MARGIN``.
+
+	Returns:
+		bool: True if the token should be refreshed before use.
+	"""
+	if margin is None:
+		margin = getattr(settings, 'SPOTIFY_TOKEN_REFRESH_MARGIN', DEFAULT_REFRESH_MARGIN)
+	if user.spotify_token_expires_at is None:
+		return True
+	return user.spotify_token_expires_at <= timezone.now() + timedelta(seconds=margin)
+
+
+def store_tokens(user, token_data):
+	"""
+	Copies the tokens and expiry of a Spotify token response onto a user (without saving).
+
+	Args:
+		user (User): The user to update.
+		token_data (dict): Decoded response of the Accounts token endpoint.
+	"""
+	user.spotify_access_token = token_data['access_token']
+	# Spotify only sometimes rotates the refresh token
+	user.spotify_refresh_token = token_data.get('refresh_token', user.spotify_refresh_token)
+	user.spotify_token_expires_at = timezone.now() + timedelta(seconds=token_data.get('expires_in', 3600))
+
+
+def refresh_spotify_token(user):
+	"""
+	Refreshes the Spotify access token for a user.
+
+	Args:
+		user (User): The user whose token needs to be refreshed.
+
+	Returns:
+		str or None: The refreshed access token or None if unsuccessful.
+	"""
+	if not user.spotify_refresh_token:
+		return None
+
+	response = get_client().request_token({
+		'grant_type': 'refresh_token',
+		'refresh_token': user.spotify_refresh_token,
+	}, headers=client_credentials_headers())
+
+	if response.status_code == 200:
+		store_tokens(user, response.json())
+		user.save(update_fields=TOKEN_FIELDS)
+		return user.spotify_access_token
+	else:
+		logger.warning('Refreshing the Spotify token of user %s failed with status %s', user.pk, response.status_code)
+		return None
+
+
+async def arefresh_spotify_token(user):
+	"""
+	Async counterpart of :func:`refresh_spotify_token`.
+
+	Args:
+		user (User): The user whose token needs to be refreshed.
+
+	Returns:
+		str or None: The refreshed access token or None if unsuccessful.
+	"""
+	if not user.spotify_refresh_token:
+		return None
+
+	response = await get_async_client().request_token({
+		'grant_type': 'refresh_token',
+		'refresh_token': user.spotify_refresh_token,
+	}, headers=client_credentials_headers())
+
+	if response.status_code == 200:
+		store_tokens(user, response.json())
+		await user.asave(update_fields=TOKEN_FIELDS)
+		return user.spotify_access_token
+	logger.warning('Refreshing the Spotify token of user %s failed with status %s', user.pk, response.status_code)
+	return None
+
+
+def _reload_tokens(user):
+	user.refresh_from_db(fields=TOKEN_FIELDS)
+
+
+def get_access_token(user, force=False):
+	"""
+	Returns an access token for the user that is valid for at least the refresh margin.
+
+	At most one refresh per user is in flight: other callers wait for it and then reuse
+	the token it stored.
+
+	Args:
+		user (User): The linked user.
+		force (bool): Refresh even if the stored expiry says the token is still valid,
+			e.g. after Spotify rejected it with a 401.
+
+	Returns:
+		str or None: A usable access token, or None if the token could not be refreshed.
+	"""
+	stale_token = user.spotify_access_token
+	if not force and not token_expiring(user):
+		return stale_token
+
+	with _user_lock(user.pk):
+		# Another thread may have refreshed the token while we waited for the lock
+		_reload_tokens(user)
+		if user.spotify_access_token != stale_token or (not force and not token_expiring(user)):
+			return user.spotify_access_token
+
+		lease = lease_key(user.pk)
+		if cache.add(lease, 1, timeout=LEASE_SECONDS):
+			try:
+				return refresh_spotify_token(user)
+			finally:
+				cache.delete(lease)
+
+		# Another process holds the lease; wait for it to store the new token
+		deadline = time.monotonic() + LEASE_SECONDS
+		while time.monotonic() < deadline and cache.get(lease) is not None:
+			time.sleep(LEASE_POLL_INTERVAL)
+		_reload_tokens(user)
+		if user.spotify_access_token != stale_token:
+			return user.spotify_access_token
+		return refresh_spotify_token(user)
+
+
+async def aget_access_token(user, force=False):
+	"""
+	Async counterpart of :func:`get_access_token`.
+
+	Waits on a per-user ``asyncio`` lock and the cross-process lease instead of blocking
+	a thread, and posts the refresh with the async client.
+
+	Args:
+		user (User): The linked user.
+		force (bool): Refresh even if the stored expiry says the token is still valid.
+
+	Returns:
+		str or None: A usable access token, or None if the token could not be refreshed.
+	"""
+	stale_token = user.spotify_access_token
+	if not force and not token_expiring(user):
+		return stale_token
+
+	async with _async_user_lock(user.pk):
+		# Another request may have refreshed the token while we waited for the lock
+		await user.arefresh_from_db(fields=TOKEN_FIELDS)
+		if user.spotify_access_token != stale_token or (not force and not token_expiring(user)):
+			return user.spotify_access_token
+
+		lease = lease_key(user.pk)
+		if await cache.aadd(lease, 1, timeout=LEASE_SECONDS):
+			try:
+				return await arefresh_spotify_token(user)
+			finally:
+				await cache.adelete(lease)
+
+		# Another process or thread holds the lease; wait for it to store the new token
+		deadline = time.monotonic() + LEASE_SECONDS
+		while time.monotonic() < deadline and await cache.aget(lease) is not None:
+			await asyncio.sleep(LEASE_POLL_INTERVAL)
+		await user.arefresh_from_db(fields=TOKEN_FIELDS)
+		if user.spotify_access_token != stale_token:
+			return user.spotify_access_token
+		return await arefresh_spotify_token(user)
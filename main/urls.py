@@ -1,6 +1,9 @@
-from django.urls import path
+from django.urls import path, register_converter
 
 from . import views
+from .converters import WrapSlugConverter
+
+register_converter(WrapSlugConverter, 'wrap')
 
 urlpatterns = [
 	path('', views.welcome, name='welcome'),
@@ -24,16 +27,32 @@ urlpatterns = [
 	path('library/', views.library, name='library'),
 
 	path('newwrapper/', views.newwrapper, name='new_wrapped'),
-	path('wrapperStart/<str:dt>/', views.wrapperStart, name='wrapper-start'),
-	path('wrapper/<str:dt>/', views.wrapper, name='wrapped'),
-	path('GenreNebulas/<str:dt>/', views.GenreNebulas, name='genre_nebulas'),
-	path('StellarHits/<str:dt>/', views.StellarHits, name='stellar_hits'),
-	path('ConstellationArtists/<str:dt>/', views.ConstellationArtists, name='artist_constellation'),
-	path('AstroAI/<str:dt>/', views.AstroAI, name='astro-ai'),
-	path('summary/<str:dt>/', views.summary, name='summary'),
+	path('wrapperStart/<wrap:slug>/', views.wrapperStart, name='wrapper-start'),
+	path('wrapper/<wrap:slug>/', views.wrapper, name='wrapped'),
+	path('GenreNebulas/<wrap:slug>/', views.GenreNebulas, name='genre_nebulas'),
+	path('StellarHits/<wrap:slug>/', views.StellarHits, name='stellar_hits'),
+	path('ConstellationArtists/<wrap:slug>/', views.ConstellationArtists, name='artist_constellation'),
+	path('AstroAI/<wrap:slug>/', views.AstroAI, name='astro-ai'),
+	path('summary/<wrap:slug>/', views.summary, name='summary'),
 	# path('playback/', views.playback, name='playback-page'),
 	path('api/make-wrapped/<str:time_range>/<int:limit>/', views.make_wrapped, name='make-wrapped'),
-	path('api/get-wrapped/<str:dt>/', views.get_wrapped, name='get-wrapped'),
-	path('api/delete-wrapped/<str:dt>/', views.delete_wrapped, name='delete-wrapped'),
+	path('api/get-wrapped/<wrap:slug>/', views.get_wrapped, name='get-wrapped'),
+	path('api/wrap-description/<wrap:slug>/', views.wrap_description, name='wrap-description'),
+	path('api/wrap-description/<wrap:slug>/stream/', views.stream_description, name='stream-description'),
+	path('api/delete-wrapped/<wrap:slug>/', views.delete_wrapped, name='delete-wrapped'),
 	path('api/get-game-info/', views.get_game_info, name='game-info'),
+	path('api/status/', views.status, name='status'),
+
+	# Wraps used to be identified by their creation timestamp; redirect those URLs to the slug ones
+	path('wrapperStart/<str:dt>/', views.legacy_wrap_redirect, {'route': 'wrapper-start'}),
+	path('wrapper/<str:dt>/', views.legacy_wrap_redirect, {'route': 'wrapped'}),
+	path('GenreNebulas/<str:dt>/', views.legacy_wrap_redirect, {'route': 'genre_nebulas'}),
+	path('StellarHits/<str:dt>/', views.legacy_wrap_redirect, {'route': 'stellar_hits'}),
+	path('ConstellationArtists/<str:dt>/', views.legacy_wrap_redirect, {'route': 'artist_constellation'}),
+	path('AstroAI/<str:dt>/', views.legacy_wrap_redirect, {'route': 'astro-ai'}),
+	path('summary/<str:dt>/', views.legacy_wrap_redirect, {'route': 'summary'}),
+	path('api/get-wrapped/<str:dt>/', views.legacy_wrap_redirect, {'route': 'get-wrapped'}),
+	path('api/wrap-description/<str:dt>/', views.legacy_wrap_redirect, {'route': 'wrap-description'}),
+	path('api/wrap-description/<str:dt>/stream/', views.legacy_wrap_redirect, {'route': 'stream-description'}),
+	path('api/delete-wrapped/<str:dt>/', views.legacy_wrap_redirect, {'route': 'delete-wrapped'}),
 ]
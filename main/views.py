@@ -1,26 +1,51 @@
-import base64
+import asyncio
+import gzip
 import json
 import os
 import random
 import string
+import time
 import urllib.parse
 from datetime import datetime
 
-import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.hashers import make_password
-from django.http import JsonResponse
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from django.views.decorators.csrf import csrf_exempt
 from dotenv import load_dotenv
-from openai import OpenAI
 
+from .catalog import compact_wrap, hydrate_wrap, response_body, store_catalog
+from .circuit import get_breaker
+from .description_cache import get_description_cache
+from .descriptions import lease_key, partial_key, schedule_description
 from .forms import LoginForm, RegistrationForm, ForgetForm
+from .llm import get_provider
 from .models import User, Wraps
+from .planner import TopItemsPlan
+from .profiles import display_name_for, store_profile
+from .prompts import usage_stats
+from .spotify import SpotifyUnavailable, client_credentials_headers, get_async_client, get_scheduler
+from .spotify_cache import get_top_items_cache
+from .tokens import TOKEN_FIELDS, aget_access_token, store_tokens
 
 load_dotenv()
 
+# Wraps per library page
+LIBRARY_PAGE_SIZE = 24
+
+# Seconds between checks for new description text, and the longest a description stream stays open
+STREAM_POLL_INTERVAL = 0.1
+STREAM_TIMEOUT = 120
+
 
 def index(request):
 	"""
@@ -62,20 +87,12 @@ def accountpage(request):
 	Returns:
 	    HttpResponse: Rendered HTML of the account page with user data in context.
 	"""
-	username = request.session.get('username')
-	wrap_set = Wraps.objects.filter(username=username).order_by('-creation_date')
-	wrap_count = wrap_set.count()
-	most_recent_wrap = wrap_set.first()
-	display_name = User.objects.get(username=username).current_display_name
-	if most_recent_wrap:
-		most_recent_wrap_date = most_recent_wrap.creation_date
-	else:
-		most_recent_wrap_date = None
+	# The wrap counters live on the user row the auth middleware already loaded
 	context = {
-		"username": username,
-		"display_name": display_name,
-		"wrap_count": wrap_count,
-		"most_recent_wrap_date": most_recent_wrap_date,
+		"username": request.session.get('username'),
+		"display_name": request.user.current_display_name,
+		"wrap_count": request.user.wrap_count,
+		"most_recent_wrap_date": request.user.last_wrap_at,
 	}
 	return render(request, 'Spotify_Wrapper/accountpage.html', context)
 
@@ -137,93 +154,93 @@ def game(request):
 
 
 @login_required
-def wrapper(request, dt):
+def wrapper(request, slug):
 	"""
 	Renders a specific Spotify Wrapper page.
 
 	Args:
 	    request (HttpRequest): The HTTP request object.
-	    dt (str): The date-time identifier for the wrapper.
+	    slug (str): The wrap's URL identifier.
 
 	Returns:
-        HttpResponse: Rendered HTML of the wrapper page with the given date-time.
+        HttpResponse: Rendered HTML of the wrapper page for the given wrap.
 	"""
-	return render(request, 'Spotify_Wrapper/wrapper.html', {'dt': dt})
+	return render(request, 'Spotify_Wrapper/wrapper.html', {'slug': slug})
 
 
 @login_required
-def GenreNebulas(request, dt):
+def GenreNebulas(request, slug):
 	"""
 	Renders the Genre Nebulas page for the specified wrapper.
 
 	Args:
 		request (HttpRequest): The HTTP request object.
-		dt (str): The date-time identifier for the wrapper.
+		slug (str): The wrap's URL identifier.
 
 	Returns:
 		HttpResponse: Rendered HTML of the Genre Nebulas page.
 	"""
-	return render(request, 'Spotify_Wrapper/GenreNebulas.html', {'dt': dt})
+	return render(request, 'Spotify_Wrapper/GenreNebulas.html', {'slug': slug})
 
 
 @login_required
-def StellarHits(request, dt):
+def StellarHits(request, slug):
 	"""
 	Renders the Stellar Hits page for the specified wrapper.
 
 	Args:
 		request (HttpRequest): The HTTP request object.
-		dt (str): The date-time identifier for the wrapper.
+		slug (str): The wrap's URL identifier.
 
 	Returns:
 		HttpResponse: Rendered HTML of the Stellar Hits page.
 	"""
-	return render(request, 'Spotify_Wrapper/StellarHits.html', {'dt': dt})
+	return render(request, 'Spotify_Wrapper/StellarHits.html', {'slug': slug})
 
 
 @login_required()
-def ConstellationArtists(request, dt):
+def ConstellationArtists(request, slug):
 	"""
 	Renders the Constellation Artists page for the specified wrapper.
 
 	Args:
 		request (HttpRequest): The HTTP request object.
-		dt (str): The date-time identifier for the wrapper.
+		slug (str): The wrap's URL identifier.
 
 	Returns:
 		HttpResponse: Rendered HTML of the Constellation Artists page.
 	"""
-	return render(request, 'Spotify_Wrapper/ConstellationArtists.html', {'dt': dt})
+	return render(request, 'Spotify_Wrapper/ConstellationArtists.html', {'slug': slug})
 
 
 @login_required()
-def AstroAI(request, dt):
+def AstroAI(request, slug):
 	"""
 	Renders the AstroAI page for the specified wrapper.
 
 	Args:
 		request (HttpRequest): The HTTP request object.
-		dt (str): The date-time identifier for the wrapper.
+		slug (str): The wrap's URL identifier.
 
 	Returns:
 		HttpResponse: Rendered HTML of the AstroAI page.
 	"""
-	return render(request, 'Spotify_Wrapper/AstroAI.html', {'dt': dt})
+	return render(request, 'Spotify_Wrapper/AstroAI.html', {'slug': slug})
 
 
 @login_required
-def summary(request, dt):
+def summary(request, slug):
 	"""
 	Renders the summary page for the specified Spotify Wrapper.
 
 	Args:
 		request (HttpRequest): The HTTP request object.
-		dt (str): The date-time identifier for the wrapper.
+		slug (str): The wrap's URL identifier.
 
 	Returns:
 		HttpResponse: Rendered HTML of the summary page.
 	"""
-	return render(request, 'Spotify_Wrapper/summary.html', {'dt': dt})
+	return render(request, 'Spotify_Wrapper/summary.html', {'slug': slug})
 
 
 # @login_required
@@ -232,18 +249,18 @@ def summary(request, dt):
 
 
 @login_required
-def wrapperStart(request, dt):
+def wrapperStart(request, slug):
 	"""
 	Renders the wrapper start page for the specified wrapper.
 
 	Args:
 		request (HttpRequest): The HTTP request object.
-		dt (str): The date-time identifier for the wrapper.
+		slug (str): The wrap's URL identifier.
 
 	Returns:
 		HttpResponse: Rendered HTML of the wrapper start page.
 	"""
-	return render(request, 'Spotify_Wrapper/wrapperStart.html', {'dt': dt})
+	return render(request, 'Spotify_Wrapper/wrapperStart.html', {'slug': slug})
 
 
 @login_required
@@ -257,15 +274,10 @@ def account(request):
 	Returns:
 		HttpResponse: Rendered HTML of the account page with user data in context.
 	"""
-	username = request.session.get('username')
-	wrap_set = Wraps.objects.filter(username=username).order_by('-creation_date')
-	wrap_count = wrap_set.count()
-	most_recent_wrap = wrap_set.first()
-	most_recent_wrap_date = most_recent_wrap.creation_date
 	context = {
-		"username": username,
-		"wrap_count": wrap_count,
-		"most_recent_wrap_date": most_recent_wrap_date,
+		"username": request.session.get('username'),
+		"wrap_count": request.user.wrap_count,
+		"most_recent_wrap_date": request.user.last_wrap_at,
 	}
 	return render(request, 'Spotify_Wrapper/accountpage.html', context)
 
@@ -273,16 +285,49 @@ def account(request):
 @login_required
 def library(request):
 	"""
-	Renders the library page containing all the user's wrappers.
+	Renders one page of the library, listing the user's wrappers newest first.
+
+	Pages are keyset-paginated on (creation_date, id): the ``before`` parameter holds
+	the cursor of the last wrap on the previous page, so every page costs the same
+	however many wraps the user has. Only the columns the cards show are loaded.
 
 	Args:
 		request (HttpRequest): The HTTP request object.
 
 	Returns:
-		HttpResponse: Rendered HTML of the library page with all wraps in context.
+		HttpResponse: Rendered HTML of the library page with the page's wraps and the next page's cursor in context.
+	"""
+	wraps = (request.user.wraps.only('slug', 'term', 'creation_date', 'spotify_display_name')
+	         .order_by('-creation_date', '-pk'))
+	cursor = _parse_library_cursor(request.GET.get('before', ''))
+	if cursor:
+		creation_date, pk = cursor
+		wraps = wraps.filter(Q(creation_date__lt=creation_date) | Q(creation_date=creation_date, pk__lt=pk))
+
+	page = list(wraps[:LIBRARY_PAGE_SIZE + 1])
+	next_cursor = None
+	if len(page) > LIBRARY_PAGE_SIZE:
+		page = page[:LIBRARY_PAGE_SIZE]
+		next_cursor = f'{page[-1].creation_date.isoformat()},{page[-1].pk}'
+	return render(request, 'Spotify_Wrapper/library.html', {
+		'wraps': page,
+		'next_cursor': next_cursor,
+		'is_first_page': cursor is None,
+	})
+
+
+def _parse_library_cursor(value):
 	"""
-	wraps = Wraps.objects.filter(username=request.session.get('username')).order_by('-creation_date')
-	return render(request, 'Spotify_Wrapper/library.html', {'wraps': wraps})
+	Parses a library cursor of the form ``<creation date>,<id>``.
+
+	Returns:
+		tuple: The creation date and id, or None if the cursor is missing or malformed.
+	"""
+	creation_date, _, pk = value.rpartition(',')
+	try:
+		return datetime.fromisoformat(creation_date), int(pk)
+	except ValueError:
+		return None
 
 
 @login_required
@@ -472,7 +517,7 @@ def spotify_login(request):
 	"""
 	state = generate_random_state(16)
 	scope = 'user-read-private user-read-email user-top-read streaming user-modify-playback-state'
-	auth_url = 'https://accounts.spotify.com/authorize?'
+	auth_url = f'{settings.SPOTIFY_ACCOUNTS_BASE_URL}/authorize?'
 	query_params = {
 		'response_type': 'code',
 
@@ -488,7 +533,7 @@ def spotify_login(request):
 	return redirect(url)
 
 
-def spotify_callback(request):
+async def spotify_callback(request):
 	"""
 	Handles the callback from Spotify after user authentication.
 
@@ -502,11 +547,7 @@ def spotify_callback(request):
 	state = request.GET.get('state')
 	error = request.GET.get('error')
 
-	auth_string = os.getenv('SPOTIFY_CLIENT_ID') + ":" + os.getenv('SPOTIFY_CLIENT_SECRET')
-	# auth_string = settings.SPOTIFY_CLIENT_ID + ":" + settings.SPOTIFY_CLIENT_SECRET
-
-	auth_bytes = auth_string.encode("utf-8")
-	auth_base64 = str(base64.b64encode(auth_bytes), "utf-8")
+	header = client_credentials_headers()
 
 	if error:
 		return error
@@ -514,7 +555,6 @@ def spotify_callback(request):
 		return JsonResponse({'error': 'Invalid code'}, status=400)
 
 	# Exchange code for an access token
-	token_url = 'https://accounts.spotify.com/api/token'
 	body = {
 		'grant_type': 'authorization_code',
 		'code': code,
@@ -525,74 +565,45 @@ def spotify_callback(request):
 
 		'client_secret': os.getenv('SPOTIFY_CLIENT_SECRET'),
 	}
-	header = {
-		'Authorization': 'Basic ' + auth_base64,
-		'Content-Type': 'application/x-www-form-urlencoded',
-	}
-
-	response = requests.post(token_url, data=body, headers=header)
+	client = get_async_client()
+	try:
+		response = await client.request_token(body, headers=header)
+	except SpotifyUnavailable:
+		return JsonResponse({'error': 'Spotify is busy, please try again shortly.'}, status=503)
 	response_data = response.json()
 
 	if 'access_token' in response_data:
 		access_token = response_data['access_token']
-		refresh_token = response_data['refresh_token']
 
 		# Assuming user session has 'username' set from login view
-		username = request.session.get('username')
+		username = await request.session.aget('username')
 		if username:
-			user = User.objects.get(username=username)
-			user.spotify_access_token = access_token
-			user.spotify_refresh_token = refresh_token
-
-			headers = {'Authorization': f'Bearer {access_token}'}
-			response = requests.get('https://api.spotify.com/v1/me', headers=headers)
-			if response.status_code == 200:
-				# Extract the user's display name from the JSON response
-				user_data = response.json()
-				user.current_display_name = user_data.get('display_name',
-				                                          'Unknown User')  # Default value in case the field is missing
-			else:
+			user = await User.objects.aget(username=username)
+			store_tokens(user, response_data)
+			# The user may have linked a different Spotify account
+			await sync_to_async(get_top_items_cache().invalidate)(user.pk)
+
+			try:
+				response = await client.me(access_token)
+			except SpotifyUnavailable:
+				response = None
+			if response is None or response.status_code != 200:
 				user.current_display_name = 'Unknown User'
 
-			user.save()  # Save tokens to the user model
+			# Only the columns set here; wrap counters may have moved while Spotify answered
+			await user.asave(update_fields=TOKEN_FIELDS + ['current_display_name'])
+			if response is not None and response.status_code == 200:
+				# Cache the profile so wraps never have to ask Spotify for it
+				await sync_to_async(store_profile)(user, response.json())
 
 		return redirect("library")
 	else:
 		return JsonResponse({'error': 'Failed to obtain token'}, status=400)
 
 
-def refresh_spotify_token(user):
-	"""
-	Refreshes the Spotify access token for a user.
-
-	Args:
-		user (User): The user whose token needs to be refreshed.
-
-	Returns:
-		str or None: The refreshed access token or None if unsuccessful.
-	"""
-	refresh_token = user.spotify_refresh_token
-
-	response = requests.post('https://accounts.spotify.com/api/token', data={
-		'grant_type': 'refresh_token',
-		'refresh_token': refresh_token,
-		'client_id': 'your_client_id',
-		'client_secret': 'your_client_secret',
-	})
-
-	if response.status_code != 200:
-		tokens = response.json()
-		access_token = tokens['access_token']
-		user.spotify_access_token = access_token
-		user.save()
-		return access_token
-	else:
-		return None
-
-
 @csrf_exempt
 @login_required
-def make_wrapped(request, time_range='medium_term', limit=5):
+async def make_wrapped(request, time_range='medium_term', limit=5):
 	"""
 	Generates a Spotify Wrapped summary for the user and saves it.
 
@@ -604,37 +615,44 @@ def make_wrapped(request, time_range='medium_term', limit=5):
 	Returns:
 		JsonResponse or HttpResponse: JSON response with the wrapped data or redirect to the wrapped page.
 	"""
-	user = User.objects.get(username=request.session.get('username'))
-	endpoint = 'https://api.spotify.com/v1/me'
+	user = await User.objects.aget(username=await request.session.aget('username'))
+	client = get_async_client()
 
 	if not user.spotify_access_token:
 		return JsonResponse({'error': 'User is not authenticated with Spotify.'}, status=401)
 
-	headers = {'Authorization': f'Bearer {user.spotify_access_token}'}
-	response = requests.get(endpoint, headers=headers)
-	display_name = response.json()['display_name']
+	plan = TopItemsPlan(cache=get_top_items_cache(), user_id=user.pk)
+	plan.request('tracks', time_range, limit)
+	plan.request('artists', time_range, limit)
+	plan.request('artists', time_range, 20)  # Genres are tallied over a wider artist window
 
-	if response.status_code == 401:
-		access_token = refresh_spotify_token(user)
+	try:
+		access_token = await aget_access_token(user)
 		if not access_token:
 			return JsonResponse({'error': 'Failed to refresh access token.'}, status=400)
-		user.spotify_access_token = access_token
-		user.save()
+		await plan.aexecute(client, access_token)
 
-	top_tracks = requests.get(f'{endpoint}/top/tracks?limit={limit}&time_range={time_range}', headers=headers)
-	top_artists = requests.get(f'{endpoint}/top/artists?limit={limit}&time_range={time_range}', headers=headers)
-	genre_req = requests.get(f'{endpoint}/top/artists?limit=20&time_range={time_range}', headers=headers)
+		if plan.unauthorized:
+			# The token was revoked before its recorded expiry
+			access_token = await aget_access_token(user, force=True)
+			if not access_token:
+				return JsonResponse({'error': 'Failed to refresh access token.'}, status=400)
+			await plan.aexecute(client, access_token)
+	except SpotifyUnavailable:
+		return JsonResponse({'error': 'Spotify is busy, please try again shortly.'}, status=503)
 
-	if top_tracks.status_code != 200 or top_artists.status_code != 200 or genre_req.status_code != 200:
+	display_name = await sync_to_async(display_name_for)(user)
+
+	if not plan.ok:
 		return JsonResponse({'error': 'Failed to retrieve data from Spotify'}, status=400)
 
 	top_track_data = []
-	for track in top_tracks.json()['items']:
+	for track in plan.items('tracks', time_range, limit):
 		top_track_data.append({
 			'track_name': track['name'],
 			'track_id': track['id'],
 			'album_name': track['album']['name'],
-			'album_id': track['album']['name'],
+			'album_id': track['album']['id'],
 			'artist_name': track['artists'][0]['name'],
 			'artist_id': track['artists'][0]['id'],
 			'popularity': track['popularity'],
@@ -643,7 +661,7 @@ def make_wrapped(request, time_range='medium_term', limit=5):
 		})
 
 	top_artist_data = []
-	for artist in top_artists.json()['items']:
+	for artist in plan.items('artists', time_range, limit):
 		top_artist_data.append({
 			'artist_name': artist['name'],
 			'artist_id': artist['id'],
@@ -652,81 +670,236 @@ def make_wrapped(request, time_range='medium_term', limit=5):
 		})
 
 	top_genres = {}
-	for artist in genre_req.json()['items']:
+	for artist in plan.items('artists', time_range, 20):
 		for genre in artist['genres']:
 			top_genres[genre] = top_genres.get(genre, 0) + 1
 	data = {'time_range': time_range, 'limit': limit, 'top_tracks': top_track_data, 'top_artists': top_artist_data,
 	        'top_genres': sorted(top_genres, key=top_genres.get)}
-	data['llama_description'] = llama_description(request, data)
-	wrap = Wraps.objects.create(username=user.username, term=time_range, spotify_display_name=display_name,
-	                            wrap_json=json.dumps(data))
-	wrap.save()
+	# Tracks and artists go into the shared catalog; the wrap only keeps their IDs
+	await sync_to_async(store_catalog)(data)
+	wrap = Wraps(user=user, term=time_range, spotify_display_name=display_name, creation_date=timezone.now(),
+	             document=compact_wrap(data), description_status=Wraps.DESCRIPTION_PENDING)
+	await wrap.asave()
+	# The AI description is written into the wrap once the LLM is done; AstroAI polls for it
+	await sync_to_async(schedule_description)(wrap.pk, data)
+
+	return JsonResponse(response_body(wrap, data))
+
+
+@login_required
+def legacy_wrap_redirect(request, dt, route):
+	"""
+	Redirects a URL that identifies a wrap by its creation timestamp to the wrap's slug URL.
+
+	Args:
+		request (HttpRequest): The HTTP request object.
+		dt (str): The creation date-time the wrap used to be identified by.
+		route (str): Name of the slug route to redirect to.
+
+	Returns:
+		HttpResponsePermanentRedirect: Redirect to the same page or endpoint addressed by slug.
+
+	Raises:
+		Http404: If ``dt`` is not a timestamp or no wrap of the user was created at it.
+	"""
+	try:
+		creation_date = datetime.fromisoformat(dt)
+	except ValueError:
+		raise Http404('Wrapped does not exist')
+	if timezone.is_naive(creation_date):
+		creation_date = timezone.make_aware(creation_date)
+
+	slug = request.user.wraps.filter(creation_date=creation_date).values_list('slug', flat=True).first()
+	if slug is None:
+		raise Http404('Wrapped does not exist')
+	return redirect(route, slug=slug, permanent=True)
 
-	return get_wrapped(request, wrap.creation_date.isoformat())
+
+def _accepts_gzip(request):
+	"""
+	Checks whether a request's Accept-Encoding header allows a gzip-compressed response.
+
+	Args:
+		request (HttpRequest): The HTTP request object.
+
+	Returns:
+		bool: True if ``gzip`` is listed with a non-zero q-value.
+	"""
+	for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+		name, *params = [part.strip() for part in coding.split(';')]
+		if name.lower() != 'gzip':
+			continue
+		q = 1.0
+		for param in params:
+			key, _, value = param.partition('=')
+			if key.strip().lower() == 'q':
+				try:
+					q = float(value)
+				except ValueError:
+					q = 0.0
+		return q > 0
+	return False
 
 
 @csrf_exempt
 @login_required
-def get_wrapped(request, dt):
+def get_wrapped(request, slug):
 	"""
 	Retrieves a specific Spotify Wrapped data entry for the logged-in user.
 
 	Args:
 		request (HttpRequest): The HTTP request object.
-		dt (str): The date-time identifier for the wrapped entry.
+		slug (str): The wrap's URL identifier.
 
 	Returns:
 		JsonResponse: JSON response containing the wrapped data or an error message if not found.
 	"""
 	try:
-		wrap = Wraps.objects.get(username=request.session.get('username'), creation_date=datetime.fromisoformat(dt))
+		wrap = request.user.wraps.only('slug', 'creation_date', 'description_status', 'payload').get(slug=slug)
 	except Wraps.DoesNotExist:
 		return JsonResponse({'error': 'Wrapped does not exist'}, status=404)
 
-	return JsonResponse({'data': json.loads(wrap.wrap_json), 'dt': dt})
+	body = json.dumps(response_body(wrap)).encode()
+	if _accepts_gzip(request):
+		response = HttpResponse(gzip.compress(body), content_type='application/json')
+		response['Content-Encoding'] = 'gzip'
+	else:
+		response = HttpResponse(body, content_type='application/json')
+	patch_vary_headers(response, ['Accept-Encoding'])
+	return response
 
 
-@csrf_exempt
 @login_required
-def llama_description(request, data):
+def wrap_description(request, slug):
 	"""
-	Generates a witty description of a user's Spotify Wrapped data using AI.
+	Reports whether the AI description of a wrap is ready, for AstroAI to poll.
+
+	A description still pending once its background job has gone away is queued again.
 
 	Args:
 		request (HttpRequest): The HTTP request object.
-		data (dict): Data containing the user's Spotify Wrapped information.
-
-	Returns:
-		str: A concise and engaging description of the user's music preferences.
-	"""
-	msg = (
-		"Based on the following list of top artists, genres and tracks from a user's Spotify Wrapped, craft a fun, engaging, slightly sassy "
-		"description of how someone who listens to this kind of music tends to act, think and dress."
-		"Be playful and witty, but avoid being mean or overly critical. Tie the music preferences to relatable behaviors and quirks. "
-		"ENSURE THAT THE RESPONSE IS CONCISE, SELF-CONTAINED AND LESS THAN 50 TOKENS. ENSURE THERE IS NO OTHER INFORMATION ASIDE FROM HOW THE USER ACTS, THINKS AND DRESSES"
-	)
-	client = OpenAI(
-		base_url="https://integrate.api.nvidia.com/v1",
-		api_key=os.getenv('OPENAI_API_KEY')
-	)
-	completion = client.chat.completions.create(
-		model="meta/llama-3.1-405b-instruct",
-		messages=[{"role": "user", "content": f'{msg}\n\n{data}'}],
-		temperature=0.1,
-		top_p=0.5,
-		max_tokens=1000,
-		stream=True
-	)
-	response = ""  # Collect all the content here
-	for chunk in completion:
-		delta_content = chunk.choices[0].delta.content
-		if delta_content:  # Only add non-None content
-			response += delta_content
+		slug (str): The wrap's URL identifier.
 
+	Returns:
+		JsonResponse: JSON response containing the description status and, once ready, the description.
+	"""
+	try:
+		wrap = request.user.wraps.get(slug=slug)
+	except Wraps.DoesNotExist:
+		return JsonResponse({'error': 'Wrapped does not exist'}, status=404)
+
+	data = wrap.document
+	if wrap.description_status == Wraps.DESCRIPTION_PENDING:
+		schedule_description(wrap.pk, hydrate_wrap(data))  # No-op while the original job still holds its lease
+	return JsonResponse({'status': wrap.description_status, 'description': data.get('llama_description', '')})
+
+
+def _sse(data, event=None):
+	"""
+	Formats one server-sent event carrying a JSON payload.
+	"""
+	prefix = f'event: {event}\n' if event else ''
+	return f'{prefix}data: {json.dumps(data)}\n\n'
+
+
+def _poll_description(wrap):
+	"""
+	Checks once on the background job writing a pending description.
+
+	Once no job holds the wrap's lease, the wrap is reloaded; if it is still pending, its
+	job died and is queued again.
+
+	Args:
+		wrap (Wraps): The wrap as last loaded.
+
+	Returns:
+		tuple: The text generated so far, the wrap (reloaded if the job is gone) and whether a job is still running.
+	"""
+	text = cache.get(partial_key(wrap.pk), '')
+	if cache.get(lease_key(wrap.pk)) is not None:
+		return text, wrap, True
+	wrap = Wraps.objects.get(pk=wrap.pk)
+	if wrap.description_status == Wraps.DESCRIPTION_PENDING:
+		schedule_description(wrap.pk, hydrate_wrap(wrap.document))
+	return text, wrap, False
+
+
+def _closing_events(wrap, sent):
+	"""
+	The events that end a description stream: any text not sent yet, then ``done``.
+	"""
+	description = wrap.document.get('llama_description', '')
+	events = []
+	if description.startswith(sent) and len(description) > len(sent):
+		events.append(_sse(description[len(sent):]))
+	events.append(_sse({'status': wrap.description_status}, event='done'))
+	return events
+
+
+def _description_events(wrap):
+	"""
+	Yields the description events of a wrap, blocking between polls; served under WSGI.
+	"""
+	sent = ''
+	deadline = time.monotonic() + STREAM_TIMEOUT
+	while wrap.description_status == Wraps.DESCRIPTION_PENDING and time.monotonic() < deadline:
+		text, wrap, running = _poll_description(wrap)
+		if len(text) > len(sent):
+			yield _sse(text[len(sent):])
+			sent = text
+		if running:
+			time.sleep(STREAM_POLL_INTERVAL)
+	yield from _closing_events(wrap, sent)
+
+
+async def _adescription_events(wrap):
+	"""
+	Async counterpart of :func:`_description_events`; served under ASGI.
+	"""
+	sent = ''
+	deadline = time.monotonic() + STREAM_TIMEOUT
+	while wrap.description_status == Wraps.DESCRIPTION_PENDING and time.monotonic() < deadline:
+		text, wrap, running = await sync_to_async(_poll_description)(wrap)
+		if len(text) > len(sent):
+			yield _sse(text[len(sent):])
+			sent = text
+		if running:
+			await asyncio.sleep(STREAM_POLL_INTERVAL)
+	for event in _closing_events(wrap, sent):
+		yield event
+
+
+@login_required
+async def stream_description(request, slug):
+	"""
+	Streams the AI description of a wrap to AstroAI as server-sent events while it is generated.
+
+	Each ``message`` event carries the next piece of text; a final ``done`` event carries
+	the description status once the text is complete. Under WSGI, Django collects an
+	async streaming body in full before sending any of it, so WSGI requests get a
+	blocking generator instead, which holds its worker for the length of the stream.
+
+	Args:
+		request (HttpRequest): The HTTP request object.
+		slug (str): The wrap's URL identifier.
+
+	Returns:
+		StreamingHttpResponse or JsonResponse: The event stream, or an error if the wrap does not exist.
+	"""
+	user = await request.auser()
+	try:
+		wrap = await Wraps.objects.aget(user=user, slug=slug)
+	except Wraps.DoesNotExist:
+		return JsonResponse({'error': 'Wrapped does not exist'}, status=404)
+
+	events = _adescription_events(wrap) if isinstance(request, ASGIRequest) else _description_events(wrap)
+	response = StreamingHttpResponse(events, content_type='text/event-stream')
+	response['Cache-Control'] = 'no-cache'
+	response['X-Accel-Buffering'] = 'no'  # Keep reverse proxies from buffering the stream
 	return response
 
 
-def get_game_info(request):
+async def get_game_info(request):
 	"""
 	Retrieves game-related Spotify data for the logged-in user, including top artists and tracks.
 
@@ -736,52 +909,88 @@ def get_game_info(request):
 	Returns:
 		JsonResponse: JSON response containing the user's top artists and tracks or an error message.
 	"""
-	user = User.objects.get(username=request.session.get('username'))
-	endpoint = 'https://api.spotify.com/v1/me'
+	user = await User.objects.aget(username=await request.session.aget('username'))
+	client = get_async_client()
 
 	if not user.spotify_access_token:
 		return JsonResponse({'error': 'User is not authenticated with Spotify.'}, status=401)
 
-	headers = {'Authorization': f'Bearer {user.spotify_access_token}'}
-	response = requests.get(endpoint, headers=headers)
+	plan = TopItemsPlan(cache=get_top_items_cache(), user_id=user.pk)
+	plan.request('artists', 'long_term', 50)
+	plan.request('tracks', 'long_term', 50)
 
-	if response.status_code == 401:
-		access_token = refresh_spotify_token(user)
+	try:
+		access_token = await aget_access_token(user)
 		if not access_token:
 			return JsonResponse({'error': 'Failed to refresh access token.'}, status=400)
-		user.spotify_access_token = access_token
-		user.save()
+		await plan.aexecute(client, access_token)
+
+		if plan.unauthorized:
+			# The token was revoked before its recorded expiry
+			access_token = await aget_access_token(user, force=True)
+			if not access_token:
+				return JsonResponse({'error': 'Failed to refresh access token.'}, status=400)
+			await plan.aexecute(client, access_token)
+	except SpotifyUnavailable:
+		return JsonResponse({'error': 'Spotify is busy, please try again shortly.'}, status=503)
+
+	if not plan.ok:
+		return JsonResponse({'error': 'Failed to retrieve data from Spotify'}, status=400)
 
-	top_artists = requests.get(f'{endpoint}/top/artists?limit=50&time_range=long_term', headers=headers)
-	top_tracks = requests.get(f'{endpoint}/top/tracks?limit=50&time_range=long_term', headers=headers)
 	artists = []
 	tracks = []
-	for artist in top_artists.json()['items']:
+	for artist in plan.items('artists', 'long_term', 50):
 		artists.append(artist['name'])
-	for track in top_tracks.json()['items']:
+	for track in plan.items('tracks', 'long_term', 50):
 		tracks.append(track['name'])
 
 	data = {'artists': artists, 'tracks': tracks}
 	return JsonResponse(data)
 
 
-def delete_wrapped(request, dt):
+def status(request):
+	"""
+	Reports the health counters of the app's outbound integrations.
+
+	Args:
+		request (HttpRequest): The HTTP request object.
+
+	Returns:
+		JsonResponse: JSON response containing the circuit breaker states, the LLM provider's
+		concurrency, the AI description cache and token usage counters and the Spotify
+		top-items cache and rate limiter counters.
+	"""
+	breakers = {name: get_breaker(name).stats() for name in ('spotify', 'llm')}
+	healthy = all(breaker['state'] == 'closed' for breaker in breakers.values())
+	return JsonResponse({
+		'status': 'ok' if healthy else 'degraded',
+		'circuit_breakers': breakers,
+		'description_cache': get_description_cache().stats(),
+		'llm': get_provider().stats(),
+		'llm_usage': usage_stats(),
+		'spotify_cache': get_top_items_cache().stats(),
+		'spotify_rate_limit': get_scheduler(os.getenv('SPOTIFY_CLIENT_ID')).stats(),
+	})
+
+
+@login_required
+def delete_wrapped(request, slug):
 	"""
-	Permanently deletes the logged-in user's wrapped with the creation datetime id currently being viewed.
+	Permanently deletes the logged-in user's wrapped currently being viewed.
 
 	Args:
 		request (HttpRequest): The HTTP request object.
-		dt (DateTime): The creation datetime of the current wrapped being viewed.
+		slug (str): The URL identifier of the wrapped being viewed.
 
 	Returns:
-		Integer: Status code specifying the success of the wrap deletion.
+		JsonResponse: The deleted wrap's slug, or an error if the user has no such wrap.
 	"""
 	try:
-		wrap = Wraps.objects.get(username=request.session.get('username'), creation_date=datetime.fromisoformat(dt))
-		wrap.delete()
-		return 200
+		wrap = request.user.wraps.get(slug=slug)
 	except Wraps.DoesNotExist:
-		return 404
+		return JsonResponse({'error': 'Wrapped does not exist'}, status=404)
+	wrap.delete()
+	return JsonResponse({'deleted': slug})
 
 # @login_required
 # def playback(request):